@@ -1,412 +1,521 @@
-import requests
-from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
-import pandas as pd
+# Browser/network modules (browser_pool, fetch_strategy) are imported inside the fetch
+# functions, so offline re-parsing (reparse.py) never loads Playwright or requests.
+from page_cache import get_page_cache
+from notice_index import SectionIndex
+from extraction_spec import ExtractionSpec, Field
+from parser_backend import make_soup
+from metrics import timed, field_error, record_fields
+from normalize import get_date_normalizer, get_amount_parser, load_exchange_rates, normalize_records
 import re
-import time
 import logging
-from datetime import datetime
-import os # Import the os module
+from urllib.parse import urlparse
 
 # --- Configuration ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# --- Currency Rates (Static) ---
-# Both UK sites use GBP
+# --- Currency Rates ---
+# Both UK sites use GBP. INR values use the rate in effect on each notice's publication
+# (else award) date from EXCHANGE_RATES_FILE (a date,rate CSV); without it, this one rate.
 GBP_TO_INR_RATE = 116.95  # Rate as of 2025-10-25
+EXCHANGE_RATES_FILE = 'gbp_inr_rates.csv'
 # EUR_TO_INR_RATE = 102.11 # Not needed if only using UK sites
 
 USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36"
 
-# Ensure filenames have .html extension and are distinct
-OUTPUT_HTML_FILES = ['html_FindATender.html', 'html_ContractsFinder.html']
+# --- Browser Pool ---
+# One headless Chromium is launched lazily and reused for every URL; it is shut down at exit.
+BROWSER_HEADLESS = True
+BROWSER_POOL_SIZE = 2        # Warm pages kept open
+BROWSER_MAX_PAGE_USES = 25   # Recycle a page's context after this many URLs
+RENDER_PROFILE = 'lean'      # 'lean' blocks images/fonts/CSS/analytics; 'full' loads everything
+
+# --- Page Cache ---
+# Fetched notice HTML is cached per normalized URL (compressed, with ETag/Last-Modified)
+# and revalidated with a conditional GET once older than PAGE_CACHE_TTL.
+PAGE_CACHE_DIR = 'page_cache'
+PAGE_CACHE_TTL = 7 * 24 * 3600             # Seconds
+PAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024   # LRU-evicted beyond this
+
+# --- Crawl State ---
+# Notices already extracted are skipped on restart. Bump EXTRACTION_VERSION whenever parser
+# output changes so stored notices are re-extracted; done notices are re-checked (cheaply,
+# through the page cache) once older than CRAWL_RECHECK_AFTER.
+EXTRACTION_VERSION = 1
+CRAWL_STATE_DB = 'crawl_state.sqlite'
+CRAWL_RECHECK_AFTER = 7 * 24 * 3600   # Seconds
+
+# --- Output Schema ---
+FINAL_COLUMNS = [
+    'Tender ID/Reference Number', 'Tender Title', 'Issuing Authority',
+    'Publication Date', 'Award Date', 'Contract Duration',
+    # Adjusted value columns based on typical Contracts Finder data
+    'Final Contract Price (Original)', 'Estimated Contract Value (INR)', # Keep INR for consistency if UK FaT had it
+    'Estimated Contract Value (Original)', 'Currency (Original)',
+    'Winning Company/Companies', 'List of Participating Companies (bidders)',
+    'Number of units/doses required', 'Source URL'
+]
+# One row per lot of a multi-lot notice (parse_uk_tender(include_lots=True)), keyed back to its notice
+LOT_COLUMNS = [
+    'Tender ID/Reference Number', 'Lot', 'Lot Title', 'Contract Duration', 'Award Date',
+    'Winning Company/Companies', 'Final Contract Price (Original)', 'Estimated Contract Value (Original)',
+    'List of Participating Companies (bidders)', 'Source URL'
+]
 
 # --- Helper Functions ---
 
-def fetch_dynamic_html(url, wait_for_selector=None, wait=5, timeout=60):
-    """Fetches fully rendered HTML using Playwright."""
+def fetch_dynamic_html(url, wait_for_selector=None, timeout=60):
+    """Fetches fully rendered HTML using a pooled Playwright page.
+
+    Returns as soon as `wait_for_selector` appears, or once the network is idle
+    if there is no selector; there is no fixed sleep.
+    """
     logging.info(f"Rendering page via Playwright: {url}")
+    from browser_pool import get_browser_pool
+    from render_profile import RenderMeter, navigation_wait_until, render_stats
     html_content = None
-    playwright_instance = None
-    browser = None
-    context = None
-    page = None
+    pool = get_browser_pool(size=BROWSER_POOL_SIZE, max_uses=BROWSER_MAX_PAGE_USES,
+                            headless=BROWSER_HEADLESS, user_agent=USER_AGENT, render_profile=RENDER_PROFILE)
     try:
-        playwright_instance = sync_playwright().start()
-        browser = playwright_instance.chromium.launch(headless=False, args=["--no-sandbox"])
-        context = browser.new_context(user_agent=USER_AGENT)
-        page = context.new_page()
-        page.set_default_timeout(timeout * 1000)
-
-        logging.info(f"Navigating to {url}...")
-        page.goto(url, wait_until="load", timeout=timeout * 1000)
-        logging.info("Initial page load complete.")
-
-        if wait_for_selector:
-            logging.info(f"Waiting for selector: '{wait_for_selector}' (up to {timeout // 2}s)")
-            page.locator(wait_for_selector).wait_for(timeout=(timeout // 2 * 1000))
-            logging.info(f"Selector '{wait_for_selector}' found.")
-        else:
-             logging.info(f"Waiting {wait} seconds for dynamic content...")
-             page.wait_for_timeout(wait * 1000)
-
-        html_content = page.content()
+        with pool.page() as page, RenderMeter(page) as meter:
+            page.set_default_timeout(timeout * 1000)
+
+            logging.info(f"Navigating to {url}...")
+            with timed('navigate', profile=pool.render_profile):
+                page.goto(url, wait_until=navigation_wait_until(pool.render_profile), timeout=timeout * 1000)
+
+            with timed('ready_wait', profile=pool.render_profile):
+                if wait_for_selector:
+                    logging.info(f"Waiting for selector: '{wait_for_selector}' (up to {timeout // 2}s)")
+                    page.locator(wait_for_selector).wait_for(timeout=(timeout // 2 * 1000))
+                    logging.info(f"Selector '{wait_for_selector}' found.")
+                else:
+                    logging.info(f"Waiting for network idle (up to {timeout // 2}s)")
+                    page.wait_for_load_state('networkidle', timeout=(timeout // 2 * 1000))
+
+            html_content = page.content()
+        render_stats.record(url, pool.render_profile, meter)
         logging.info(f"Successfully rendered and fetched HTML for {url} (Length: {len(html_content)} bytes)")
 
     except Exception as e:
+        # The pool recycles the page on error; the browser stays warm for the next URL
         logging.error(f"Playwright failed to render {url}: {e}")
         html_content = None # Ensure None is returned on error
-    finally:
-        # Gracefully close resources
-        if page:
-            try: page.close()
-            except Exception as e: logging.error(f"Error closing page: {e}")
-        if context:
-             try: context.close()
-             except Exception as e: logging.error(f"Error closing context: {e}")
-        if browser:
-            try: browser.close()
-            except Exception as e: logging.error(f"Error closing browser: {e}")
-        if playwright_instance:
-             try: playwright_instance.stop()
-             except Exception as e: logging.error(f"Error stopping Playwright: {e}")
 
     return html_content
 
 
+def fetch_notice_html(url, wait_for_selector=None):
+    """Fetches notice HTML from the page cache or pooled plain HTTP, escalating to Playwright only if the page check fails."""
+    from fetch_strategy import fetch_with_fallback
+    _, site = detect_site(url)
+    html_content, _ = fetch_with_fallback(
+        url,
+        is_ready=lambda html: is_page_ready(html, site),
+        render=lambda: fetch_dynamic_html(url, wait_for_selector=wait_for_selector),
+        user_agent=USER_AGENT,
+        cache=get_page_cache(PAGE_CACHE_DIR, ttl=PAGE_CACHE_TTL, max_bytes=PAGE_CACHE_MAX_BYTES),
+    )
+    return html_content
+
+def is_page_ready(html_content, site):
+    """Cheap check that server-rendered HTML already contains the site's notice markup."""
+    if not html_content or not site: return False
+    return site['ready_pattern'].search(html_content) is not None
+
+
 def clean_currency(text, rate):
-    if not text: return None, None
-    cleaned_text = re.sub(r'[£€,]', '', text.split(' ')[0]).replace(' ', '').replace('\xa0', '')
-    try:
-        original_value = float(cleaned_text)
-        inr_value = round(original_value * rate, 2)
-        return original_value, inr_value
-    except (ValueError, TypeError):
-        return None, None
+    """(amount, amount * rate rounded to 2 places) from money text like '£1,234,567 excluding VAT'."""
+    original_value = get_amount_parser().parse(text)
+    if original_value is None: return None, None
+    return original_value, round(original_value * rate, 2)
 
 def clean_date(text, date_format='%d %B %Y'):
-    if not text: return None
-    try:
-        date_part = text.split(',')[0].strip()
-        return datetime.strptime(date_part, date_format).strftime('%Y-%m-%d')
-    except (ValueError, AttributeError):
-        for fmt in ['%Y-%m-%d', '%d/%m/%Y', '%d %b %Y']:
-            try:
-                # Handle potential extra text like '(by 5:00pm)'
-                date_only = text.strip().split('(')[0].strip()
-                return datetime.strptime(date_only, fmt).strftime('%Y-%m-%d')
-            except (ValueError, TypeError):
-                continue
-        logging.warning(f"Could not parse date: '{text}' with any known format.")
-        return text
+    """YYYY-MM-DD from a notice date (see normalize.DateNormalizer); unparseable text is returned as-is."""
+    return get_date_normalizer(date_format).parse(text)
+
+_exchange_rates = None
+
+def get_exchange_rates():
+    """The GBP to INR rate table, loaded on first use (see EXCHANGE_RATES_FILE)."""
+    global _exchange_rates
+    if _exchange_rates is None:
+        _exchange_rates = load_exchange_rates(EXCHANGE_RATES_FILE, GBP_TO_INR_RATE)
+    return _exchange_rates
+
+def normalize_tender_records(records, source=None):
+    """Batch-normalizes raw records (parsed with normalize=False) in place; see normalize.normalize_records.
+    `source` is the parser's label; it keys the cached date formats and the field metrics."""
+    normalize_records(records, get_exchange_rates(), source=source)
+    for record in records: record_fields(source, record)
+    return records
 
 # --- Scraper 1: UK Find a Tender (find-tender.service.gov.uk) ---
 
-def scrape_uk_tender(url):
-    """Scrapes the tender notice from the UK Find a Tender service using Playwright or local file."""
-    logging.info(f"--- Processing UK Find a Tender ---")
-    html_file_path = OUTPUT_HTML_FILES[0]
-    html_content = None
+# Only the notice body is parsed; it holds the title, identifier, dates and all sections.
+FINDATENDER_CONTENT_SCOPE = 'main'
+FINDATENDER_PARSER = 'find-tender'  # Label for this parser's metrics
+
+# Field extractors over notice_index.SectionIndex sections; each takes a Section (or None).
+FRAMEWORK_PERIOD_PATTERN = re.compile(r'Period of framework:\s*(\d{1,2}\s+\w+\s+\d{4})\s+to\s+(\d{1,2}\s+\w+\s+\d{4})', re.IGNORECASE)
+TENDERS_RECEIVED_PATTERN = re.compile(r'Number of tenders received:', re.I)
+NOTICE_IDENTIFIER_PATTERN = re.compile(r'Notice identifier:', re.I)
+PUBLISHED_PATTERN = re.compile(r'Published', re.I)
+
+def _uk_winners(contractor_sections):
+    """First value line (the company name) of each V.2.3 contractor section."""
+    winners = []
+    for section in contractor_sections:
+        winner_p = section.first_value('p')
+        if winner_p: winners.append(winner_p.get_text(strip=True))
+    return winners
+
+def _uk_value_texts(value_section):
+    """(final price text, initial estimate text) from a V.2.4 section."""
+    final_price_text, est_price_text = None, None
+    if value_section:
+        for p in value_section.value_tags(('p',), limit=2):
+            p_text = p.get_text()
+            if 'Initial estimated' in p_text: est_price_text = p_text.split(':')[-1].strip()
+            elif 'Total value' in p_text: final_price_text = p_text.split(':')[-1].strip()
+    return final_price_text, est_price_text
+
+def _uk_duration(duration_section):
+    """(start, end) date texts from a II.2.7 duration section."""
+    start_date, end_date = None, None
+    if duration_section:
+        for tag in duration_section.value_tags(('p', 'dd'), limit=5):
+            tag_text = tag.get_text()
+            if 'Start date:' in tag_text: start_date = tag_text.replace('Start date:', '').strip() or None
+            elif 'End date:' in tag_text: end_date = tag_text.replace('End date:', '').strip() or None
+            if start_date and end_date: break
+    return start_date, end_date
+
+def _uk_framework_period(description_section):
+    """(start, end) date texts from 'Period of framework: ... to ...' in a II.1.4 short description."""
+    desc_p = description_section.first_value('p', class_='govuk-body') if description_section else None
+    if desc_p:
+        match = FRAMEWORK_PERIOD_PATTERN.search(desc_p.get_text())
+        if match:
+            return match.group(1), match.group(2)
+    return None, None
+
+def _uk_bidders(tenders_section):
+    """Tender count from the 'Number of tenders received:' line of a V.2.2 section."""
+    if not tenders_section: return None
+    for p in tenders_section.value_tags(('p',)):
+        if p.string and TENDERS_RECEIVED_PATTERN.search(p.string):
+            return p.get_text(strip=True).split(':')[-1].strip()
+    return None
+
+def extract_uk_lots(index):
+    """Per-lot details from a SectionIndex, one dict per lot id in numeric order."""
+    lots = []
+    for lot in index.lots():
+        title_section = index.first('II.2.1', lot)
+        title_p = title_section.first_value('p') if title_section else None
+        start_text, end_text = _uk_duration(index.first('II.2.7', lot))
+        start_date, end_date = clean_date(start_text, '%d %B %Y'), clean_date(end_text, '%d %B %Y')
+        award_date_section = index.first('V.2.1', lot)
+        award_date_p = award_date_section.first_value('p') if award_date_section else None
+        winners = _uk_winners(index.get('V.2.3', lot))
+        final_price_text, est_price_text = _uk_value_texts(index.first('V.2.4', lot))
+        lots.append({
+            'Lot': lot,
+            'Lot Title': title_p.get_text(strip=True) if title_p else None,
+            'Contract Duration': f"{start_date} to {end_date}" if start_date and end_date else None,
+            'Award Date': clean_date(award_date_p.get_text(strip=True), '%d %B %Y') if award_date_p else None,
+            'Winning Company/Companies': ", ".join(winners) if winners else None,
+            'Final Contract Price (Original)': clean_currency(final_price_text, 1)[0],
+            'Estimated Contract Value (Original)': clean_currency(est_price_text, 1)[0],
+            'List of Participating Companies (bidders)': _uk_bidders(index.first('V.2.2', lot)),
+        })
+    return lots
 
-    if os.path.exists(html_file_path):
-        logging.info(f"Found existing HTML file: {html_file_path}. Reading from file.")
-        try:
-            with open(html_file_path, 'r', encoding='utf-8') as f: html_content = f.read()
-            if not html_content: logging.warning(f"Existing HTML file {html_file_path} is empty. Will try fetching.")
-            else: logging.info(f"Successfully read HTML from {html_file_path}")
-        except Exception as e:
-            logging.error(f"Error reading HTML file {html_file_path}: {e}. Will try fetching.")
-            html_content = None
 
+def scrape_uk_tender(url):
+    """Scrapes the tender notice from the UK Find a Tender service (page cache, plain HTTP or Playwright)."""
+    logging.info(f"--- Processing UK Find a Tender ---")
+    html_content = fetch_notice_html(url, wait_for_selector='h1.govuk-heading-l')
     if not html_content:
-        logging.info(f"No valid local HTML found. Fetching from URL: {url}")
-        html_content = fetch_dynamic_html(url, wait_for_selector='h1.govuk-heading-l', wait=5)
-        if html_content:
-            try:
-                with open(html_file_path, 'w', encoding='utf-8') as f: f.write(html_content)
-                logging.info(f"Saved fetched UK HTML to {html_file_path}")
-            except IOError as e: logging.error(f"Failed to save fetched UK HTML: {e}")
-        else:
-            logging.error(f"Failed to fetch HTML for UK URL {url}. Cannot proceed.")
-            return None
-
-    soup = BeautifulSoup(html_content, 'html.parser')
+        logging.error(f"Failed to fetch HTML for UK URL {url}. Cannot proceed.")
+        return None
+
+    with timed('parse', parser=FINDATENDER_PARSER):
+        return parse_uk_tender(html_content, url)
+
+def parse_uk_tender(html_content, url, include_lots=False, backend=None, normalize=True):
+    """Extracts the tender fields from Find a Tender notice HTML.
+
+    With include_lots=True the record also gets a 'Lots' list with per-lot
+    titles, durations, award dates, winners, values and bidder counts. With
+    normalize=False, dates and money are left as page text for a later
+    normalize_tender_records() batch.
+    """
+    with timed('soup', parser=FINDATENDER_PARSER):
+        soup = make_soup(html_content, scope=FINDATENDER_CONTENT_SCOPE, backend=backend)
     data = {"Source URL": url, "Currency (Original)": "GBP"}
 
-    try: data['Tender Title'] = soup.find('h1', class_='govuk-heading-l').get_text(strip=True)
-    except Exception: data['Tender Title'] = None
+    h1_title = soup.find('h1', class_='govuk-heading-l')
+    try: data['Tender Title'] = h1_title.get_text(strip=True)
+    except Exception as e: data['Tender Title'] = field_error(FINDATENDER_PARSER, 'Tender Title', e)
     try:
-        id_p = soup.find('p', string=re.compile(r'Notice identifier:', re.I))
+        id_p = soup.find('p', string=NOTICE_IDENTIFIER_PATTERN)
         data['Tender ID/Reference Number'] = id_p.get_text(strip=True).replace('Notice identifier:', '').strip() if id_p else None
-    except Exception: data['Tender ID/Reference Number'] = None
+    except Exception as e: data['Tender ID/Reference Number'] = field_error(FINDATENDER_PARSER, 'Tender ID/Reference Number', e)
     try:
-        pub_p = soup.find('p', string=re.compile(r'Published', re.I))
-        pub_date_text = pub_p.get_text(strip=True).replace('Published', '').strip() if pub_p else None
-        data['Publication Date'] = clean_date(pub_date_text, '%d %B %Y')
-    except Exception: data['Publication Date'] = None
+        pub_p = soup.find('p', string=PUBLISHED_PATTERN)
+        data['Publication Date'] = pub_p.get_text(strip=True).replace('Published', '').strip() if pub_p else None
+    except Exception as e: data['Publication Date'] = field_error(FINDATENDER_PARSER, 'Publication Date', e)
     try:
-        h1_title = soup.find('h1', class_='govuk-heading-l')
         authority_ul = h1_title.find_next('ul', class_='govuk-list') if h1_title else None
         authority_li = authority_ul.find('li') if authority_ul else None
         data['Issuing Authority'] = authority_li.get_text(strip=True) if authority_li else None
-    except Exception: data['Issuing Authority'] = None
+    except Exception as e: data['Issuing Authority'] = field_error(FINDATENDER_PARSER, 'Issuing Authority', e)
+    with timed('section_index', parser=FINDATENDER_PARSER): index = SectionIndex(soup)
     try:
-        award_date_span = soup.find('span', string=re.compile(r'V\.2\.1\)\s+Date of conclusion of the contract', re.I))
-        h4_award_date = award_date_span.find_parent('h4') if award_date_span else None
-        award_date_p = h4_award_date.find_next_sibling('p') if h4_award_date else None
-        data['Award Date'] = clean_date(award_date_p.get_text(strip=True), '%d %B %Y') if award_date_p else None
-    except Exception: data['Award Date'] = None
+        award_date_section = index.first('V.2.1')
+        award_date_p = award_date_section.first_value('p') if award_date_section else None
+        data['Award Date'] = award_date_p.get_text(strip=True) if award_date_p else None
+    except Exception as e: data['Award Date'] = field_error(FINDATENDER_PARSER, 'Award Date', e)
     try:
-        winners = []
-        winner_spans = soup.find_all('span', string=re.compile(r'V\.2\.3\)\s+Name and address of the contractor', re.I))
-        for winner_span in winner_spans:
-            h4_winner = winner_span.find_parent('h4')
-            winner_p = h4_winner.find_next_sibling('p') if h4_winner else None
-            if winner_p: winners.append(winner_p.get_text(strip=True))
+        winners = _uk_winners(index.get('V.2.3'))
         data['Winning Company/Companies'] = ", ".join(winners) if winners else None
-    except Exception: data['Winning Company/Companies'] = None
+    except Exception as e: data['Winning Company/Companies'] = field_error(FINDATENDER_PARSER, 'Winning Company/Companies', e)
     try:
-        value_span = soup.find('span', string=re.compile(r'V\.2\.4\)\s+Information on value of contract/lot', re.I))
-        final_price_text, est_price_text = None, None
-        if value_span:
-            h4_values = value_span.find_parent('h4')
-            if h4_values:
-                p1 = h4_values.find_next_sibling('p')
-                p2 = p1.find_next_sibling('p') if p1 else None
-                if p1:
-                    p1_text = p1.get_text()
-                    if 'Initial estimated' in p1_text: est_price_text = p1_text.split(':')[-1].strip()
-                    elif 'Total value' in p1_text: final_price_text = p1_text.split(':')[-1].strip()
-                if p2:
-                    p2_text = p2.get_text()
-                    if 'Initial estimated' in p2_text: est_price_text = p2_text.split(':')[-1].strip()
-                    elif 'Total value' in p2_text: final_price_text = p2_text.split(':')[-1].strip()
-        data['Final Contract Price (Original)'], _ = clean_currency(final_price_text, 1)
-        val, inr = clean_currency(est_price_text, GBP_TO_INR_RATE)
-        data['Estimated Contract Value (Original)'] = val
-        data['Estimated Contract Value (INR)'] = inr
-    except Exception: data['Final Contract Price (Original)'], data['Estimated Contract Value (Original)'], data['Estimated Contract Value (INR)'] = None, None, None
+        final_price_text, est_price_text = _uk_value_texts(index.first('V.2.4'))
+        data['Final Contract Price (Original)'] = final_price_text
+        data['Estimated Contract Value (Original)'] = est_price_text
+        data['Estimated Contract Value (INR)'] = est_price_text  # Converted at the publication-date rate
+    except Exception as e:
+        field_error(FINDATENDER_PARSER, 'Contract Values', e)
+        data['Final Contract Price (Original)'], data['Estimated Contract Value (Original)'], data['Estimated Contract Value (INR)'] = None, None, None
     try:
-        start_date, end_date = None, None
-        lot1_section = soup.find(id='object-1-lot-1')
-        h4_duration_heading_span = lot1_section.find('span', string=re.compile(r'II\.2\.7\)\s+Duration of the contract', re.I)) if lot1_section else None
-        if h4_duration_heading_span:
-            h4_duration = h4_duration_heading_span.find_parent('h4')
-            if h4_duration:
-                possible_tags = h4_duration.find_next_siblings(['p','dd'], limit=5)
-                for tag in possible_tags:
-                    tag_text = tag.get_text()
-                    if 'Start date:' in tag_text: start_date = clean_date(tag_text.replace('Start date:', '').strip(), '%d %B %Y')
-                    elif 'End date:' in tag_text: end_date = clean_date(tag_text.replace('End date:', '').strip(), '%d %B %Y')
-                    if start_date and end_date: break
+        start_date, end_date = _uk_duration(index.first('II.2.7', lot='1'))
         if not (start_date and end_date):
-            desc_heading_span = soup.find('span', string=re.compile(r'II\.1\.4\)\s+Short description', re.I))
-            desc_h4 = desc_heading_span.find_parent('h4') if desc_heading_span else None
-            desc_p = desc_h4.find_next_sibling('p', class_='govuk-body') if desc_h4 else None
-            if desc_p:
-                desc_text = desc_p.get_text()
-                match = re.search(r'Period of framework:\s*(\d{1,2}\s+\w+\s+\d{4})\s+to\s+(\d{1,2}\s+\w+\s+\d{4})', desc_text, re.IGNORECASE)
-                if match:
-                    start_date = clean_date(match.group(1), '%d %B %Y')
-                    end_date = clean_date(match.group(2), '%d %B %Y')
-        data['Contract Duration'] = f"{start_date} to {end_date}" if start_date and end_date else None
-    except Exception: data['Contract Duration'] = None
+            start_date, end_date = _uk_framework_period(index.first('II.1.4'))
+        data['Contract Duration'] = (start_date, end_date)
+    except Exception as e: data['Contract Duration'] = field_error(FINDATENDER_PARSER, 'Contract Duration', e)
     try:
-        bidders_span = soup.find('span', string=re.compile(r'V\.2\.2\)\s+Information about tenders', re.I))
-        h4_bidders = bidders_span.find_parent('h4') if bidders_span else None
-        bidders_p = h4_bidders.find_next_sibling('p', string=re.compile(r'Number of tenders received:', re.I)) if h4_bidders else None
-        data['List of Participating Companies (bidders)'] = bidders_p.get_text(strip=True).split(':')[-1].strip() if bidders_p else None
-    except Exception: data['List of Participating Companies (bidders)'] = None
+        data['List of Participating Companies (bidders)'] = _uk_bidders(index.first('V.2.2'))
+    except Exception as e: data['List of Participating Companies (bidders)'] = field_error(FINDATENDER_PARSER, 'List of Participating Companies (bidders)', e)
     data['Number of units/doses required'] = None
+    if include_lots:
+        data['Lots'] = extract_uk_lots(index)
 
+    if normalize: normalize_tender_records([data], FINDATENDER_PARSER)
     if data.get('Tender Title') or data.get('Issuing Authority'):
         logging.info("Successfully parsed UK Find a Tender.")
     else:
-        logging.warning("Parsed UK Find a Tender, but key fields seem missing. Review html_FindATender.html.")
+        logging.warning(f"Parsed UK Find a Tender, but key fields seem missing. Review the cached page for {url}.")
     return data
 
 # --- Scraper 2: UK Contracts Finder (contractsfinder.service.gov.uk) --- REVISED
+
+# The page has no <main>; the notice body sits in this wrapper.
+CONTRACTSFINDER_CONTENT_SCOPE = '#all-content-wrapper'
+CONTRACTSFINDER_PARSER = 'contracts-finder'
+
+# Field spec, compiled once (see extraction_spec). Values are labelled by <h4><strong> headings, each
+# followed by a <p>; the award and buyer details sit in the blocks under these <h3> headings.
+CONTRACTSFINDER_SPEC = ExtractionSpec(CONTRACTSFINDER_PARSER, sections={
+    'award': 'Award information',
+    'buyer': 'About the buyer',
+}, fields={
+    'Tender Title': Field('govuk-heading-l', 'title'),
+    'Tender ID/Reference Number': Field(r'/notice/([\w-]+)', 'url'),
+    # Buyer from the summary list; many notices only name a contact, used as a proxy
+    'Issuing Authority': (Field('Buyer:', 'next_dd'), Field('Contact name', 'next_p', section='buyer')),
+    'Publication Date': Field('Published date', 'next_p'),
+    'Award Date': Field('Awarded date', 'next_p', section='award'),
+    'Final Contract Price (Original)': Field('Total value of contract', 'next_p', section='award'),
+    'Contract Duration': Field(('Contract start date', 'Contract end date'), 'next_p', section='award'),
+    # Every other heading in the award block is a supplier name
+    'Winning Company/Companies': Field(None, 'unlabelled', section='award'),
+})
+
 def scrape_contracts_finder_tender(url):
-    """Scrapes the tender notice from the UK Contracts Finder service using Playwright or local file."""
+    """Scrapes the tender notice from the UK Contracts Finder service (page cache, plain HTTP or Playwright)."""
     logging.info(f"--- Processing UK Contracts Finder Tender ---")
-    html_file_path = OUTPUT_HTML_FILES[1] # Use the second filename
-    html_content = None
-
-    # --- Check if HTML file exists ---
-    if os.path.exists(html_file_path):
-        logging.info(f"Found existing HTML file: {html_file_path}. Reading from file.")
-        try:
-            with open(html_file_path, 'r', encoding='utf-8') as f: html_content = f.read()
-            if not html_content: logging.warning(f"Existing HTML file {html_file_path} is empty. Will try fetching.")
-            else: logging.info(f"Successfully read HTML from {html_file_path}")
-        except Exception as e:
-            logging.error(f"Error reading HTML file {html_file_path}: {e}. Will try fetching.")
-            html_content = None
-
-    # --- Fetch if file doesn't exist or read failed ---
+    # Use the confirmed correct selector for the title
+    html_content = fetch_notice_html(url, wait_for_selector='h1.govuk-heading-l')
     if not html_content:
-        logging.info(f"No valid local HTML found. Fetching from URL: {url}")
-        # Use the confirmed correct selector for the title
-        html_content = fetch_dynamic_html(url, wait_for_selector='h1.govuk-heading-l', wait=3)
-        if html_content:
-            try:
-                with open(html_file_path, 'w', encoding='utf-8') as f: f.write(html_content)
-                logging.info(f"Saved fetched Contracts Finder HTML to {html_file_path}")
-            except IOError as e: logging.error(f"Failed to save fetched Contracts Finder HTML: {e}")
-        else:
-            logging.error(f"Failed to fetch HTML for Contracts Finder URL {url}. Cannot proceed.")
-            return None
+        logging.error(f"Failed to fetch HTML for Contracts Finder URL {url}. Cannot proceed.")
+        return None
 
-    # --- Proceed with Parsing ---
-    soup = BeautifulSoup(html_content, 'html.parser')
-    data = {"Source URL": url, "Currency (Original)": "GBP"}
+    with timed('parse', parser=CONTRACTSFINDER_PARSER):
+        return parse_contracts_finder_tender(html_content, url)
 
-    # --- Helper to find data following a specific H4 heading ---
-    def find_data_after_h4(context_soup, heading_text):
-        try:
-            # Find h4 containing the strong tag with the text
-            h4_tag = context_soup.find(lambda tag: tag.name == 'h4' and tag.find('strong', string=re.compile(r'\s*' + re.escape(heading_text) + r'\s*', re.I)))
-            if h4_tag:
-                p_tag = h4_tag.find_next_sibling('p')
-                if p_tag:
-                    return p_tag.get_text(strip=True)
-            return None
-        except Exception: return None
-
-    # --- Extract data ---
-    try:
-        # Title selector confirmed from screenshot
-        title_tag = soup.find('h1', class_='govuk-heading-l') # Use correct class 'l' not 'xl'
-        data['Tender Title'] = title_tag.get_text(strip=True) if title_tag else None
-    except Exception: data['Tender Title'] = None
-
-    try:
-        match = re.search(r'/notice/([\w-]+)', url)
-        data['Tender ID/Reference Number'] = match.group(1) if match else None
-    except Exception: data['Tender ID/Reference Number'] = None
-
-    # Issuing Authority - Attempt to find "Buyer:" in summary list first
-    try:
-        buyer_dt = soup.find('dt', class_='govuk-summary-list__key', string=re.compile(r'\s*Buyer:\s*', re.I))
-        if buyer_dt:
-            buyer_dd = buyer_dt.find_next_sibling('dd', class_='govuk-summary-list__value')
-            data['Issuing Authority'] = buyer_dd.get_text(strip=True) if buyer_dd else None
-        else:
-            # Fallback: Get Contact Name from "About the buyer" section
-            logging.info("Buyer name not in summary list, looking for Contact Name.")
-            about_buyer_heading = soup.find('h3', string=re.compile(r'About the buyer', re.I))
-            if about_buyer_heading:
-                 # Use the helper function to find data after 'Contact name' h4
-                 contact_name = find_data_after_h4(about_buyer_heading.parent, 'Contact name')
-                 data['Issuing Authority'] = contact_name # Use contact name as proxy
-                 logging.info(f"Using Contact Name as Issuing Authority: {contact_name}")
-            else:
-                 data['Issuing Authority'] = None
-                 logging.warning("Could not find Buyer or Contact Name.")
-
-    except Exception as e:
-         logging.warning(f"Error parsing Issuing Authority: {e}")
-         data['Issuing Authority'] = None
-
-
-    # Find data within the "Award information" section
-    award_info_heading = soup.find('h3', string=re.compile(r'Award information', re.I))
-    award_info_section = award_info_heading.parent if award_info_heading else soup # Search within this section
-
-    data['Publication Date'] = clean_date(find_data_after_h4(soup, 'Published date'), '%d %B %Y') # Look page-wide
-    data['Award Date'] = clean_date(find_data_after_h4(award_info_section, 'Awarded date'), '%d %B %Y')
+def parse_contracts_finder_tender(html_content, url, include_lots=False, backend=None, normalize=True):
+    """Extracts the tender fields from Contracts Finder notice HTML (see parse_uk_tender for
+    `normalize`). Its notices have no lot sections, so include_lots gives an empty 'Lots' list."""
+    with timed('soup', parser=CONTRACTSFINDER_PARSER):
+        soup = make_soup(html_content, scope=CONTRACTSFINDER_CONTENT_SCOPE, backend=backend)
+    data = {"Source URL": url, "Currency (Original)": "GBP"}
+    data.update(CONTRACTSFINDER_SPEC.extract(soup, url))
+    if not data.get('Issuing Authority'): logging.warning("Could not find Buyer or Contact Name.")
 
-    value_text = find_data_after_h4(award_info_section, 'Total value of contract')
-    val, inr = clean_currency(value_text, GBP_TO_INR_RATE)
-    data['Final Contract Price (Original)'] = val
     data['Estimated Contract Value (Original)'] = None # Still likely unavailable
     data['Estimated Contract Value (INR)'] = None # Still likely unavailable
-
-    start_date_text = find_data_after_h4(award_info_section, 'Contract start date')
-    end_date_text = find_data_after_h4(award_info_section, 'Contract end date')
-    start_date = clean_date(start_date_text, '%d %B %Y')
-    end_date = clean_date(end_date_text, '%d %B %Y')
-    data['Contract Duration'] = f"{start_date} to {end_date}" if start_date and end_date else None
-
-    # Get Winners
-    try:
-        winners = []
-        if award_info_section:
-            # Find all H4s directly within the award info section that don't contain standard labels
-            possible_winner_h4s = award_info_section.find_all('h4', recursive=False) # Only direct children H4s
-            standard_labels = ['awarded date', 'contract start date', 'contract end date', 'total value of contract']
-            for h4 in possible_winner_h4s:
-                 h4_text = h4.get_text(strip=True).lower()
-                 is_standard_label = any(label in h4_text for label in standard_labels)
-                 if not is_standard_label:
-                     # Assume this H4 contains the winner name (often within a strong tag)
-                     winner_name_tag = h4.find('strong') or h4
-                     winner_name = winner_name_tag.get_text(strip=True)
-                     if winner_name: winners.append(winner_name)
-            data['Winning Company/Companies'] = ", ".join(winners) if winners else None
-        else: data['Winning Company/Companies'] = None
-    except Exception as e:
-         logging.warning(f"Could not parse CF Winners: {e}")
-         data['Winning Company/Companies'] = None
-
     data['List of Participating Companies (bidders)'] = None # Not available
     data['Number of units/doses required'] = None # Not available
+    if include_lots: data['Lots'] = []
 
+    if normalize: normalize_tender_records([data], CONTRACTSFINDER_PARSER)
     if data.get('Tender Title') or data.get('Issuing Authority'):
         logging.info("Successfully parsed Contracts Finder tender.")
     else:
-        logging.warning("Parsed Contracts Finder tender, but key fields seem missing. Review html_ContractsFinder.html.")
+        logging.warning(f"Parsed Contracts Finder tender, but key fields seem missing. Review the cached page for {url}.")
     return data
 
+# --- Site Registry ---
+# Maps each supported host to its parser (and its label in metrics), the selector that marks a rendered notice as ready,
+# the equivalent raw-HTML pattern used to accept a plain HTTP response without rendering, and the prefix of its OCDS ocids.
+NOTICE_TITLE_PATTERN = re.compile(r'<h1\b[^>]*\bclass="[^"]*\bgovuk-heading-l\b', re.I)
+
+SITES = {
+    'find-tender.service.gov.uk': {
+        'name': 'Find a Tender', 'parser': parse_uk_tender, 'label': FINDATENDER_PARSER,
+        'notice_url': 'https://www.find-tender.service.gov.uk/Notice/{}',
+        'ready_selector': 'h1.govuk-heading-l', 'ready_pattern': NOTICE_TITLE_PATTERN, 'ocid_prefix': 'ocds-h6vhtk',
+    },
+    'contractsfinder.service.gov.uk': {
+        'name': 'Contracts Finder', 'parser': parse_contracts_finder_tender, 'label': CONTRACTSFINDER_PARSER,
+        'notice_url': 'https://www.contractsfinder.service.gov.uk/notice/{}',
+        'ready_selector': 'h1.govuk-heading-l', 'ready_pattern': NOTICE_TITLE_PATTERN, 'ocid_prefix': 'ocds-b5fd17',
+    },
+}
+
+def detect_site(url):
+    """Returns (site_key, site_config) for a notice URL, or (None, None) if unsupported."""
+    host = (urlparse(url).hostname or '').lower()
+    for site_key, site in SITES.items():
+        if host == site_key or host.endswith('.' + site_key):
+            return site_key, site
+    return None, None
+
+# Saved pages link to their own notice (e.g. ".../Notice/008624-2023#award_contract-1").
+NOTICE_LINK_PATTERN = re.compile(r'https?://(?:www\.)?(find-tender\.service\.gov\.uk|contractsfinder\.service\.gov\.uk)/notice/([\w-]+)', re.I)
+
+def detect_site_from_html(html_content):
+    """Returns (site_key, site_config, notice_url) for saved notice HTML with no known URL."""
+    match = NOTICE_LINK_PATTERN.search(html_content or '')
+    if not match: return None, None, None
+    site_key = match.group(1).lower()
+    site = SITES[site_key]
+    return site_key, site, site['notice_url'].format(match.group(2))
+
 # --- Main Execution Block ---
 if __name__ == "__main__":
 
+    import asyncio
+    from crawl_engine import CrawlEngine
+    from fetch_strategy import fetch_path_stats
+    from render_profile import render_stats
+    from metrics import enable_metrics, write_metrics
+    from output_sink import open_sink
+    from crawl_state import CrawlState, STATUS_UPDATED
+
     # --- URLs to Scrape ---
-    UK_FINDATENDER_URL = "https://www.find-tender.service.gov.uk/Notice/008624-2023" #here we can give list of link and using for loop we can store data
+    # Any number of notice URLs can be listed; they are crawled concurrently within each site's rate limit.
+    UK_FINDATENDER_URL = "https://www.find-tender.service.gov.uk/Notice/008624-2023"
     UK_CONTRACTSFINDER_URL = "https://www.contractsfinder.service.gov.uk/notice/05c544dc-9e6f-452d-87c1-bf00f3ce73ac" # Source 2
+    NOTICE_URLS = [UK_FINDATENDER_URL, UK_CONTRACTSFINDER_URL]
+
+    # --- Search Discovery ---
+    # Set to a dict of filters (query, cpv, published_from, published_to) to also crawl every
+    # notice the sites' search results list. Each search resumes from the newest notice the
+    # previous run saw. None crawls NOTICE_URLS only.
+    SEARCH_FILTERS = None  # e.g. {'query': 'software', 'published_from': '01/01/2024'}
+
+    # --- OCDS Bulk Feed ---
+    # OCDS release files (.json/.jsonl, optionally .gz) ingested before crawling. Notices they
+    # cover are written from the feed and never fetched as HTML; the crawl handles the rest.
+    OCDS_FILES = []  # e.g. ["fts_releases_2024.jsonl.gz"]
+
+    # --- Worker Processes ---
+    # Set to a number of worker processes to crawl through the work queue (work_queue.py)
+    # instead of in this process; each worker runs its own crawl engine and browser.
+    QUEUE_WORKERS = 0  # e.g. os.cpu_count()
+
+    # --- Output ---
+    # Records are appended in batches as they are scraped (.csv, .jsonl, or .parquet: a directory
+    # of part files, one per batch).
+    OUTPUT_FILE = "tender_data.csv"
+    # Set a path to also write one row per lot of multi-lot notices (LOT_COLUMNS, same formats);
+    # None leaves lots out. The main output keeps one row per notice either way.
+    LOTS_FILE = None  # e.g. "tender_lots.csv"
+    PARSE_OPTIONS = {'include_lots': True} if LOTS_FILE else {}
+
+    # --- Metrics ---
+    # Stage timings, fetch paths, bytes, cache hits and per-field counts. Set a path to write a
+    # snapshot at the end of the run (.json, or Prometheus text otherwise); None leaves them off.
+    METRICS_FILE = None  # e.g. "metrics.prom"
+
+    if METRICS_FILE: enable_metrics()
+    page_cache = get_page_cache(PAGE_CACHE_DIR, ttl=PAGE_CACHE_TTL, max_bytes=PAGE_CACHE_MAX_BYTES)
+
+    def notice_urls(state, searches):
+        yield from NOTICE_URLS
+        yield from state.retryable_urls()
+        for search in searches:
+            search.high_water_mark = search.high_water_mark or state.get_mark(search.mark_name)
+            search.is_known = search.is_known or (lambda url: state.get(url) is not None)
+            yield from search
+
+    async def scrape_all(sink, state, searches):
+        async with CrawlEngine(cache=page_cache, state=state, headless=BROWSER_HEADLESS, render_profile=RENDER_PROFILE,
+                               parse_options=PARSE_OPTIONS) as engine:
+            for search in searches: search.fetch_through(engine)
+            async for result in engine.crawl_results(state.filter_pending(notice_urls(state, searches))):
+                if result.status == 'unchanged':
+                    state.mark_unchanged(result.url)
+                elif result.record:
+                    sink.write(result.record)
+                    status = state.mark_extracted(result.url, result.content_hash, result.record.get('Tender ID/Reference Number'))
+                    if status == STATUS_UPDATED: logging.info(f"Notice changed since last run, re-extracted: {result.url}")
+                else:
+                    state.mark_failed(result.url, result.error)
+                    logging.error(f"Scraping returned no data for {result.url}")
 
-    # Update HTML filenames list to match functions
-    OUTPUT_HTML_FILES = ['html_FindATender.html', 'html_ContractsFinder.html']
-
-    all_tender_data = []
-
-    # --- Scrape Site 1 (Find a Tender) ---
-    uk_fa_data = scrape_uk_tender(UK_FINDATENDER_URL)
-    if uk_fa_data:
-        all_tender_data.append(uk_fa_data)
-    else:
-        logging.error(f"UK Find a Tender scraping returned no data for {UK_FINDATENDER_URL}")
-
-    logging.info("Pausing for 5 seconds before next request...")
-    time.sleep(5)
-
-    # --- Scrape Site 2 (Contracts Finder) ---
-    uk_cf_data = scrape_contracts_finder_tender(UK_CONTRACTSFINDER_URL) # Call the CF function
-    if uk_cf_data:
-        all_tender_data.append(uk_cf_data)
-    else:
-        logging.error(f"UK Contracts Finder scraping returned no data for {UK_CONTRACTSFINDER_URL}")
-
-    # --- Combine and Export ---
-    if all_tender_data:
-        logging.info(f"Successfully scraped {len(all_tender_data)} tenders. Combining data...")
-        df = pd.DataFrame(all_tender_data)
-        final_columns = [
-            'Tender ID/Reference Number', 'Tender Title', 'Issuing Authority',
-            'Publication Date', 'Award Date', 'Contract Duration',
-            # Adjusted value columns based on typical Contracts Finder data
-            'Final Contract Price (Original)', 'Estimated Contract Value (INR)', # Keep INR for consistency if UK FaT had it
-            'Estimated Contract Value (Original)', 'Currency (Original)',
-            'Winning Company/Companies', 'List of Participating Companies (bidders)',
-            'Number of units/doses required', 'Source URL'
-        ]
-        df = df.reindex(columns=final_columns) # Ensure columns exist and are ordered
-        try:
-            df.to_csv("tender_data.csv", index=False, encoding='utf-8-sig')
-            logging.info("✅ Successfully saved all data to tender_data.csv")
-        except Exception as e:
-            logging.error(f"Failed to save CSV: {e}")
-    else:
-        logging.error("❌ No data was successfully scraped from any source. CSV not created.")
-
-    logging.info("Script finished.")
\ No newline at end of file
+    try:
+        # Append, so rows from an interrupted run are kept; the state store knows what is done
+        lots_sink = open_sink(LOTS_FILE, columns=LOT_COLUMNS, append=True) if LOTS_FILE else None
+        with open_sink(OUTPUT_FILE, append=True, lots=lots_sink) as sink, \
+             CrawlState(CRAWL_STATE_DB, extraction_version=EXTRACTION_VERSION, recheck_after=CRAWL_RECHECK_AFTER,
+                        before_checkpoint=sink.flush) as state:
+            if OCDS_FILES:
+                from ocds_ingest import iter_file_releases, ingest_releases
+                for path in OCDS_FILES:
+                    counts = ingest_releases(iter_file_releases(path), sink, state)
+                    logging.info(f"OCDS feed {path}: {counts['written']} written, {counts['unchanged']} unchanged")
+            searches = []
+            if SEARCH_FILTERS:
+                from discovery import SearchDiscovery, SEARCH_CONFIG
+                searches = [SearchDiscovery(site_key, **SEARCH_FILTERS) for site_key in SEARCH_CONFIG]
+            if QUEUE_WORKERS:
+                from work_queue import run_coordinator
+                # Searching here takes one worker's share of each site's budget
+                rate_share = QUEUE_WORKERS + (1 if searches else 0)
+                for search in searches: search.take_rate_share(rate_share)
+                run_coordinator(state.filter_pending(notice_urls(state, searches)), sink, state, workers=QUEUE_WORKERS,
+                                rate_share=rate_share, parse_options=PARSE_OPTIONS)
+            else:
+                asyncio.run(scrape_all(sink, state, searches))
+            # Only after a completed crawl of a search that got to its end (no failed result page),
+            # so an interrupted run rediscovers what it missed
+            for search in searches:
+                if search.completed and search.newest_url: state.set_mark(search.mark_name, search.newest_url)
+            logging.info(f"Crawl state: {state.counts()}")
+        if sink.count:
+            logging.info(f"✅ Successfully saved {sink.count} tenders to {OUTPUT_FILE}")
+            if lots_sink: logging.info(f"✅ Saved {lots_sink.count} lots to {LOTS_FILE}")
+        else:
+            logging.info(f"No new or changed tenders this run. {OUTPUT_FILE} is up to date.")
+    except Exception:
+        # Crawl, state store or output alike: log the real error with its traceback
+        logging.exception(f"Run stopped by an error. Rows already in {OUTPUT_FILE} are kept; the next run resumes.")
+
+    fetch_path_stats.log_summary()
+    render_stats.log_summary()
+    if METRICS_FILE: write_metrics(METRICS_FILE)
+    logging.info("Script finished.")
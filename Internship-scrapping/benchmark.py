@@ -0,0 +1,344 @@
+"""Benchmarks for the scraper, from single helpers up to a full crawl.
+
+Levels:
+    micro  clean_date / clean_currency over realistic string corpora (ns per call),
+           uncached, plus the memo hit path on its own (*.memo)
+    parse  parse_uk_tender / parse_contracts_finder_tender over the saved fixtures
+           replicated to --pages distinct notices (pages/sec, peak RSS), plus the
+           reparse process pool over the same pages written to disk
+    crawl  CrawlEngine against a local HTTP server that serves the fixtures with
+           --latency ms per response (pages/sec, wall time)
+
+Results are JSON (one entry per metric, with the direction that counts as
+better), so two runs can be compared:
+
+    python benchmark.py -o before.json
+    python benchmark.py -o after.json --compare before.json
+
+Parse cases run in a fresh process each, so their peak RSS is their own.
+Log output below ERROR is suppressed while measuring.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import contextmanager
+import multiprocessing
+import subprocess
+import threading
+import platform
+import argparse
+import tempfile
+import logging
+import timeit
+import json
+import time
+import sys
+import os
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; peak RSS is reported as null
+    resource = None
+
+import Scrape_tenders
+from Scrape_tenders import clean_date, clean_currency, parse_uk_tender, parse_contracts_finder_tender, GBP_TO_INR_RATE
+from parser_backend import get_parser_backend, set_parser_backend
+from normalize import DateNormalizer, AmountParser
+
+# --- Benchmark Configuration ---
+HERE = os.path.dirname(os.path.abspath(__file__))
+FINDATENDER_FIXTURE = os.path.join(HERE, 'html_FindATender.html')
+CONTRACTSFINDER_FIXTURE = os.path.join(HERE, 'html_ContractsFinder.html')
+FINDATENDER_FIXTURE_ID = '008624-2023'
+CONTRACTSFINDER_FIXTURE_ID = '05c544dc-9e6f-452d-87c1-bf00f3ce73ac'
+
+LEVELS = ('micro', 'parse', 'crawl')
+DEFAULT_PARSE_PAGES = 2000
+DEFAULT_CRAWL_PAGES = 200
+DEFAULT_LATENCY_MS = 50
+DEFAULT_THRESHOLD = 0.10  # Relative change that --compare reports as a regression
+
+# Strings as they appear on the notice pages, including the fallback formats and misses
+DATE_CORPUS = [
+    '14 March 2023', '1 January 2024', '30 September 2025, 11:59pm', '7 June 2023',
+    '2023-03-14', '14/03/2023', '5 Sep 2023', '31 December 2025 (by 5:00pm)', 'Not specified', '',
+]
+CURRENCY_CORPUS = [
+    '£1,234,567', '£12,000,000 excluding VAT', '£450,000.00', '€ 50,000', '1500000',
+    '£0', '£1,234.56', '£2,500,000 including VAT', 'Value not provided', '',
+]
+
+
+# --- Results ---
+
+def result(name, metric, value, unit, better):
+    return {'name': name, 'metric': metric, 'value': value, 'unit': unit, 'better': better}
+
+
+def peak_rss_bytes():
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # bytes on macOS, KiB on Linux
+
+
+def run_metadata(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(), 'platform': platform.platform(),
+        'cpus': os.cpu_count(), 'parser_backend': get_parser_backend(),
+        'parse_pages': args.pages, 'crawl_pages': args.crawl_pages, 'latency_ms': args.latency,
+    }
+
+
+@contextmanager
+def quiet_logging():
+    logging.disable(logging.WARNING)
+    try: yield
+    finally: logging.disable(logging.NOTSET)
+
+
+# --- Fixtures ---
+
+def read_fixture(path):
+    with open(path, 'r', encoding='utf-8') as f: return f.read()
+
+
+def replicated_pages(count, kind=None):
+    """Yields (kind, html, url) for `count` distinct notices, alternating between the
+    two fixtures (or only `kind`) with the notice ID rewritten, so no page repeats."""
+    findatender, contractsfinder = read_fixture(FINDATENDER_FIXTURE), read_fixture(CONTRACTSFINDER_FIXTURE)
+    for i in range(count):
+        if kind == 'find-tender' or (kind is None and i % 2 == 0):
+            notice_id = f"{i:06d}-2023"
+            yield ('find-tender', findatender.replace(FINDATENDER_FIXTURE_ID, notice_id),
+                   f"https://www.find-tender.service.gov.uk/Notice/{notice_id}")
+        else:
+            notice_id = f"{i:08x}{CONTRACTSFINDER_FIXTURE_ID[8:]}"
+            yield ('contracts-finder', contractsfinder.replace(CONTRACTSFINDER_FIXTURE_ID, notice_id),
+                   f"https://www.contractsfinder.service.gov.uk/notice/{notice_id}")
+
+
+# --- Level 1: Micro-benchmarks ---
+
+def _uncached_dates(corpus):
+    dates = DateNormalizer('%d %B %Y')  # Fresh per pass: every string is actually parsed
+    return [dates.parse(text) for text in corpus]
+
+
+def _uncached_amounts(corpus):
+    amounts = AmountParser()
+    return [(value, round(value * GBP_TO_INR_RATE, 2)) if value is not None else (None, None)
+            for value in map(amounts.parse, corpus)]
+
+
+def bench_micro(repeat=5):
+    # clean_date / clean_currency share process-wide memos, which are warm after the
+    # first pass; those runs time the memo hit path, reported separately as *.memo
+    cases = {
+        'clean_date': (DATE_CORPUS, _uncached_dates),
+        'clean_currency': (CURRENCY_CORPUS, _uncached_amounts),
+        'clean_date.memo': (DATE_CORPUS, lambda corpus: [clean_date(text, '%d %B %Y') for text in corpus]),
+        'clean_currency.memo': (CURRENCY_CORPUS, lambda corpus: [clean_currency(text, GBP_TO_INR_RATE) for text in corpus]),
+    }
+    results = []
+    with quiet_logging():
+        for name, (corpus, run) in cases.items():
+            timer = timeit.Timer(lambda: run(corpus))
+            number, _ = timer.autorange()
+            best = min(timer.repeat(repeat=repeat, number=number))
+            results.append(result(f"micro.{name}", 'time_per_call', best / (number * len(corpus)) * 1e9, 'ns', 'lower'))
+    return results
+
+
+# --- Level 2: Parse throughput ---
+
+PARSERS = {'find-tender': parse_uk_tender, 'contracts-finder': parse_contracts_finder_tender}
+
+
+def _parse_case(kind, pages, backend):
+    """Runs in a fresh process: parses `pages` notices of one kind, timing only the parser."""
+    set_parser_backend(backend)
+    parser = PARSERS[kind]
+    seconds, parsed = 0.0, 0
+    with quiet_logging():
+        for _, html_content, url in replicated_pages(pages, kind):
+            started = time.perf_counter()
+            parser(html_content, url)
+            seconds += time.perf_counter() - started
+            parsed += 1
+    return parsed, seconds, peak_rss_bytes()
+
+
+def bench_parse(pages, backend, workers=None, chunk_size=None):
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for kind in PARSERS:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            parsed, seconds, peak_rss = executor.submit(_parse_case, kind, pages // 2, backend).result()
+        results.append(result(f"parse.{kind}", 'throughput', parsed / seconds, 'pages/s', 'higher'))
+        results.append(result(f"parse.{kind}", 'time_per_page', seconds / parsed * 1e3, 'ms', 'lower'))
+        if peak_rss is not None:
+            results.append(result(f"parse.{kind}", 'peak_rss', peak_rss / 2**20, 'MiB', 'lower'))
+
+    # Bulk re-parse: the same pages from disk through the process pool
+    from reparse import reparse, iter_directory_pages, DEFAULT_CHUNK_SIZE
+    with tempfile.TemporaryDirectory(prefix='tender-bench-') as directory:
+        for i, (_, html_content, _) in enumerate(replicated_pages(pages)):
+            with open(os.path.join(directory, f"{i:06d}.html"), 'w', encoding='utf-8') as f: f.write(html_content)
+        with quiet_logging():
+            started = time.perf_counter()
+            parsed = sum(1 for _ in reparse(iter_directory_pages(directory), workers=workers,
+                                            chunk_size=chunk_size or DEFAULT_CHUNK_SIZE, backend=backend))
+            seconds = time.perf_counter() - started
+    results.append(result('parse.reparse-pool', 'throughput', parsed / seconds, 'pages/s', 'higher'))
+    return results
+
+
+# --- Level 3: End-to-end crawl against a local stand-in ---
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    """Serves the Find a Tender fixture for /Notice/<id> and Contracts Finder for /notice/<id>."""
+    pages = {}
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        body = self.pages.get(self.path.split('/')[1])
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def fixture_server(latency_ms):
+    handler = type('FixtureHandler', (_FixtureHandler,), {
+        'latency': latency_ms / 1000,
+        'pages': {'Notice': read_fixture(FINDATENDER_FIXTURE).encode('utf-8'),
+                  'notice': read_fixture(CONTRACTSFINDER_FIXTURE).encode('utf-8')},
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try: yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _standin_parser(html_content, url):
+    parser = parse_uk_tender if '/Notice/' in url else parse_contracts_finder_tender
+    return parser(html_content, url)
+
+
+@contextmanager
+def standin_site(host):
+    """Registers the local server as a site, dispatching to the real parser by URL path."""
+    Scrape_tenders.SITES[host] = dict(Scrape_tenders.SITES['find-tender.service.gov.uk'],
+                                      name='Local stand-in', parser=_standin_parser, label='stand-in')
+    try: yield
+    finally: del Scrape_tenders.SITES[host]
+
+
+def bench_crawl(pages, latency_ms, concurrency):
+    import asyncio
+    from crawl_engine import CrawlEngine
+
+    async def crawl(urls):
+        ok = 0
+        async with CrawlEngine(concurrency=concurrency, rate_limits={'127.0.0.1': (1e6, concurrency)},
+                               fetch_mode='http', max_retries=0) as engine:
+            async for result_ in engine.crawl_results(urls):
+                if result_.record: ok += 1
+        return ok
+
+    with fixture_server(latency_ms) as base_url, standin_site('127.0.0.1'), quiet_logging():
+        urls = [f"{base_url}/Notice/{i:06d}-2023" if i % 2 == 0 else
+                f"{base_url}/notice/{i:08x}{CONTRACTSFINDER_FIXTURE_ID[8:]}" for i in range(pages)]
+        started = time.perf_counter()
+        ok = asyncio.run(crawl(urls))
+        seconds = time.perf_counter() - started
+    return [
+        result('crawl.local', 'throughput', ok / seconds, 'pages/s', 'higher'),
+        result('crawl.local', 'wall_time', seconds, 's', 'lower'),
+        result('crawl.local', 'failed', pages - ok, 'pages', 'lower'),
+    ]
+
+
+# --- Comparison ---
+
+def compare(results, baseline, threshold):
+    """Prints each metric against the baseline run. Returns the regressed metric names."""
+    previous = {(r['name'], r['metric']): r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        old = previous.get((r['name'], r['metric']))
+        if old is None:
+            print(f"  {r['name']:<28} {r['metric']:<14} {r['value']:>12.2f} {r['unit']} (new)")
+            continue
+        if old['value']: change = (r['value'] - old['value']) / old['value']
+        else: change = float('inf') if r['value'] > 0 else 0.0  # e.g. failures going from 0 to 3
+        worse = change < -threshold if r['better'] == 'higher' else change > threshold
+        if worse: regressions.append(f"{r['name']}.{r['metric']}")
+        print(f"  {r['name']:<28} {r['metric']:<14} {r['value']:>12.2f} {r['unit']} "
+              f"({change:+.1%} vs {old['value']:.2f}){'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the tender scraper.")
+    parser.add_argument('levels', nargs='*', metavar='LEVEL', help="micro, parse and/or crawl (default: all)")
+    parser.add_argument('--pages', type=int, default=DEFAULT_PARSE_PAGES, help="Replicated pages for the parse level")
+    parser.add_argument('--crawl-pages', type=int, default=DEFAULT_CRAWL_PAGES)
+    parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY_MS, help="Stand-in server latency (ms)")
+    parser.add_argument('--concurrency', type=int, default=8, help="Crawl concurrency")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Re-parse worker processes")
+    parser.add_argument('--backend', default=None, help="Parser backend: html.parser, lxml or selectolax")
+    parser.add_argument('-o', '--output', default=None, help="Write JSON results here (default: stdout)")
+    parser.add_argument('--compare', default=None, help="Earlier results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative change counted as a regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.backend: set_parser_backend(args.backend)
+    levels = args.levels or list(LEVELS)
+    unknown = set(levels) - set(LEVELS)
+    if unknown: parser.error(f"Unknown level(s): {', '.join(sorted(unknown))}. Choose from: {', '.join(LEVELS)}")
+
+    results = []
+    if 'micro' in levels: results += bench_micro()
+    if 'parse' in levels: results += bench_parse(args.pages, get_parser_backend(), workers=args.workers)
+    if 'crawl' in levels: results += bench_crawl(args.crawl_pages, args.latency, args.concurrency)
+    report = {'meta': run_metadata(args), 'results': results}
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f: json.dump(report, f, indent=2)
+        logging.info(f"Wrote {len(results)} benchmark results to {args.output}")
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f: baseline = json.load(f)
+        print(f"Compared with {args.compare} (commit {baseline['meta'].get('commit')}):")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
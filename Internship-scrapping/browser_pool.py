@@ -0,0 +1,146 @@
+from playwright.sync_api import sync_playwright
+from contextlib import contextmanager
+import queue
+import atexit
+import logging
+
+from render_profile import DEFAULT_RENDER_PROFILE, check_render_profile, block_heavy_resources
+from metrics import timed
+
+# --- Browser Pool Configuration ---
+DEFAULT_POOL_SIZE = 2        # Number of warm context/page slots kept open
+DEFAULT_MAX_PAGE_USES = 25   # Recycle a page's context after this many navigations
+DEFAULT_CHECKOUT_TIMEOUT = 120  # Seconds to wait for a free page slot
+
+_pool = None
+
+
+class PageSlot:
+    """A warm browser context with a single page and a use counter (also used by the async crawl engine)."""
+
+    def __init__(self, context, page):
+        self.context = context
+        self.page = page
+        self.uses = 0
+
+
+class BrowserPool:
+    """Long-lived headless Chromium with a fixed number of reusable pages.
+
+    Playwright's sync API is bound to the thread that started it, so a pool
+    must be used from a single thread. Pages are checked out with `page()`
+    and returned automatically; a slot is recycled (fresh context and page)
+    after `max_uses` navigations or when the page crashed or raised. With the
+    'lean' render profile every context aborts images, fonts, stylesheets and
+    analytics requests (see render_profile).
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, max_uses=DEFAULT_MAX_PAGE_USES, headless=True,
+                 user_agent=None, launch_args=("--no-sandbox",), checkout_timeout=DEFAULT_CHECKOUT_TIMEOUT,
+                 render_profile=DEFAULT_RENDER_PROFILE):
+        self.size = max(1, int(size))
+        self.max_uses = max(1, int(max_uses))
+        self.headless = headless
+        self.user_agent = user_agent
+        self.launch_args = list(launch_args)
+        self.checkout_timeout = checkout_timeout
+        self.render_profile = check_render_profile(render_profile)
+        self._playwright = None
+        self._browser = None
+        self._slots = queue.Queue()
+        self._closed = False
+
+    # --- Lifecycle ---
+
+    def start(self):
+        if self._browser: return self
+        logging.info(f"Starting browser pool ({self.size} pages, headless={self.headless}, profile={self.render_profile})")
+        with timed('browser_launch'):
+            self._playwright = sync_playwright().start()
+            self._launch_browser()
+            for _ in range(self.size):
+                self._slots.put(self._new_slot())
+        return self
+
+    def _launch_browser(self):
+        self._browser = self._playwright.chromium.launch(headless=self.headless, args=self.launch_args)
+
+    def _new_slot(self):
+        if not self._browser.is_connected():
+            logging.warning("Browser disconnected. Relaunching Chromium.")
+            self._launch_browser()
+        context = self._browser.new_context(user_agent=self.user_agent) if self.user_agent else self._browser.new_context()
+        if self.render_profile == 'lean': context.route('**/*', block_heavy_resources)
+        return PageSlot(context, context.new_page())
+
+    def _discard_slot(self, slot):
+        try: slot.context.close()
+        except Exception as e: logging.debug(f"Error closing pooled context: {e}")
+
+    def _recycle(self, slot):
+        self._discard_slot(slot)
+        return self._new_slot()
+
+    def close(self):
+        """Closes all pooled contexts, the browser and Playwright. Safe to call twice."""
+        if self._closed: return
+        self._closed = True
+        while True:
+            try: self._discard_slot(self._slots.get_nowait())
+            except queue.Empty: break
+        if self._browser:
+            try: self._browser.close()
+            except Exception as e: logging.error(f"Error closing browser: {e}")
+        if self._playwright:
+            try: self._playwright.stop()
+            except Exception as e: logging.error(f"Error stopping Playwright: {e}")
+        self._browser, self._playwright = None, None
+        logging.info("Browser pool shut down.")
+
+    # --- Checkout ---
+
+    @contextmanager
+    def page(self):
+        """Checks out a warm page; returns (or recycles) it when the block exits."""
+        if self._closed: raise RuntimeError("Browser pool is closed.")
+        self.start()
+        slot = self._slots.get(timeout=self.checkout_timeout)
+        failed = False
+        try:
+            if slot.page.is_closed():
+                slot = self._recycle(slot)
+            yield slot.page
+        except Exception:
+            failed = True
+            raise
+        finally:
+            slot.uses += 1
+            if self._closed:
+                self._discard_slot(slot)
+            else:
+                if failed or slot.uses >= self.max_uses or slot.page.is_closed():
+                    try: slot = self._recycle(slot)
+                    except Exception as e:
+                        # Keep the pool at full size even if recycling failed; the
+                        # next checkout will retry via the is_closed() check.
+                        logging.error(f"Error recycling pooled page: {e}")
+                self._slots.put(slot)
+
+
+def get_browser_pool(**kwargs):
+    """Returns the process-wide browser pool, creating it on first use.
+
+    Keyword arguments are only applied when the pool is created.
+    """
+    global _pool
+    if _pool is None or _pool._closed:
+        _pool = BrowserPool(**kwargs)
+        atexit.register(shutdown_browser_pool)
+    return _pool
+
+
+def shutdown_browser_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
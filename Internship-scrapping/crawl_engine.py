@@ -0,0 +1,351 @@
+from playwright.async_api import async_playwright
+from urllib.parse import urlparse
+from collections import namedtuple
+import aiohttp
+import asyncio
+import random
+import time
+import logging
+
+from Scrape_tenders import USER_AGENT, BROWSER_POOL_SIZE, BROWSER_MAX_PAGE_USES, detect_site, is_page_ready
+from fetch_strategy import fetch_path_stats, conditional_headers, PATH_CACHE, PATH_HTTP, PATH_HTTP_NOT_MODIFIED, PATH_BROWSER
+from crawl_state import record_hash
+from browser_pool import PageSlot
+from metrics import timed
+from render_profile import (DEFAULT_RENDER_PROFILE, check_render_profile, block_heavy_resources_async,
+                            navigation_wait_until, RenderMeter, render_stats)
+
+# --- Politeness Budget ---
+# (requests per second, burst) per site; each GOV.UK service gets its own bucket.
+HOST_RATE_LIMITS = {
+    'find-tender.service.gov.uk': (0.5, 2),
+    'contractsfinder.service.gov.uk': (0.5, 2),
+}
+DEFAULT_RATE_LIMIT = (0.2, 1)  # Any other host
+
+DEFAULT_CONCURRENCY = 8         # Global cap on URLs in flight
+DEFAULT_MAX_RETRIES = 3
+RETRY_BACKOFF_BASE = 2.0        # Seconds; doubled on every retry, plus jitter
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# status is 'ok', 'failed' or 'unchanged' (same record as the last extraction; not returned again).
+# retryable is False for failures a later attempt would repeat (HTTP 4xx, parse errors).
+CrawlResult = namedtuple('CrawlResult', 'url record content_hash status error retryable', defaults=(True,))
+
+
+class FetchError(Exception):
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+_EXHAUSTED = object()
+
+
+async def _aiter(urls):
+    """Iterates a plain or async iterable of URLs. Lists are read directly; other
+    iterators (e.g. search discovery, which fetches result pages) are advanced in
+    a worker thread so they don't block the event loop."""
+    if hasattr(urls, '__aiter__'):
+        async for url in urls: yield url
+    elif isinstance(urls, (list, tuple)):
+        for url in urls: yield url
+    else:
+        iterator = iter(urls)
+        while True:
+            url = await asyncio.to_thread(next, iterator, _EXHAUSTED)
+            if url is _EXHAUSTED: return
+            yield url
+
+
+class CrawlEngine:
+    """Fetches and parses notice URLs concurrently.
+
+    Use as an async context manager and iterate `crawl(urls)`; `urls` may be a
+    list, a generator or an async generator, and is consumed lazily so at most
+    `concurrency` URLs are in flight. Each request first waits for a token from
+    its site's bucket, so throughput follows HOST_RATE_LIMITS.
+
+    fetch_mode 'auto' (default) tries a pooled aiohttp GET first and only
+    renders with Playwright's async API when the site's page check fails;
+    'browser' always renders and 'http' never does. The browser is launched
+    on first use, so an 'auto' crawl of server-rendered pages never starts it.
+    Renders use `render_profile` ('lean' blocks heavy resources; see render_profile)
+    and return once the site's ready selector appears, or on network idle. Like
+    browser_pool, `render_concurrency` warm pages are kept (BROWSER_POOL_SIZE) and
+    each is recycled after `max_page_uses` renders (BROWSER_MAX_PAGE_USES) or an error.
+
+    With a `cache` (page_cache.PageCache), fresh entries are served without any
+    request and stale ones are revalidated with a conditional GET. With a
+    `state` (crawl_state.CrawlState), notices whose record matches their last
+    extraction come back 'unchanged', without the record. `parse_options` are
+    passed to every site parser (e.g. {'include_lots': True}).
+
+    Search discovery that feeds the crawl should fetch its result pages with
+    `blocking_fetch`, so they draw from the same buckets as the notices.
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, render_concurrency=BROWSER_POOL_SIZE,
+                 max_page_uses=BROWSER_MAX_PAGE_USES, rate_limits=None, max_retries=DEFAULT_MAX_RETRIES, backoff_base=RETRY_BACKOFF_BASE,
+                 fetch_mode='auto', timeout=60, headless=True, cache=None, state=None,
+                 render_profile=DEFAULT_RENDER_PROFILE, parse_options=None):
+        if fetch_mode not in ('auto', 'browser', 'http'):
+            raise ValueError(f"Unknown fetch_mode: {fetch_mode}")
+        self.concurrency = max(1, int(concurrency))
+        self.render_concurrency = max(1, int(render_concurrency))
+        self.max_page_uses = max(1, int(max_page_uses))
+        self.rate_limits = dict(HOST_RATE_LIMITS if rate_limits is None else rate_limits)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.fetch_mode = fetch_mode
+        self.timeout = timeout
+        self.headless = headless
+        self.render_profile = check_render_profile(render_profile)
+        self.cache = cache
+        self.state = state
+        self.parse_options = dict(parse_options or {})
+        self._buckets = {}
+        self._session = None
+        self._playwright = None
+        self._browser = None
+        self._pages = None
+        self._browser_lock = None
+        self._loop = None
+
+    # --- Lifecycle ---
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+        self._session = aiohttp.ClientSession(
+            connector=connector, headers={'User-Agent': USER_AGENT},
+            timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self._browser_lock = asyncio.Lock()
+        self._loop = asyncio.get_running_loop()
+        return self
+
+    async def _ensure_browser(self):
+        async with self._browser_lock:
+            if self._browser: return
+            with timed('browser_launch'):
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=self.headless, args=["--no-sandbox"])
+                self._pages = asyncio.Queue()
+                for _ in range(self.render_concurrency):
+                    await self._pages.put(await self._new_slot())
+
+    async def __aexit__(self, *exc_info):
+        if self._pages is not None:
+            while not self._pages.empty():
+                await self._discard_slot(self._pages.get_nowait())
+        if self._browser:
+            try: await self._browser.close()
+            except Exception as e: logging.error(f"Error closing browser: {e}")
+        if self._playwright:
+            try: await self._playwright.stop()
+            except Exception as e: logging.error(f"Error stopping Playwright: {e}")
+        if self._session:
+            await self._session.close()
+
+    async def _new_slot(self):
+        context = await self._browser.new_context(user_agent=USER_AGENT)
+        if self.render_profile == 'lean': await context.route('**/*', block_heavy_resources_async)
+        return PageSlot(context, await context.new_page())
+
+    async def _discard_slot(self, slot):
+        try: await slot.context.close()
+        except Exception as e: logging.debug(f"Error closing context: {e}")
+
+    def _bucket_for(self, url):
+        site_key, _ = detect_site(url)
+        key = site_key or (urlparse(url).hostname or '')
+        if key not in self._buckets:
+            rate, burst = self.rate_limits.get(key, DEFAULT_RATE_LIMIT)
+            self._buckets[key] = TokenBucket(rate, burst)
+        return self._buckets[key]
+
+    # --- Fetching ---
+
+    async def fetch_http(self, url, cached=None):
+        """GET through the pooled session. Returns (html, not_modified, etag, last_modified)."""
+        async with self._session.get(url, headers=conditional_headers(cached)) as response:
+            etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+            if response.status == 304 and cached:
+                return cached.html, True, etag, last_modified
+            if response.status in RETRY_STATUSES:
+                raise FetchError(f"HTTP {response.status}", retryable=True)
+            if response.status >= 400:
+                raise FetchError(f"HTTP {response.status}", retryable=False)
+            return await response.text(), False, etag, last_modified
+
+    async def fetch_search_page(self, url):
+        """Plain GET of a search result page, paced by its site's bucket. None on failure."""
+        await self._bucket_for(url).acquire()
+        try:
+            html_content, _, _, _ = await self.fetch_http(url)
+            return html_content
+        except Exception as e:
+            logging.warning(f"Failed to fetch search results page {url}: {e}")
+            return None
+
+    def blocking_fetch(self, url):
+        """fetch_search_page for code on another thread, such as a discovery iterator
+        that crawl() advances in a worker thread. Blocks that thread, not the loop."""
+        return asyncio.run_coroutine_threadsafe(self.fetch_search_page(url), self._loop).result()
+
+    async def fetch_rendered(self, url, site):
+        await self._ensure_browser()
+        slot = await self._pages.get()
+        failed = False
+        try:
+            if slot.page.is_closed():  # Left closed by a failed recycle
+                await self._discard_slot(slot)
+                slot = await self._new_slot()
+            page = slot.page
+            async with RenderMeter(page) as meter:
+                with timed('navigate', profile=self.render_profile):
+                    await page.goto(url, wait_until=navigation_wait_until(self.render_profile), timeout=self.timeout * 1000)
+                with timed('ready_wait', profile=self.render_profile):
+                    if site and site.get('ready_selector'):
+                        await page.locator(site['ready_selector']).wait_for(timeout=(self.timeout // 2 * 1000))
+                    else:
+                        await page.wait_for_load_state('networkidle', timeout=(self.timeout // 2 * 1000))
+                html_content = await page.content()
+            render_stats.record(url, self.render_profile, meter)
+            return html_content
+        except Exception:
+            failed = True
+            raise
+        finally:
+            slot.uses += 1
+            # A crashed or wedged tab is never reused; long-lived contexts are recycled to bound memory
+            if failed or slot.uses >= self.max_page_uses or slot.page.is_closed():
+                await self._discard_slot(slot)
+                try: slot = await self._new_slot()
+                except Exception as e: logging.error(f"Error recycling browser page: {e}")
+            self._pages.put_nowait(slot)
+
+    async def fetch(self, url, site, cached=None):
+        started = time.perf_counter()
+        etag, last_modified = None, None
+        if self.fetch_mode == 'browser':
+            html_content = await self.fetch_rendered(url, site)
+            path = PATH_BROWSER
+        else:
+            html_content, not_modified, etag, last_modified = await self.fetch_http(url, cached)
+            path = PATH_HTTP_NOT_MODIFIED if not_modified else PATH_HTTP
+            if self.fetch_mode == 'auto' and not not_modified and not is_page_ready(html_content, site):
+                logging.info(f"Plain HTTP response for {url} failed the page check. Escalating to browser.")
+                html_content = await self.fetch_rendered(url, site)
+                path, etag, last_modified = PATH_BROWSER, None, None
+        if self.cache is not None and html_content:
+            if path == PATH_HTTP_NOT_MODIFIED: self.cache.touch(url, etag, last_modified)
+            else: self.cache.put(url, html_content, etag, last_modified)
+        fetch_path_stats.record(url, path, time.perf_counter() - started,
+                                None if path == PATH_HTTP_NOT_MODIFIED else html_content)
+        return html_content
+
+    async def _fetch_with_retries(self, url, site):
+        """Returns (html_content, error, retryable); html_content is None once retries are
+        exhausted or the error is not retryable."""
+        cached = None
+        if self.cache is not None:
+            try: cached = self.cache.get(url)
+            except Exception as e: logging.warning(f"Page cache lookup failed for {url}, fetching instead: {e}")
+        if cached and cached.fresh:
+            fetch_path_stats.record(url, PATH_CACHE, 0.0)
+            return cached.html, None, True
+        bucket = self._bucket_for(url)
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            try:
+                html_content = await self.fetch(url, site, cached)
+                return html_content, (None if html_content else "Empty response"), True
+            except Exception as e:
+                retryable = getattr(e, 'retryable', True)
+                if not retryable or attempt == self.max_retries:
+                    logging.error(f"Giving up on {url} after {attempt + 1} attempt(s): {e}")
+                    return None, str(e), retryable
+                delay = self.backoff_base * (2 ** attempt) * (1 + random.random() / 2)
+                logging.warning(f"Fetch failed for {url} ({e}). Retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
+    async def process(self, url):
+        """Fetches and parses one URL. Returns its CrawlResult; never raises."""
+        try:
+            return await self._process(url)
+        except Exception as e:
+            # Anything outside the fetch/parse guards (page cache, crawl state): fail this URL, not the crawl
+            logging.error(f"Crawling {url} failed: {e}")
+            return CrawlResult(url, None, None, 'failed', f"Crawl error: {e}")
+
+    async def _process(self, url):
+        site_key, site = detect_site(url)
+        if not site:
+            logging.error(f"No parser registered for {url}. Skipping.")
+            return CrawlResult(url, None, None, 'failed', "No parser registered", False)
+        html_content, error, retryable = await self._fetch_with_retries(url, site)
+        if not html_content:
+            return CrawlResult(url, None, None, 'failed', error, retryable)
+        # Parsing is CPU-bound; keep it off the event loop so fetches keep flowing
+        try:
+            with timed('parse', parser=site.get('label', site_key)):
+                record = await asyncio.to_thread(site['parser'], html_content, url, **self.parse_options)
+        except Exception as e:
+            logging.error(f"Parsing failed for {url}: {e}")
+            return CrawlResult(url, None, None, 'failed', f"Parse error: {e}", False)
+        digest = record_hash(record) if record else None
+        if digest and self.state is not None and self.state.is_unchanged(url, digest):
+            return CrawlResult(url, None, digest, 'unchanged', None)
+        return CrawlResult(url, record, digest, 'ok', None)
+
+    async def crawl(self, urls):
+        """Yields (url, record) pairs as they complete; record is None on failure."""
+        async for result in self.crawl_results(urls):
+            if result.status != 'unchanged': yield result.url, result.record
+
+    async def crawl_results(self, urls):
+        """Yields a CrawlResult per URL as they complete."""
+        pending = set()
+        try:
+            async for url in _aiter(urls):
+                if len(pending) >= self.concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done: yield task.result()
+                pending.add(asyncio.create_task(self.process(url)))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done: yield task.result()
+        finally:
+            # The consumer stopped early (or we crashed): don't leave fetches running
+            for task in pending: task.cancel()
+
+
+def crawl_urls(urls, **engine_kwargs):
+    """Synchronous helper: crawls `urls` and returns a list of (url, record) pairs."""
+    async def _run():
+        async with CrawlEngine(**engine_kwargs) as engine:
+            return [result async for result in engine.crawl(urls)]
+    return asyncio.run(_run())
@@ -0,0 +1,201 @@
+import threading
+import hashlib
+import sqlite3
+import logging
+import json
+import time
+
+from page_cache import normalize_url
+
+# --- Crawl State Configuration ---
+DEFAULT_STATE_DB = 'crawl_state.sqlite'
+DEFAULT_CHECKPOINT_EVERY = 50      # Updates between commits
+DEFAULT_CHECKPOINT_INTERVAL = 30   # Seconds between commits
+DEFAULT_MAX_ATTEMPTS = 5           # Failed notices are retried on later runs up to this many times
+
+STATUS_DONE = 'done'
+STATUS_UPDATED = 'updated'      # Re-extracted because the notice's content changed (e.g. an amendment)
+STATUS_FAILED = 'failed'
+STATUS_UNCHANGED = 'unchanged'  # Outcome only: re-fetched, same record and extraction version
+STATUS_FEED = 'feed'            # Extracted from the bulk OCDS feed; its HTML page is not fetched
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notices (
+    url TEXT PRIMARY KEY,
+    notice_id TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_fetch_at REAL,
+    content_hash TEXT,
+    extraction_version INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS notices_notice_id ON notices (notice_id);
+CREATE INDEX IF NOT EXISTS notices_status ON notices (status);
+CREATE TABLE IF NOT EXISTS marks (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def record_hash(record):
+    """Digest of an extracted record, stored as a crawled notice's content hash. Pages
+    differ between fetches in markup that carries no data (e.g. generated element
+    ids), so changes are detected on what was extracted, not on the HTML."""
+    return hashlib.sha256(json.dumps(record, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+
+class CrawlState:
+    """SQLite record of every notice a crawl has handled, so restarts resume.
+
+    Rows are keyed by normalized notice URL and also carry the extracted
+    'Tender ID/Reference Number'. Updates are committed in checkpoints (every
+    `checkpoint_every` updates or `checkpoint_interval` seconds); `before_checkpoint`
+    runs first, so pass the output sink's flush and a notice is never committed
+    as done before its row is on disk. A killed job redoes at most one
+    checkpoint's worth of notices.
+    """
+
+    def __init__(self, path=DEFAULT_STATE_DB, extraction_version=1, recheck_after=None,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, before_checkpoint=None,
+                 checkpoint_every=DEFAULT_CHECKPOINT_EVERY, checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL):
+        self.path = path
+        self.extraction_version = extraction_version
+        self.recheck_after = recheck_after
+        self.max_attempts = max_attempts
+        self.before_checkpoint = before_checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._dirty = 0
+        self._last_checkpoint = time.monotonic()
+
+    # --- Queries ---
+
+    def get(self, url):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT notice_id, status, attempts, last_fetch_at, content_hash, extraction_version, error "
+                "FROM notices WHERE url = ?", (normalize_url(url),)).fetchone()
+        if not row: return None
+        keys = ('notice_id', 'status', 'attempts', 'last_fetch_at', 'content_hash', 'extraction_version', 'error')
+        return dict(zip(keys, row))
+
+    def get_by_notice_id(self, notice_id):
+        with self._lock:
+            row = self._db.execute("SELECT url FROM notices WHERE notice_id = ? LIMIT 1", (notice_id,)).fetchone()
+        return self.get(row[0]) if row else None
+
+    def needs_fetch(self, url):
+        """False for notices already done with the current extraction version (and,
+        with `recheck_after`, fetched recently) and for failures out of attempts."""
+        entry = self.get(url)
+        if entry is None: return True
+        if entry['status'] == STATUS_FEED: return False  # Kept current by re-ingesting the feed
+        if entry['status'] == STATUS_FAILED:
+            return entry['attempts'] < self.max_attempts
+        if entry['extraction_version'] != self.extraction_version: return True
+        if self.recheck_after is not None and (time.time() - (entry['last_fetch_at'] or 0)) >= self.recheck_after:
+            return True
+        return False
+
+    def is_unchanged(self, url, content_hash):
+        """True if the notice was already extracted with this extraction version and
+        the same content hash (see record_hash; release_hash for feed notices)."""
+        entry = self.get(url)
+        return (entry is not None and entry['status'] in (STATUS_DONE, STATUS_UPDATED, STATUS_FEED)
+                and entry['content_hash'] == content_hash
+                and entry['extraction_version'] == self.extraction_version)
+
+    def filter_pending(self, urls):
+        """Lazily yields only the URLs that need fetching (see needs_fetch), each once."""
+        skipped, seen = 0, set()
+        for url in urls:
+            key = normalize_url(url)
+            if key in seen: continue
+            seen.add(key)
+            if self.needs_fetch(url): yield url
+            else: skipped += 1
+        if skipped: logging.info(f"Skipped {skipped} notice(s) already handled by a previous run.")
+
+    def retryable_urls(self):
+        """Failed notices that still have attempts left. Search discovery stops at its
+        high-water mark, so these would not otherwise be offered again."""
+        with self._lock:
+            rows = self._db.execute("SELECT url FROM notices WHERE status = ? AND attempts < ?",
+                                    (STATUS_FAILED, self.max_attempts)).fetchall()
+        return [row[0] for row in rows]
+
+    def get_mark(self, name):
+        """A named value kept between runs, e.g. a search's high-water mark."""
+        with self._lock:
+            row = self._db.execute("SELECT value FROM marks WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def counts(self):
+        with self._lock:
+            return dict(self._db.execute("SELECT status, COUNT(*) FROM notices GROUP BY status"))
+
+    # --- Updates ---
+
+    def mark_extracted(self, url, content_hash, notice_id=None, from_feed=False):
+        """Records a successful extraction. Returns STATUS_DONE for a new notice,
+        STATUS_UPDATED if its content changed since the last extraction. Notices
+        taken `from_feed` are stored as STATUS_FEED, so the crawl skips their pages."""
+        entry = self.get(url)
+        changed = entry is not None and entry['content_hash'] not in (None, content_hash)
+        status = STATUS_UPDATED if changed else STATUS_DONE
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO notices VALUES (?, ?, ?, 0, ?, ?, ?, NULL)",
+                (normalize_url(url), notice_id or (entry or {}).get('notice_id'),
+                 STATUS_FEED if from_feed else status, time.time(), content_hash, self.extraction_version))
+            self._touched()
+        return status
+
+    def mark_unchanged(self, url):
+        with self._lock:
+            self._db.execute("UPDATE notices SET last_fetch_at = ? WHERE url = ?", (time.time(), normalize_url(url)))
+            self._touched()
+
+    def mark_failed(self, url, error=None):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO notices (url, status, attempts, last_fetch_at, error) VALUES (?, ?, 1, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET status = excluded.status, attempts = attempts + 1, "
+                "last_fetch_at = excluded.last_fetch_at, error = excluded.error",
+                (normalize_url(url), STATUS_FAILED, time.time(), error))
+            self._touched()
+
+    def set_mark(self, name, value):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO marks VALUES (?, ?)", (name, value))
+            self._touched()
+
+    # --- Checkpointing ---
+
+    def _touched(self):
+        self._dirty += 1
+        if self._dirty >= self.checkpoint_every or time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def checkpoint(self):
+        with self._lock:
+            if self.before_checkpoint: self.before_checkpoint()
+            self._db.commit()
+            self._dirty = 0
+            self._last_checkpoint = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            self.checkpoint()
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
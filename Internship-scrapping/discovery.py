@@ -0,0 +1,186 @@
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+import logging
+import html
+import time
+import re
+
+from Scrape_tenders import SITES, USER_AGENT
+from page_cache import normalize_url
+
+# --- Discovery Configuration ---
+DEFAULT_MAX_PAGES = 500
+DEFAULT_PAGE_DELAY = 2.0  # Seconds between result pages of the same site, when run on its own
+
+# Per-site search endpoints. Filters map our names onto the site's query parameters;
+# set search_url to a local stand-in to test against saved result pages.
+SEARCH_CONFIG = {
+    'find-tender.service.gov.uk': {
+        'search_url': 'https://www.find-tender.service.gov.uk/Search/Results',
+        'params': {'query': 'keywords', 'cpv': 'cpv_codes', 'published_from': 'published_from', 'published_to': 'published_to'},
+        'page_param': 'page',
+    },
+    'contractsfinder.service.gov.uk': {
+        'search_url': 'https://www.contractsfinder.service.gov.uk/Search/Results',
+        'params': {'query': 'keywords', 'cpv': 'cpv_codes', 'published_from': 'published_from', 'published_to': 'published_to'},
+        'page_param': 'page',
+    },
+}
+
+HREF_PATTERN = re.compile(r'<(a|link)\b([^>]*)>', re.I)
+ATTR_PATTERN = re.compile(r'\b(href|rel|class)\s*=\s*"([^"]*)"', re.I)
+NOTICE_PATH_PATTERN = re.compile(r'/notice/([\w-]+)', re.I)
+
+
+def _links(page_html):
+    """Yields (href, rel, class) for every <a>/<link> with an href, in document order."""
+    for match in HREF_PATTERN.finditer(page_html):
+        attrs = {name.lower(): value for name, value in ATTR_PATTERN.findall(match.group(2))}
+        if 'href' in attrs:
+            yield html.unescape(attrs['href']), attrs.get('rel', '').lower(), attrs.get('class', '').lower()
+
+
+def parse_result_page(page_html, page_url, site):
+    """Returns (notice_urls, next_page_url) for one search result page.
+
+    Notice links are recognised by their /notice/<id> path and rewritten to the
+    site's canonical notice URL. The next page is a rel="next" link or a
+    GOV.UK pagination "next" link; None if the page has neither.
+    """
+    notice_urls, next_url = [], None
+    for href, rel, css_class in _links(page_html):
+        absolute = urljoin(page_url, href)
+        if 'next' in rel.split() or 'pagination__next' in css_class:
+            next_url = next_url or absolute
+            continue
+        match = NOTICE_PATH_PATTERN.search(urlsplit(absolute).path)
+        if match: notice_urls.append(site['notice_url'].format(match.group(1)))
+    return notice_urls, next_url
+
+
+def _with_page(url, page_param, page):
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != page_param]
+    query.append((page_param, str(page)))
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ''))
+
+
+class SearchDiscovery:
+    """Pages through one site's search results and lazily yields notice URLs.
+
+    URLs are de-duplicated across pages. Iteration stops at the first page with no
+    new notices, after `max_pages`, or when it reaches `high_water_mark` (the newest notice URL
+    seen by a previous run, since results are newest first). If the mark notice has
+    been withdrawn, `is_known(url)` catches the same point: a page on which every
+    notice is already known ends the search. It only applies once there is a mark;
+    without one (a first or interrupted run) known notices are no sign of where
+    the previous search ended, so every page is read. After iterating, `newest_url` holds
+    the first notice seen. `completed` is True only if the search got through to
+    the end of the results or to the mark (not after a failed page fetch or at
+    `max_pages`); only then may `newest_url` be stored as the next run's mark, or
+    the notices past the stopping point would never be found.
+
+    `fetch(url)` returns page HTML or None; it defaults to the pooled plain-HTTP
+    session from fetch_strategy, with `page_delay` seconds between pages. When the
+    notices are crawled at the same time, pace the result pages within the same
+    site budget with fetch_through() or take_rate_share().
+    """
+
+    def __init__(self, site_key, query=None, cpv=None, published_from=None, published_to=None,
+                 high_water_mark=None, max_pages=DEFAULT_MAX_PAGES, page_delay=DEFAULT_PAGE_DELAY,
+                 search_url=None, fetch=None, is_known=None):
+        if site_key not in SEARCH_CONFIG:
+            raise ValueError(f"No search configuration for site '{site_key}'")
+        self.site_key = site_key
+        self.site = SITES[site_key]
+        self.config = SEARCH_CONFIG[site_key]
+        filters = {'query': query, 'cpv': cpv, 'published_from': published_from, 'published_to': published_to}
+        self.params = {self.config['params'][name]: value for name, value in filters.items() if value}
+        self.high_water_mark = high_water_mark
+        self.max_pages = max_pages
+        self.page_delay = page_delay
+        self.search_url = search_url or self.config['search_url']
+        self.fetch = fetch or _fetch_page
+        self.is_known = is_known
+        self.newest_url = None
+        self.pages_fetched = 0
+        self.completed = False
+
+    def fetch_through(self, engine):
+        """Fetches result pages with a crawl_engine.CrawlEngine, whose site bucket then
+        paces them together with the notice fetches."""
+        self.fetch, self.page_delay = engine.blocking_fetch, 0
+
+    def take_rate_share(self, rate_share):
+        """Spaces result pages to 1/`rate_share` of the site's HOST_RATE_LIMITS rate, for
+        when the rest of the budget goes to crawlers in other processes."""
+        from crawl_engine import HOST_RATE_LIMITS, DEFAULT_RATE_LIMIT
+        rate, _ = HOST_RATE_LIMITS.get(self.site_key, DEFAULT_RATE_LIMIT)
+        self.page_delay = rate_share / rate
+
+    @property
+    def mark_name(self):
+        """Key for this search's high-water mark in the crawl state (one per site and filter set)."""
+        return f"search-high-water:{self.first_page_url()}"
+
+    def first_page_url(self):
+        query = urlencode(sorted(self.params.items()))
+        return f"{self.search_url}?{query}" if query else self.search_url
+
+    def __iter__(self):
+        self.completed = False
+        seen = set()
+        mark = normalize_url(self.high_water_mark) if self.high_water_mark else None
+        page_url, page_number = self.first_page_url(), 1
+        last_fetch = None
+        while page_url and self.pages_fetched < self.max_pages:
+            if last_fetch is not None:
+                delay = self.page_delay - (time.monotonic() - last_fetch)
+                if delay > 0: time.sleep(delay)
+            last_fetch = time.monotonic()
+            page_html = self.fetch(page_url)
+            self.pages_fetched += 1
+            if not page_html:
+                logging.warning(f"Could not fetch search results page {page_url}. Stopping discovery.")
+                return
+            notice_urls, next_url = parse_result_page(page_html, page_url, self.site)
+            if not notice_urls:
+                logging.info(f"No more results for {self.site['name']} after {page_number - 1} page(s).")
+                self.completed = True
+                return
+            if mark and self.is_known and all(self.is_known(url) for url in notice_urls):
+                logging.info(f"Every notice on {page_url} is already known. Stopping discovery.")
+                self.completed = True
+                return
+            new_on_page = 0
+            for notice_url in notice_urls:
+                key = normalize_url(notice_url)
+                if key == mark:
+                    logging.info(f"Reached high-water mark {notice_url}. Stopping discovery.")
+                    self.completed = True
+                    return
+                if key in seen: continue
+                seen.add(key)
+                new_on_page += 1
+                if self.newest_url is None: self.newest_url = notice_url
+                yield notice_url
+            if not new_on_page:
+                # Some sites keep serving the last page for any higher page number
+                logging.info(f"No new notices on {page_url}. Stopping discovery.")
+                self.completed = True
+                return
+            page_number += 1
+            page_url = next_url or _with_page(self.first_page_url(), self.config['page_param'], page_number)
+        logging.info(f"Discovery for {self.site['name']} stopped at max_pages ({self.pages_fetched}); "
+                     f"more results may follow.")
+
+
+def _fetch_page(url):
+    from fetch_strategy import fetch_http
+    html_content, _, _, _, _ = fetch_http(url, user_agent=USER_AGENT)
+    return html_content
+
+
+def discover_notice_urls(sites=None, **filters):
+    """Chains discovery over several sites (default: all with a search configuration)."""
+    for site_key in sites or SEARCH_CONFIG:
+        yield from SearchDiscovery(site_key, **filters)
@@ -0,0 +1,154 @@
+from collections import namedtuple, defaultdict
+import re
+
+from metrics import field_error
+
+# --- Declarative Field Extraction ---
+# A site spec maps each output column to a Field: the anchor that locates it on the
+# page, the rule that reads its value from the anchor, and an optional section that
+# limits where the anchor may appear. Values are page text; dates and amounts are
+# normalized afterwards, a batch at a time (normalize.normalize_records).
+#
+# Rules:
+#   'next_p'     anchor: label text of a heading; value: the heading's next <p> sibling.
+#                A tuple of anchors gives a tuple of values, e.g. (start, end).
+#   'next_dd'    anchor: label text of a <dt>; value: its next <dd> sibling.
+#   'title'      anchor: CSS class of the page's <h1>; value: its text.
+#   'url'        anchor: regex on the notice URL; value: its first group.
+#   'unlabelled' no anchor; value: the text of every heading directly in `section` that
+#                matches none of that section's anchors (e.g. supplier names), joined.
+# A tuple of Fields is a fallback chain: the first one that yields a value wins (a
+# tuple value counts once any of its elements is found).
+
+Field = namedtuple('Field', 'anchor rule section', defaults=(None,))
+
+RULES = ('next_p', 'next_dd', 'title', 'url', 'unlabelled')
+_LABEL_RULES = {'next_p': 'label', 'next_dd': 'dt'}
+
+
+def _found(value):
+    return any(value) if isinstance(value, tuple) else bool(value)
+
+
+def _anchor_pattern(anchors):
+    """One case-insensitive alternation over all anchors; lastgroup names the match."""
+    if not anchors: return None
+    return re.compile('|'.join(f'(?P<a{i}>{re.escape(anchor)})' for i, anchor in enumerate(anchors)), re.I)
+
+
+class ExtractionSpec:
+    """A site's field spec, compiled once into cached matchers.
+
+    Label anchors of each kind (heading labels, <dt> labels, section headings) are
+    merged into one alternation regex, so a page is read in one pass: a single
+    find_all over the tags the spec can anchor on, one regex search per tag, then
+    each field picks its first anchor in its section. Matching is by
+    case-insensitive substring of the tag's text. A section is the block holding
+    the `section_tag` whose text contains the section's heading; a field whose
+    section is missing from the page is looked up page-wide.
+    """
+
+    def __init__(self, parser, fields, sections=None, label_tag='h4', section_tag='h3', join=', '):
+        self.parser = parser
+        self.fields = {name: tuple(spec) if isinstance(spec[0], Field) else (spec,) for name, spec in fields.items()}
+        self.sections = dict(sections or {})
+        self.label_tag = label_tag
+        self.section_tag = section_tag
+        self.join = join
+        self._compile()
+
+    def _compile(self):
+        anchors = {'label': [], 'dt': []}
+        section_anchors = defaultdict(list)
+        for name, chain in self.fields.items():
+            for field in chain:
+                if field.rule not in RULES: raise ValueError(f"{name}: unknown extraction rule '{field.rule}'")
+                if field.section is not None and field.section not in self.sections:
+                    raise ValueError(f"{name}: unknown section '{field.section}'")
+                if field.rule in _LABEL_RULES:
+                    for anchor in (field.anchor if isinstance(field.anchor, tuple) else (field.anchor,)):
+                        kind = _LABEL_RULES[field.rule]
+                        if anchor.lower() not in (a.lower() for a in anchors[kind]): anchors[kind].append(anchor)
+                        if field.rule == 'next_p' and field.section: section_anchors[field.section].append(anchor)
+        self._patterns = {kind: _anchor_pattern(kind_anchors) for kind, kind_anchors in anchors.items()}
+        self._anchor_keys = {kind: {f'a{i}': anchor.lower() for i, anchor in enumerate(kind_anchors)}
+                             for kind, kind_anchors in anchors.items()}
+        self._section_names = list(self.sections)
+        self._section_pattern = _anchor_pattern([self.sections[name] for name in self._section_names])
+        self._section_label_patterns = {name: _anchor_pattern(section_anchors[name]) for name in self.sections}
+        self._url_patterns = {field.anchor: re.compile(field.anchor)
+                              for chain in self.fields.values() for field in chain if field.rule == 'url'}
+        self._title_classes = {field.anchor for chain in self.fields.values() for field in chain if field.rule == 'title'}
+        self._tag_names = [self.label_tag]
+        if self._section_pattern: self._tag_names.append(self.section_tag)
+        if anchors['dt']: self._tag_names.append('dt')
+        if self._title_classes: self._tag_names.append('h1')
+
+    def _index(self, soup):
+        """The single pass: section blocks, the tags matching each anchor (by lower-cased
+        anchor), <h1> tags, and every label heading with its text."""
+        sections, labels, dts, titles, label_tags = {}, defaultdict(list), defaultdict(list), [], []
+        for tag in soup.find_all(self._tag_names):
+            if tag.name == 'h1':
+                titles.append(tag)
+                continue
+            text = tag.get_text(strip=True)
+            if tag.name == self.section_tag and self._section_pattern:
+                match = self._section_pattern.search(text)
+                if match:
+                    sections.setdefault(self._section_names[int(match.lastgroup[1:])], tag.parent)
+                continue
+            kind, found = ('dt', dts) if tag.name == 'dt' else ('label', labels)
+            if tag.name == self.label_tag: label_tags.append((tag, text))
+            pattern = self._patterns[kind]
+            match = pattern.search(text) if pattern else None
+            if match: found[self._anchor_keys[kind][match.lastgroup]].append(tag)
+        return sections, labels, dts, titles, label_tags
+
+    @staticmethod
+    def _in_section(tag, section):
+        return section is None or any(parent is section for parent in tag.parents)
+
+    def _first(self, tags, section):
+        return next((tag for tag in tags if self._in_section(tag, section)), None)
+
+    def _value(self, field, url, page):
+        sections, labels, dts, titles, label_tags = page
+        section = sections.get(field.section) if field.section else None
+        if field.rule == 'url':
+            match = self._url_patterns[field.anchor].search(url)
+            return match.group(1) if match else None
+        if field.rule == 'title':
+            tag = next((tag for tag in titles if field.anchor in (tag.get('class') or [])), None)
+            return tag.get_text(strip=True) if tag else None
+        if field.rule == 'unlabelled':
+            if section is None: return None
+            pattern = self._section_label_patterns[field.section]
+            names = [(tag.find('strong') or tag).get_text(strip=True) for tag, text in label_tags
+                     if tag.parent is section and not (pattern and pattern.search(text))]
+            names = [name for name in names if name]
+            return self.join.join(names) if names else None
+        found, sibling = (labels, 'p') if field.rule == 'next_p' else (dts, 'dd')
+
+        def read(anchor):
+            tag = self._first(found.get(anchor.lower(), ()), section)
+            value_tag = tag.find_next_sibling(sibling) if tag else None
+            return value_tag.get_text(strip=True) if value_tag else None
+        if isinstance(field.anchor, tuple): return tuple(read(anchor) for anchor in field.anchor)
+        return read(field.anchor)
+
+    def extract(self, soup, url):
+        """Returns {column: value} for every field in the spec. A field whose extraction
+        raises is recorded as None (and counted by metrics.field_error)."""
+        page = self._index(soup)
+        data = {}
+        for name, chain in self.fields.items():
+            value = None
+            try:
+                for field in chain:
+                    value = self._value(field, url, page)
+                    if _found(value): break
+            except Exception as e:
+                value = field_error(self.parser, name, e)
+            data[name] = value
+        return data
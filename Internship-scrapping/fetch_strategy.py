@@ -0,0 +1,142 @@
+from requests.adapters import HTTPAdapter
+from collections import defaultdict
+import requests
+import threading
+import logging
+import time
+
+from metrics import count, observe, metrics_enabled
+
+# --- HTTP Session Configuration ---
+HTTP_POOL_CONNECTIONS = 4   # Number of hosts kept in the pool
+HTTP_POOL_MAXSIZE = 8       # Keep-alive connections per host
+HTTP_TIMEOUT = 30           # Seconds
+
+# Fetch paths counted in FetchPathStats
+PATH_CACHE = 'cache'               # Fresh page cache entry, no network
+PATH_HTTP = 'http'                 # Plain GET was enough
+PATH_HTTP_NOT_MODIFIED = 'http-304'  # Conditional GET, server said unchanged
+PATH_BROWSER = 'browser'           # Escalated to Playwright
+PATH_FAILED = 'failed'
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_http_session(user_agent=None):
+    """Returns the shared keep-alive session (gzip/deflate are negotiated by requests)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+            _session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Accept': 'text/html,application/xhtml+xml'})
+            if user_agent: _session.headers['User-Agent'] = user_agent
+    return _session
+
+
+class FetchPathStats:
+    """Counts fetches per path and the time spent on each; no per-URL state, so it
+    stays the same size however long the crawl runs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seconds = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    def record(self, url, path, seconds, html_content=None):
+        """`html_content` is the body that crossed the network, if any (for the bytes metric)."""
+        with self._lock:
+            self.seconds[path] += seconds
+            self.counts[path] += 1
+        if metrics_enabled():
+            count('tender_fetch_path_total', path=path)
+            observe('tender_stage_seconds', seconds, stage='fetch', path=path)
+            if html_content: count('tender_fetch_bytes_total', len(html_content.encode('utf-8')), path=path)
+
+    def summary(self):
+        with self._lock:
+            return {path: {'count': self.counts[path], 'seconds': round(self.seconds[path], 3)}
+                    for path in self.counts}
+
+    def log_summary(self):
+        summary = self.summary()
+        if not summary: return
+        parts = [f"{path}={s['count']} ({s['seconds']}s)" for path, s in sorted(summary.items())]
+        logging.info(f"Fetch paths: {', '.join(parts)}")
+
+
+fetch_path_stats = FetchPathStats()
+
+
+def conditional_headers(cached):
+    """If-None-Match / If-Modified-Since headers from a cached entry's validators."""
+    headers = {}
+    if cached:
+        if cached.etag: headers['If-None-Match'] = cached.etag
+        if cached.last_modified: headers['If-Modified-Since'] = cached.last_modified
+    return headers
+
+
+def fetch_http(url, cached=None, user_agent=None, timeout=HTTP_TIMEOUT):
+    """Plain GET through the pooled session, conditional on a cached entry's validators.
+
+    Returns (html, not_modified, etag, last_modified, status); html is None on failure
+    and is the cached body when the server answered 304. status is None when the
+    request never got a response.
+    """
+    try:
+        response = get_http_session(user_agent).get(url, headers=conditional_headers(cached), timeout=timeout)
+    except requests.RequestException as e:
+        logging.warning(f"HTTP fetch failed for {url}: {e}")
+        return None, False, None, None, None
+    status = response.status_code
+    etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+    if status == 304 and cached:
+        return cached.html, True, etag, last_modified, status
+    if status != 200:
+        logging.warning(f"HTTP fetch for {url} returned status {status}")
+        return None, False, None, None, status
+    return response.text, False, etag, last_modified, status
+
+
+def fetch_with_fallback(url, is_ready, render, user_agent=None, cache=None, stats=fetch_path_stats):
+    """Serves `url` from the page cache, plain HTTP or `render()`, cheapest first.
+
+    A fresh cache entry costs no network; a stale one is revalidated with a
+    conditional GET. `render()` is only called when a 200 response fails
+    `is_ready(html)`; an error status or network failure is not something a
+    browser would fix, so it returns (None, PATH_FAILED) straight away.
+    Returns (html_content, path); the path is also recorded in `stats`.
+    """
+    started = time.perf_counter()
+    cached = cache.get(url) if cache is not None else None
+    if cached and cached.fresh:
+        stats.record(url, PATH_CACHE, time.perf_counter() - started)
+        logging.info(f"Serving {url} from page cache")
+        return cached.html, PATH_CACHE
+
+    html_content, not_modified, etag, last_modified, status = fetch_http(url, cached=cached, user_agent=user_agent)
+    if not_modified:
+        cache.touch(url, etag, last_modified)
+        stats.record(url, PATH_HTTP_NOT_MODIFIED, time.perf_counter() - started)
+        logging.info(f"Cached page for {url} revalidated (304 Not Modified)")
+        return html_content, PATH_HTTP_NOT_MODIFIED
+    if html_content and is_ready(html_content):
+        if cache is not None: cache.put(url, html_content, etag, last_modified)
+        stats.record(url, PATH_HTTP, time.perf_counter() - started, html_content)
+        logging.info(f"Fetched {url} over plain HTTP ({len(html_content)} bytes)")
+        return html_content, PATH_HTTP
+    if status != 200:
+        stats.record(url, PATH_FAILED, time.perf_counter() - started)
+        logging.error(f"Failed to fetch {url}: " + (f"HTTP {status}" if status else "no response"))
+        return None, PATH_FAILED
+
+    logging.info(f"Plain HTTP response for {url} failed the page check. Escalating to browser.")
+    html_content = render()
+    if html_content and cache is not None: cache.put(url, html_content)
+    path = PATH_BROWSER if html_content else PATH_FAILED
+    stats.record(url, path, time.perf_counter() - started, html_content)
+    return html_content, path
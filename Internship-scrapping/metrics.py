@@ -0,0 +1,205 @@
+from bisect import bisect_left
+import threading
+import logging
+import json
+import time
+import os
+
+# --- Metrics Configuration ---
+# Off unless enable_metrics() is called or $TENDER_METRICS is set; when off, every
+# hook returns after one flag check, so instrumented code costs next to nothing.
+METRICS_ENV = 'TENDER_METRICS'
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # Seconds
+
+_enabled = bool(os.environ.get(METRICS_ENV))
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_help = {
+    'tender_stage_seconds': 'Time spent in each pipeline stage.',
+    'tender_fetch_path_total': 'URLs by the fetch path they took (cache, http, http-304, browser, failed).',
+    'tender_fetch_bytes_total': 'Bytes of notice HTML fetched, by fetch path.',
+    'tender_cache_lookups_total': 'Page cache lookups by result (fresh, stale, miss).',
+    'tender_field_values_total': 'Extracted fields by parser and whether a value was found.',
+    'tender_field_errors_total': 'Field extractions that raised and were recorded as empty.',
+    'tender_records_written_total': 'Records written to the output, by format.',
+}
+
+
+def enable_metrics(enabled=True):
+    global _enabled
+    _enabled = enabled
+
+
+def metrics_enabled():
+    return _enabled
+
+
+def reset_metrics():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+# --- Recording ---
+
+def count(name, value=1, **labels):
+    if not _enabled: return
+    key = _key(name, labels)
+    with _lock: _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    if not _enabled: return
+    key = _key(name, labels)
+    with _lock:
+        series = _histograms.get(key)
+        if series is None: series = _histograms[key] = [0] * (len(STAGE_BUCKETS) + 1) + [0.0]
+        series[bisect_left(STAGE_BUCKETS, value)] += 1
+        series[-1] += value
+
+
+class _StageTimer:
+    __slots__ = ('labels', 'started')
+
+    def __init__(self, labels):
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe('tender_stage_seconds', time.perf_counter() - self.started, **self.labels)
+
+
+class _NullTimer:
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, *exc_info): pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timed(stage, **labels):
+    """`with timed('navigate'): ...` records the block's duration in the stage histogram."""
+    if not _enabled: return _NULL_TIMER
+    return _StageTimer(dict(labels, stage=stage))
+
+
+def field_error(parser, field, error=None):
+    """Counts a field whose extraction raised. Returns None, the value recorded for it."""
+    if error is not None: logging.debug(f"{parser}: extracting '{field}' failed: {error}")
+    count('tender_field_errors_total', parser=parser, field=field)
+    return None
+
+
+def record_fields(parser, data):
+    """Counts, per field of a parsed record, whether a value was found."""
+    if not _enabled: return
+    for field, value in data.items():
+        count('tender_field_values_total', parser=parser, field=field,
+              outcome='empty' if value is None or value == '' else 'present')
+
+
+# --- Export ---
+
+def snapshot():
+    """All series as plain data: {'counters': [...], 'histograms': [...]}."""
+    with _lock:
+        counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(_counters.items())]
+        histograms = []
+        for (name, labels), series in sorted(_histograms.items()):
+            cumulative, buckets = 0, {}
+            for bound, bucket_count in zip(STAGE_BUCKETS + ('+Inf',), series[:-1]):
+                cumulative += bucket_count
+                buckets[str(bound)] = cumulative
+            histograms.append({'name': name, 'labels': dict(labels), 'buckets': buckets,
+                               'count': cumulative, 'sum': round(series[-1], 6)})
+    return {'timestamp': time.time(), 'counters': counters, 'histograms': histograms}
+
+
+def _labels_text(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels: return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+def to_prometheus(data=None):
+    """The snapshot in the Prometheus text exposition format."""
+    data = data or snapshot()
+    lines, described = [], set()
+
+    def describe(name, kind):
+        if name in described: return
+        described.add(name)
+        if name in _help: lines.append(f"# HELP {name} {_help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    for series in data['counters']:
+        describe(series['name'], 'counter')
+        lines.append(f"{series['name']}{_labels_text(series['labels'])} {series['value']}")
+    for series in data['histograms']:
+        name = series['name']
+        describe(name, 'histogram')
+        for bound, cumulative in series['buckets'].items():
+            lines.append(f"{name}_bucket{_labels_text(series['labels'], le=bound)} {cumulative}")
+        lines.append(f"{name}_sum{_labels_text(series['labels'])} {series['sum']}")
+        lines.append(f"{name}_count{_labels_text(series['labels'])} {series['count']}")
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics(path):
+    """Writes a snapshot to `path`: JSON for .json, otherwise Prometheus text
+    (e.g. metrics.prom for node_exporter's textfile collector)."""
+    data = snapshot()
+    content = json.dumps(data, indent=2) if path.lower().endswith('.json') else to_prometheus(data)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f: f.write(content)
+    os.replace(temp_path, path)  # Scrapers never see a half-written file
+    logging.info(f"Wrote metrics snapshot to {path}")
+
+
+def _metrics_response(path):
+    """(body, content type) for a metrics endpoint path, or None if there is no such endpoint."""
+    if path.startswith('/metrics.json'):
+        return json.dumps(snapshot()).encode('utf-8'), 'application/json'
+    if path.startswith('/metrics'):
+        return to_prometheus().encode('utf-8'), 'text/plain; version=0.0.4'
+    return None
+
+
+def serve_metrics(port, host='127.0.0.1'):
+    """Serves /metrics (Prometheus text) and /metrics.json from a daemon thread. Returns the server."""
+    # Imported here: workers that only record metrics (e.g. reparse) never load the HTTP server modules
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            response = _metrics_response(self.path)
+            if response is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            body, content_type = response
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    enable_metrics()
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Serving metrics on http://{host}:{server.server_port}/metrics")
+    return server
@@ -0,0 +1,189 @@
+from bisect import bisect_right
+from datetime import datetime
+import threading
+import logging
+import csv
+import os
+import re
+
+# --- Normalization Configuration ---
+DEFAULT_DATE_FORMAT = '%d %B %Y'
+FALLBACK_DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d %b %Y')
+MAX_CACHED_VALUES = 100_000  # Distinct raw strings remembered per normalizer before the memo is reset
+
+# Columns of a raw record (parser called with normalize=False) and what they hold
+DATE_COLUMNS = ('Publication Date', 'Award Date')                                  # date text
+PERIOD_COLUMNS = ('Contract Duration',)                                            # (start text, end text)
+AMOUNT_COLUMNS = ('Final Contract Price (Original)', 'Estimated Contract Value (Original)')  # money text
+CONVERTED_COLUMNS = ('Estimated Contract Value (INR)',)                            # money text, converted
+RATE_DATE_COLUMNS = ('Publication Date', 'Award Date')  # As-of date for conversion: the first one present
+
+ISO_DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+class DateNormalizer:
+    """Turns notice date strings into YYYY-MM-DD, remembering what worked.
+
+    Same rules as the original clean_date: the primary format is tried on the
+    text before any comma, the fallbacks on the text before any '(' (e.g.
+    '(by 5:00pm)'), and unparseable text is returned unchanged. The default
+    formats accept disjoint inputs (no string parses under two of them to
+    different dates), so the order they are tried in never changes a result.
+    With `infer_order`, each source therefore keeps the format that last matched
+    at the front of its own order. Results are memoized per distinct string, so
+    a batch parses every distinct date once.
+    """
+
+    def __init__(self, primary_format=DEFAULT_DATE_FORMAT, fallback_formats=FALLBACK_DATE_FORMATS, infer_order=True):
+        self.primary_format = primary_format
+        self.candidates = ((primary_format, True),) + tuple((fmt, False) for fmt in fallback_formats)
+        self.infer_order = infer_order
+        self._orders = {}  # source -> candidates, most recently successful first
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _parse(self, text, source):
+        order = self._orders.get(source, self.candidates)
+        for i, (fmt, primary) in enumerate(order):
+            try:
+                date_part = text.split(',')[0].strip() if primary else text.strip().split('(')[0].strip()
+                value = datetime.strptime(date_part, fmt).strftime('%Y-%m-%d')
+            except (ValueError, AttributeError, TypeError):
+                continue
+            if i and self.infer_order: self._orders[source] = (order[i],) + order[:i] + order[i + 1:]
+            return value
+        logging.warning(f"Could not parse date: '{text}' with any known format.")
+        return text
+
+    def parse(self, text, source=None):
+        if not text: return None
+        value = self._cache.get(text)
+        if value is None:
+            with self._lock:
+                value = self._parse(text, source)
+                if len(self._cache) >= MAX_CACHED_VALUES: self._cache.clear()
+                self._cache[text] = value
+        return value
+
+    def parse_column(self, values, source=None):
+        """Parses a column of raw date strings; each distinct string is parsed once."""
+        parsed = {}
+        for text in values:
+            if text and text not in parsed: parsed[text] = self.parse(text, source)
+        return [parsed.get(text) if text else None for text in values]
+
+
+class AmountParser:
+    """Money text to float, with the original clean_currency rules: the first
+    space-separated token, with '£', '€', commas and NBSPs removed; None if that is
+    not a number. Memoized per distinct string."""
+
+    def __init__(self):
+        self._cache = {}
+
+    def _parse(self, text):
+        cleaned_text = re.sub(r'[£€,]', '', text.split(' ')[0]).replace(' ', '').replace('\xa0', '')
+        try: return float(cleaned_text)
+        except (ValueError, TypeError): return None
+
+    def parse(self, text):
+        if not text: return None
+        try: return self._cache[text]
+        except KeyError: pass
+        value = self._parse(text)
+        if len(self._cache) >= MAX_CACHED_VALUES: self._cache.clear()
+        self._cache[text] = value
+        return value
+
+    def parse_column(self, values):
+        return [self.parse(text) for text in values]
+
+
+class ExchangeRateTable:
+    """Exchange rates by effective date (YYYY-MM-DD).
+
+    rate_on(date) returns the rate in effect on that date: the latest entry on or
+    before it, the earliest entry for older dates, and the latest entry when the
+    date is missing or not ISO-formatted.
+    """
+
+    def __init__(self, rates):
+        rates = sorted((str(date), float(rate)) for date, rate in rates)
+        if not rates: raise ValueError("An exchange-rate table needs at least one rate.")
+        self.dates = [date for date, _ in rates]
+        self.rates = [rate for _, rate in rates]
+
+    @classmethod
+    def constant(cls, rate):
+        return cls([('0001-01-01', rate)])
+
+    def rate_on(self, date=None):
+        if not date or not ISO_DATE_PATTERN.match(date): return self.rates[-1]
+        return self.rates[max(0, bisect_right(self.dates, date) - 1)]
+
+    def convert(self, amount, date=None):
+        if amount is None: return None
+        return round(amount * self.rate_on(date), 2)
+
+
+def load_exchange_rates(path, default_rate):
+    """Reads a `date,rate` CSV (header row required); a constant `default_rate` table if there is no file."""
+    if not path or not os.path.exists(path):
+        return ExchangeRateTable.constant(default_rate)
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        rows = [(row['date'].strip(), row['rate']) for row in csv.DictReader(f) if row.get('date')]
+    table = ExchangeRateTable(rows)
+    logging.info(f"Loaded {len(rows)} exchange rates from {path} ({table.dates[0]} to {table.dates[-1]})")
+    return table
+
+
+_date_normalizers = {}
+_amount_parser = AmountParser()
+
+
+def get_date_normalizer(primary_format=DEFAULT_DATE_FORMAT):
+    normalizer = _date_normalizers.get(primary_format)
+    if normalizer is None:
+        # Only the default formats are known to be disjoint; others keep the fixed order
+        normalizer = _date_normalizers[primary_format] = DateNormalizer(
+            primary_format, infer_order=(primary_format == DEFAULT_DATE_FORMAT))
+    return normalizer
+
+
+def get_amount_parser():
+    return _amount_parser
+
+
+def normalize_records(records, rates, source=None, dates=None, amounts=None):
+    """Normalizes a batch of raw records in place, column by column, and returns them.
+
+    Dates become YYYY-MM-DD, (start, end) periods become 'start to end', amounts
+    become floats, and converted columns are the amount times the rate in effect
+    on the record's publication (else award) date. `source` keys the cached
+    date-format order, e.g. the site's metrics label.
+    """
+    if not records: return records
+    dates = dates or get_date_normalizer()
+    amounts = amounts or get_amount_parser()
+
+    for column in DATE_COLUMNS:
+        for record, value in zip(records, dates.parse_column([r.get(column) for r in records], source)):
+            if column in record: record[column] = value
+
+    for column in PERIOD_COLUMNS:
+        periods = [r.get(column) or (None, None) for r in records]
+        starts = dates.parse_column([start for start, _ in periods], source)
+        ends = dates.parse_column([end for _, end in periods], source)
+        for record, start, end in zip(records, starts, ends):
+            if column in record: record[column] = f"{start} to {end}" if start and end else None
+
+    for column in AMOUNT_COLUMNS:
+        for record, value in zip(records, amounts.parse_column([r.get(column) for r in records])):
+            if column in record: record[column] = value
+
+    for column in CONVERTED_COLUMNS:
+        for record, value in zip(records, amounts.parse_column([r.get(column) for r in records])):
+            if column not in record: continue
+            as_of = next((record[c] for c in RATE_DATE_COLUMNS if record.get(c)), None)
+            record[column] = rates.convert(value, as_of)
+    return records
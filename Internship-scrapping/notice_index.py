@@ -0,0 +1,100 @@
+from collections import defaultdict
+from bs4 import Tag
+import re
+
+# --- Find a Tender Section Index ---
+# Section headings carry their code twice ("two.2.1) Title" and "II.2.1) Title");
+# only the roman-numeral form is matched.
+SECTION_CODE_PATTERN = re.compile(r'(?<![\w.])([IVX]+(?:\.\d+)+)\)')
+LOT_HEADING_ID_PATTERN = re.compile(r'^object-\d+-lot-(\d+)$')
+AWARD_HEADING_ID_PATTERN = re.compile(r'^award_contract-(\d+)$')
+HEADING_TAGS = ('h2', 'h3', 'h4')
+
+
+class Section:
+    """A coded notice section: its heading node and the value nodes that follow it."""
+    __slots__ = ('code', 'title', 'heading', 'values', 'lot', 'award')
+
+    def __init__(self, code, title, heading, values, lot, award):
+        self.code = code
+        self.title = title
+        self.heading = heading
+        self.values = values
+        self.lot = lot
+        self.award = award
+
+    def value_tags(self, names=('p',), limit=None):
+        """Value nodes with one of the given tag names, in document order."""
+        tags = [tag for tag in self.values if tag.name in names]
+        return tags[:limit] if limit else tags
+
+    def first_value(self, names=('p',), class_=None):
+        for tag in self.values:
+            if tag.name in names and (class_ is None or class_ in (tag.get('class') or [])):
+                return tag
+        return None
+
+    def __repr__(self):
+        return f"Section({self.code!r}, lot={self.lot!r}, award={self.award!r}, values={len(self.values)})"
+
+
+class SectionIndex:
+    """One-pass index of a Find a Tender notice by section code and lot.
+
+    The notice body is a flat run of sibling h2/h3/h4 headings, each followed by
+    its value nodes (p, ul, h5, ...). Headings are visited once in document order;
+    each coded heading collects the siblings up to the next heading, so building
+    the index is linear in the document size.
+
+    Lot context comes from `object-N-lot-M` headings (section II.2) and from the
+    "Lot No" value of each `award_contract-N` block (section V); every h2 resets it.
+    """
+
+    def __init__(self, soup):
+        self.sections = []
+        self._by_code = defaultdict(list)
+        self._build(soup)
+
+    def _build(self, soup):
+        lot, award = None, None
+        for heading in soup.find_all(HEADING_TAGS):
+            heading_id = heading.get('id') or ''
+            if heading.name == 'h2':
+                lot, award = None, None
+                award_match = AWARD_HEADING_ID_PATTERN.match(heading_id)
+                if award_match: award = award_match.group(1)
+            lot_match = LOT_HEADING_ID_PATTERN.match(heading_id)
+            if lot_match: lot = lot_match.group(1)
+
+            values = []
+            for sibling in heading.next_siblings:
+                if not isinstance(sibling, Tag): continue
+                if sibling.name in HEADING_TAGS: break
+                values.append(sibling)
+
+            text = heading.get_text(' ', strip=True)
+            if award and heading.name == 'h3' and text == 'Lot No':
+                lot_value = next((tag for tag in values if tag.name == 'p'), None)
+                lot = lot_value.get_text(strip=True) if lot_value else None
+                continue
+
+            code_match = SECTION_CODE_PATTERN.search(text)
+            if not code_match: continue
+            section = Section(code_match.group(1), text[code_match.end():].strip(), heading, values, lot, award)
+            self.sections.append(section)
+            self._by_code[section.code].append(section)
+
+    def get(self, code, lot=None):
+        """All sections with this code (optionally only those in `lot`), in document order."""
+        sections = self._by_code.get(code, [])
+        if lot is None: return list(sections)
+        return [section for section in sections if section.lot == str(lot)]
+
+    def first(self, code, lot=None):
+        sections = self.get(code, lot)
+        return sections[0] if sections else None
+
+    def lots(self):
+        """Lot ids seen anywhere in the notice, in numeric order."""
+        lots = {section.lot for section in self.sections if section.lot}
+        return sorted(lots, key=lambda lot: (not lot.isdigit(), int(lot) if lot.isdigit() else 0, lot))
@@ -0,0 +1,347 @@
+"""Bulk ingest of OCDS release data from Find a Tender and Contracts Finder.
+
+Both services publish their notices as OCDS JSON. This reads release packages
+(or record packages, JSON Lines, plain arrays of releases; optionally .gz) from
+files or the paged OCDS APIs as a stream, one release at a time, maps each
+release onto the tender CSV columns and writes them through the usual sinks.
+Notices ingested here are marked in the crawl state, so the HTML crawl only
+fetches notices the feed lacks.
+
+Usage:
+    python ocds_ingest.py releases.json [more.jsonl.gz ...] [-o tender_data.csv]
+    python ocds_ingest.py --api find-tender --from 2024-01-01T00:00:00 [-o ...]
+"""
+from urllib.parse import urlencode
+import argparse
+import hashlib
+import logging
+import gzip
+import json
+import time
+import io
+import re
+
+from Scrape_tenders import (SITES, USER_AGENT, EXTRACTION_VERSION, CRAWL_STATE_DB,
+                            FINDATENDER_PARSER, normalize_tender_records)
+
+# --- OCDS Configuration ---
+DEFAULT_BATCH_SIZE = 500   # Releases normalized and written together
+DEFAULT_PAGE_DELAY = 1.0   # Seconds between API pages
+READ_CHUNK_SIZE = 64 * 1024
+PACKAGE_ARRAYS = ('releases', 'records')  # Streamed item by item; other package keys are small
+
+# Paged OCDS endpoints; each response is a package whose links.next points at the next page.
+OCDS_APIS = {
+    'find-tender': {
+        'url': 'https://www.find-tender.service.gov.uk/api/1.0/ocdsReleasePackages',
+        'params': {'from': 'updatedFrom', 'to': 'updatedTo'}, 'page_size': ('limit', 100),
+    },
+    'contracts-finder': {
+        'url': 'https://www.contractsfinder.service.gov.uk/Published/Notices/OCDS/Search',
+        'params': {'from': 'publishedFrom', 'to': 'publishedTo'}, 'page_size': ('limit', 100),
+    },
+}
+
+FINDATENDER_NOTICE_ID_PATTERN = re.compile(r'^(\d{6})-(\d{4})$')
+
+
+# --- Streaming ---
+
+def _open_source(path):
+    return gzip.open(path, 'rb') if path.lower().endswith('.gz') else open(path, 'rb')
+
+
+def _is_jsonl(path):
+    return path.lower().removesuffix('.gz').endswith(('.jsonl', '.ndjson'))
+
+
+def _package_items(key, item):
+    """A record package holds records; their compiledRelease is the notice's current state."""
+    if key == 'records':
+        return item.get('compiledRelease') or (item.get('releases') or [None])[-1]
+    return item
+
+
+class _StreamReader:
+    """Incremental JSON reader: decodes one value at a time from a sliding text
+    buffer with JSONDecoder.raw_decode, so only the current release is held in
+    memory and each release is still decoded by the C scanner."""
+
+    _whitespace = re.compile(r'[\s,]*')
+
+    def __init__(self, text_file):
+        self.file = text_file
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.file.read(READ_CHUNK_SIZE)
+        if not chunk: self.eof = True
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+
+    def peek(self):
+        """Next significant character (commas are skipped), or '' at end of input."""
+        while True:
+            self.pos = self._whitespace.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or self.eof: return self.buffer[self.pos:self.pos + 1]
+            self._fill()
+
+    def expect(self, char):
+        if self.peek() != char: raise ValueError(f"Expected '{char}' in OCDS JSON, found '{self.peek()}'")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number may continue in the next chunk; only trust it once more input is buffered
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof: raise
+            self._fill()
+
+
+def stream_package(binary_file, meta=None):
+    """Yields the releases of one OCDS package (or top-level array) from a binary
+    file, holding one release in memory at a time. The package's other top-level
+    keys (e.g. links, whose `next` pages an API) are stored in `meta`."""
+    meta = {} if meta is None else meta
+    reader = _StreamReader(io.TextIOWrapper(binary_file, encoding='utf-8'))
+    if reader.peek() == '[':  # Top-level array of releases
+        reader.expect('[')
+        while reader.peek() not in (']', ''):
+            yield reader.value()
+        return
+    reader.expect('{')
+    while reader.peek() not in ('}', ''):
+        key = reader.value()
+        reader.expect(':')
+        if key in PACKAGE_ARRAYS and reader.peek() == '[':
+            reader.expect('[')
+            while reader.peek() not in (']', ''):
+                release = _package_items(key, reader.value())
+                if release: yield release
+            reader.expect(']')
+        else:
+            meta[key] = reader.value()
+
+
+def iter_file_releases(path):
+    """Releases from a package/array file, or a JSON Lines file of releases or packages."""
+    with _open_source(path) as f:
+        if not _is_jsonl(path):
+            yield from stream_package(f)
+            return
+        for line in f:
+            if not line.strip(): continue
+            item = json.loads(line)
+            if any(key in item for key in PACKAGE_ARRAYS):
+                for key in PACKAGE_ARRAYS:
+                    for release in item.get(key) or []:
+                        release = _package_items(key, release)
+                        if release: yield release
+            else:
+                yield item
+
+
+def iter_api_releases(url, page_delay=DEFAULT_PAGE_DELAY, max_pages=None, session=None):
+    """Releases from a paged OCDS API, following each package's links.next."""
+    if session is None:
+        from fetch_strategy import get_http_session
+        session = get_http_session(USER_AGENT)
+    pages = 0
+    while url and (max_pages is None or pages < max_pages):
+        if pages: time.sleep(page_delay)
+        logging.info(f"Fetching OCDS page {url}")
+        with session.get(url, stream=True, timeout=120) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            meta = {}
+            yield from stream_package(response.raw, meta)
+        pages += 1
+        url = (meta.get('links') or {}).get('next')
+    logging.info(f"OCDS API paging finished after {pages} page(s).")
+
+
+def api_url(name, date_from=None, date_to=None):
+    api = OCDS_APIS[name]
+    params = {api['params'][k]: v for k, v in (('from', date_from), ('to', date_to)) if v}
+    params[api['page_size'][0]] = api['page_size'][1]
+    return f"{api['url']}?{urlencode(params)}"
+
+
+# --- Mapping ---
+
+def _date(value):
+    return value[:10] if isinstance(value, str) and value else None
+
+
+def _amount(value_block):
+    amount = (value_block or {}).get('amount')
+    return None if amount is None else repr(float(amount))
+
+
+def _period(*periods):
+    for period in periods:
+        if period and period.get('startDate') and period.get('endDate'):
+            return _date(period['startDate']), _date(period['endDate'])
+    return None
+
+
+def _buyer_name(release):
+    buyer = release.get('buyer') or {}
+    if buyer.get('name'): return buyer['name']
+    for party in release.get('parties') or []:
+        if 'buyer' in (party.get('roles') or []) and party.get('name'): return party['name']
+    return None
+
+
+def _bid_count(release):
+    for statistic in (release.get('bids') or {}).get('statistics') or []:
+        if statistic.get('measure') == 'bids' and statistic.get('value') is not None:
+            return str(int(statistic['value']))
+    return None
+
+
+def release_notice(release):
+    """(site, notice_id, reference) for a release, from its ocid prefix; (None, None, None) if unknown.
+
+    Find a Tender release ids are the notice id ('008624-2023'), shown on the
+    notice page as '2023/S 000-008624'; Contracts Finder ocids end with the
+    notice's GUID, which is also its reference in the scraped output.
+    """
+    ocid = release.get('ocid') or ''
+    for site in SITES.values():
+        prefix = site.get('ocid_prefix')
+        if not prefix or not ocid.startswith(prefix + '-'): continue
+        if site['label'] == FINDATENDER_PARSER:
+            match = FINDATENDER_NOTICE_ID_PATTERN.match(str(release.get('id') or ''))
+            if not match: return site, None, None
+            return site, match.group(0), f"{match.group(2)}/S 000-{match.group(1)}"
+        notice_id = ocid[len(prefix) + 1:]
+        return site, notice_id, notice_id
+    return None, None, None
+
+
+def release_to_record(release):
+    """Maps one OCDS release to a raw tender record (see normalize_tender_records), or None.
+
+    Title, buyer, publication/award dates, award and estimated values, suppliers,
+    contract period and bid count come from the standard OCDS fields; the first
+    award with the field set wins, as the HTML parsers take the first section.
+    """
+    site, notice_id, reference = release_notice(release)
+    if not site or not notice_id: return None
+    tender = release.get('tender') or {}
+    awards = release.get('awards') or []
+    contracts = release.get('contracts') or []
+    lots = tender.get('lots') or []
+
+    suppliers = []
+    for award in awards:
+        for supplier in award.get('suppliers') or []:
+            name = supplier.get('name')
+            if name and name not in suppliers: suppliers.append(name)
+    award_value = next((award['value'] for award in awards if (award.get('value') or {}).get('amount') is not None), None)
+    award_date = next((award['date'] for award in awards if award.get('date')), None)
+    currency = (award_value or tender.get('value') or {}).get('currency') or 'GBP'
+    estimate = tender.get('value')
+    # The INR column is converted from GBP; an estimate in any other currency is left unconverted
+    estimate_gbp = estimate if (estimate or {}).get('currency', currency) == 'GBP' else None
+
+    return {
+        'Source URL': site['notice_url'].format(notice_id),
+        'Currency (Original)': currency,
+        'Tender Title': tender.get('title') or next((a['title'] for a in awards if a.get('title')), None),
+        'Tender ID/Reference Number': reference,
+        'Publication Date': _date(release.get('date')),
+        'Issuing Authority': _buyer_name(release),
+        'Award Date': _date(award_date),
+        'Winning Company/Companies': ", ".join(suppliers) if suppliers else None,
+        'Final Contract Price (Original)': _amount(award_value),
+        'Estimated Contract Value (Original)': _amount(estimate),
+        'Estimated Contract Value (INR)': _amount(estimate_gbp),
+        'Contract Duration': _period(*(lot.get('contractPeriod') for lot in lots[:1]), tender.get('contractPeriod'),
+                                     *(award.get('contractPeriod') for award in awards),
+                                     *(contract.get('period') for contract in contracts)),
+        'List of Participating Companies (bidders)': _bid_count(release),
+        'Number of units/doses required': None,
+    }
+
+
+def release_hash(release):
+    return hashlib.sha256(json.dumps(release, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+# --- Ingest ---
+
+def ingest_releases(releases, sink, state=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Maps, normalizes and writes releases in batches. Releases already ingested
+    with identical content (per `state`) are skipped. Returns outcome counts."""
+    counts = {'written': 0, 'unchanged': 0, 'unmapped': 0}
+    batch = []
+
+    def flush():
+        by_site = {}
+        for record, _, site in batch: by_site.setdefault(site['label'], []).append(record)
+        for label, records in by_site.items(): normalize_tender_records(records, label)
+        for record, digest, _ in batch:
+            sink.write(record)
+            if state is not None:
+                state.mark_extracted(record['Source URL'], digest, record.get('Tender ID/Reference Number'), from_feed=True)
+        counts['written'] += len(batch)
+        batch.clear()
+
+    for release in releases:
+        record = release_to_record(release)
+        if record is None:
+            counts['unmapped'] += 1
+            continue
+        digest = release_hash(release)
+        if state is not None and state.is_unchanged(record['Source URL'], digest):
+            counts['unchanged'] += 1
+            continue
+        batch.append((record, digest, release_notice(release)[0]))
+        if len(batch) >= batch_size: flush()
+    if batch: flush()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest OCDS release files or APIs into the tender output.")
+    parser.add_argument('files', nargs='*', help="Release/record package files (.json, .jsonl, optionally .gz)")
+    parser.add_argument('--api', choices=sorted(OCDS_APIS), action='append', help="Page through a service's OCDS API")
+    parser.add_argument('--from', dest='date_from', help="API start date/time (ISO 8601)")
+    parser.add_argument('--to', dest='date_to', help="API end date/time (ISO 8601)")
+    parser.add_argument('--max-pages', type=int, default=None)
+    parser.add_argument('-o', '--output', default='tender_data.csv')
+    parser.add_argument('--state', default=CRAWL_STATE_DB, help="Crawl state database (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if not args.files and not args.api:
+        parser.error("Give release files and/or --api.")
+
+    from output_sink import open_sink
+    from crawl_state import CrawlState
+
+    def releases():
+        for path in args.files:
+            logging.info(f"Reading OCDS releases from {path}")
+            yield from iter_file_releases(path)
+        for name in args.api or []:
+            yield from iter_api_releases(api_url(name, args.date_from, args.date_to), max_pages=args.max_pages)
+
+    with open_sink(args.output, append=True) as sink, \
+         CrawlState(args.state, extraction_version=EXTRACTION_VERSION, before_checkpoint=sink.flush) as state:
+        counts = ingest_releases(releases(), sink, state)
+    logging.info(f"✅ OCDS ingest: {counts['written']} written, {counts['unchanged']} unchanged, "
+                 f"{counts['unmapped']} releases not mapped to a notice")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import logging
+import json
+import uuid
+import time
+import csv
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output is optional
+    pa, pq = None, None
+
+from Scrape_tenders import FINAL_COLUMNS
+from metrics import timed, count
+
+# --- Output Sink Configuration ---
+DEFAULT_BATCH_SIZE = 500      # Records buffered before a flush
+DEFAULT_FLUSH_INTERVAL = 30   # Seconds; a slow crawl still reaches disk regularly
+PARQUET_PART_PREFIX = 'part-'  # Part files of a Parquet output directory
+NUMERIC_COLUMNS = {
+    'Final Contract Price (Original)', 'Estimated Contract Value (INR)', 'Estimated Contract Value (Original)',
+}
+
+
+class RecordSink:
+    """Buffers records and appends them to the output in batches.
+
+    Every record is projected onto `columns` (missing fields become empty), so the
+    schema is fixed no matter which scraper produced it. A flush happens after
+    `batch_size` records or `flush_interval` seconds, whichever comes first, and
+    on close, so at most one batch is held in memory and a crash loses at most
+    that batch.
+
+    With `lots` (another sink, usually over LOT_COLUMNS), each record's 'Lots'
+    list is written there too, one row per lot carrying the notice's ID and URL;
+    it is flushed and closed along with this sink.
+    """
+
+    format = None  # Name in SINK_FORMATS, used as the metrics label
+
+    def __init__(self, path, columns=FINAL_COLUMNS, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, append=False, lots=None):
+        self.path = path
+        self.lots = lots
+        self.columns = list(columns)
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.append = append
+        self.count = 0
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._closed = False
+        self._open()
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _write_batch(self, rows):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+    def write(self, record):
+        self._buffer.append([record.get(column) for column in self.columns])
+        self.count += 1
+        if self.lots is not None:
+            for lot in record.get('Lots') or ():
+                self.lots.write(dict(lot, **{'Tender ID/Reference Number': record.get('Tender ID/Reference Number'),
+                                             'Source URL': record.get('Source URL')}))
+        if len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def write_many(self, records):
+        for record in records: self.write(record)
+
+    def flush(self):
+        if self._buffer:
+            with timed('export', format=self.format):
+                self._write_batch(self._buffer)
+            count('tender_records_written_total', len(self._buffer), format=self.format)
+            self._buffer = []
+        self._last_flush = time.monotonic()
+        if self.lots is not None: self.lots.flush()
+
+    def close(self):
+        if self._closed: return
+        self.flush()
+        self._close()
+        self._closed = True
+        if self.lots is not None: self.lots.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _appending_to_existing(path, append):
+    return append and os.path.exists(path) and os.path.getsize(path) > 0
+
+
+class CsvSink(RecordSink):
+    format = 'csv'
+
+    def _open(self):
+        existing = _appending_to_existing(self.path, self.append)
+        # Same encoding as the original export (BOM for Excel), but no second BOM mid-file
+        self._file = open(self.path, 'a' if existing else 'w', newline='', encoding='utf-8' if existing else 'utf-8-sig')
+        self._writer = csv.writer(self._file, lineterminator='\n')  # Matches the pandas export
+        if not existing: self._writer.writerow(self.columns)
+
+    def _write_batch(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class JsonlSink(RecordSink):
+    format = 'jsonl'
+
+    def _open(self):
+        self._file = open(self.path, 'a' if self.append else 'w', encoding='utf-8')
+
+    def _write_batch(self, rows):
+        self._file.writelines(json.dumps(dict(zip(self.columns, row)), ensure_ascii=False) + '\n' for row in rows)
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class ParquetSink(RecordSink):
+    """Writes a Parquet dataset: `path` is a directory holding one part file per flush.
+
+    A Parquet file is only readable once its footer is written on close, so each
+    flush writes a complete part file (to a temporary name, then renamed). Every
+    flushed row is therefore readable while the run is still going, and a killed
+    run loses at most the unflushed batch. Appending adds parts; otherwise the
+    directory's existing parts are replaced. Read it back with
+    pyarrow.parquet.read_table(path). Needs pyarrow.
+    """
+
+    format = 'parquet'
+
+    def _open(self):
+        if pa is None:
+            raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow).")
+        if os.path.isfile(self.path):
+            raise ValueError(f"{self.path} is a single Parquet file; Parquet output is now a directory of part "
+                             f"files. Move it aside or choose another path.")
+        os.makedirs(self.path, exist_ok=True)
+        if not self.append:
+            for name in os.listdir(self.path):
+                if name.startswith((PARQUET_PART_PREFIX, '.' + PARQUET_PART_PREFIX)):
+                    os.remove(os.path.join(self.path, name))
+        self._schema = pa.schema([
+            (column, pa.float64() if column in NUMERIC_COLUMNS else pa.string()) for column in self.columns
+        ])
+        self._run = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"  # Unique per sink, sorts by time
+        self._parts = 0
+
+    def _write_batch(self, rows):
+        arrays = []
+        for i, field in enumerate(self._schema):
+            values = [row[i] for row in rows]
+            if pa.types.is_floating(field.type):
+                values = [_to_float(value) for value in values]
+            else:
+                values = [None if value is None else str(value) for value in values]
+            arrays.append(pa.array(values, type=field.type))
+        self._parts += 1
+        name = f"{PARQUET_PART_PREFIX}{self._run}-{self._parts:05d}.parquet"
+        temporary = os.path.join(self.path, f".{name}.tmp")  # Dot files are skipped by Parquet dataset readers
+        pq.write_table(pa.Table.from_arrays(arrays, schema=self._schema), temporary)
+        os.replace(temporary, os.path.join(self.path, name))
+
+    def _close(self):
+        pass
+
+
+def _to_float(value):
+    if value is None: return None
+    try: return float(value)
+    except (TypeError, ValueError):
+        logging.warning(f"Non-numeric value '{value}' written as null in Parquet output.")
+        return None
+
+
+SINK_FORMATS = {'csv': CsvSink, 'jsonl': JsonlSink, 'parquet': ParquetSink}
+_EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.parquet': 'parquet'}
+
+
+def open_sink(path, format=None, **kwargs):
+    """Opens a sink for `path`; the format defaults to the file extension (.csv, .jsonl, .parquet)."""
+    if format is None:
+        format = _EXTENSIONS.get(os.path.splitext(path)[1].lower())
+        if format is None:
+            raise ValueError(f"Cannot infer output format from '{path}'. Use one of: {', '.join(SINK_FORMATS)}")
+    if format not in SINK_FORMATS:
+        raise ValueError(f"Unknown output format '{format}'. Use one of: {', '.join(SINK_FORMATS)}")
+    return SINK_FORMATS[format](path, **kwargs)
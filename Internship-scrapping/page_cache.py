@@ -0,0 +1,230 @@
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from collections import namedtuple
+import threading
+import sqlite3
+import hashlib
+import logging
+import gzip
+import time
+import os
+
+try:
+    import zstandard  # Optional: smaller and faster than gzip
+except ImportError:
+    zstandard = None
+
+from metrics import count
+
+# --- Page Cache Configuration ---
+DEFAULT_CACHE_DIR = 'page_cache'
+DEFAULT_TTL = 7 * 24 * 3600            # Seconds before an entry must be revalidated
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # Compressed bytes on disk before LRU eviction
+INDEX_BUSY_TIMEOUT = 60                # Seconds to wait for the index lock (work-queue workers share it)
+
+CacheEntry = namedtuple('CacheEntry', 'url html content_hash etag last_modified fetched_at fresh')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url_key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed_at);
+CREATE INDEX IF NOT EXISTS pages_content ON pages (content_hash);
+"""
+
+
+def normalize_url(url):
+    """Canonical form used as the cache key: lower-case scheme/host, no default port,
+    no fragment, sorted query parameters. The path is kept as-is (it is case-sensitive)."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and not ((scheme == 'http' and parts.port == 80) or (scheme == 'https' and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or '/', query, ''))
+
+
+def content_hash(html_content):
+    return hashlib.sha256(html_content.encode('utf-8')).hexdigest()
+
+
+def _compress(data):
+    if zstandard: return 'zst', zstandard.ZstdCompressor(level=10).compress(data)
+    return 'gz', gzip.compress(data, compresslevel=6)
+
+
+def _decompress(codec, data):
+    if codec == 'zst':
+        if not zstandard: raise RuntimeError("Cache entry is zstd-compressed but zstandard is not installed.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def read_blob(path, codec):
+    """Reads and decompresses one cached body; usable without opening the index."""
+    with open(path, 'rb') as f:
+        return _decompress(codec, f.read()).decode('utf-8')
+
+
+class PageCache:
+    """On-disk HTML cache keyed by normalized URL.
+
+    Bodies are stored compressed and content-addressed (`<dir>/<hh>/<sha256>.<codec>`),
+    so notices that render identically share one file. A SQLite index keeps the
+    ETag/Last-Modified validators, fetch time and last access time of each URL.
+    Entries older than `ttl` are returned with fresh=False so callers revalidate
+    them with a conditional GET; once the store exceeds `max_bytes` the least
+    recently used URLs are evicted.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, 'index.sqlite'), timeout=INDEX_BUSY_TIMEOUT,
+                                   check_same_thread=False)
+        # Several worker processes read and write the index at once: WAL lets readers run
+        # alongside the writer, and the busy timeout queues writers instead of failing them
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def _blob_path(self, digest, codec):
+        return os.path.join(self.directory, digest[:2], f"{digest}.{codec}")
+
+    def _key(self, url):
+        return hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+
+    # --- Reads ---
+
+    def get(self, url):
+        """Returns a CacheEntry (fresh or stale) or None if the URL is not cached."""
+        key = self._key(url)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, content_hash, codec, etag, last_modified, fetched_at FROM pages WHERE url_key = ?",
+                (key,)).fetchone()
+            if not row:
+                count('tender_cache_lookups_total', result='miss')
+                return None
+            cached_url, digest, codec, etag, last_modified, fetched_at = row
+            try:
+                html_content = read_blob(self._blob_path(digest, codec), codec)
+            except (OSError, ValueError, RuntimeError) as e:
+                logging.warning(f"Dropping unreadable cache entry for {url}: {e}")
+                self._delete_keys([key])
+                count('tender_cache_lookups_total', result='miss')
+                return None
+            self._db.execute("UPDATE pages SET accessed_at = ? WHERE url_key = ?", (time.time(), key))
+            self._db.commit()
+        fresh = (time.time() - fetched_at) < self.ttl
+        count('tender_cache_lookups_total', result='fresh' if fresh else 'stale')
+        return CacheEntry(cached_url, html_content, digest, etag, last_modified, fetched_at, fresh)
+
+    def iter_entries(self):
+        """Yields (url, blob_path, codec) for every cached page, without reading bodies."""
+        with self._lock:
+            rows = self._db.execute("SELECT url, content_hash, codec FROM pages ORDER BY url").fetchall()
+        for url, digest, codec in rows:
+            yield url, self._blob_path(digest, codec), codec
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    # --- Writes ---
+
+    def put(self, url, html_content, etag=None, last_modified=None):
+        """Stores (or replaces) the body for `url` and evicts LRU entries if over budget."""
+        key = self._key(url)
+        digest = content_hash(html_content)
+        now = time.time()
+        with self._lock:
+            existing = self._db.execute("SELECT codec FROM pages WHERE content_hash = ? LIMIT 1", (digest,)).fetchone()
+            if existing and os.path.exists(self._blob_path(digest, existing[0])):
+                codec = existing[0]
+                size = os.path.getsize(self._blob_path(digest, codec))
+            else:
+                codec, blob = _compress(html_content.encode('utf-8'))
+                path = self._blob_path(digest, codec)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f: f.write(blob)
+                os.replace(tmp_path, path)  # Atomic: readers never see a partial body
+                size = len(blob)
+            old = self._db.execute("SELECT content_hash FROM pages WHERE url_key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, normalize_url(url), digest, codec, size, etag, last_modified, now, now))
+            if old and old[0] != digest: self._remove_orphan_blob(old[0])
+            self._db.commit()
+            self._evict()
+
+    def touch(self, url, etag=None, last_modified=None):
+        """Marks an entry fresh again after a 304 Not Modified, updating validators if sent."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE pages SET fetched_at = ?, accessed_at = ?, etag = COALESCE(?, etag), "
+                "last_modified = COALESCE(?, last_modified) WHERE url_key = ?",
+                (time.time(), time.time(), etag, last_modified, self._key(url)))
+            self._db.commit()
+
+    # --- Eviction ---
+
+    def total_bytes(self):
+        with self._lock:
+            return self._total_bytes()
+
+    def _total_bytes(self):
+        row = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT content_hash, size FROM pages)").fetchone()
+        return row[0]
+
+    def _evict(self):
+        total = self._total_bytes()
+        if total <= self.max_bytes: return
+        references = dict(self._db.execute("SELECT content_hash, COUNT(*) FROM pages GROUP BY content_hash"))
+        evicted = []
+        for key, digest, size in self._db.execute("SELECT url_key, content_hash, size FROM pages ORDER BY accessed_at").fetchall():
+            if total <= self.max_bytes: break
+            evicted.append(key)
+            references[digest] -= 1
+            if references[digest] == 0: total -= size  # Blob is freed once its last URL goes
+        self._delete_keys(evicted)
+        logging.info(f"Evicted {len(evicted)} page(s) from cache (now {total} bytes).")
+
+    def _delete_keys(self, keys):
+        for key in keys:
+            row = self._db.execute("SELECT content_hash FROM pages WHERE url_key = ?", (key,)).fetchone()
+            self._db.execute("DELETE FROM pages WHERE url_key = ?", (key,))
+            if row: self._remove_orphan_blob(row[0])
+        self._db.commit()
+
+    def _remove_orphan_blob(self, digest):
+        if self._db.execute("SELECT 1 FROM pages WHERE content_hash = ? LIMIT 1", (digest,)).fetchone(): return
+        for codec in ('zst', 'gz'):
+            try: os.remove(self._blob_path(digest, codec))
+            except FileNotFoundError: pass
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_cache = None
+
+
+def get_page_cache(directory=DEFAULT_CACHE_DIR, **kwargs):
+    """Returns the process-wide page cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        _cache = PageCache(directory, **kwargs)
+    return _cache
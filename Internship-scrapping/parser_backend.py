@@ -0,0 +1,87 @@
+from bs4 import BeautifulSoup, SoupStrainer
+import logging
+import os
+
+try:
+    import lxml  # noqa: F401 -- only needed as a BeautifulSoup tree builder
+except ImportError:
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+# --- Parser Backends ---
+# 'html.parser': pure-Python builder (the original behaviour, always available)
+# 'lxml':        libxml2-based builder, same extraction code, noticeably faster
+# 'selectolax':  Lexbor parses the full page and cuts out the content region;
+#                only that fragment is handed to BeautifulSoup (lxml if installed)
+PARSER_BACKENDS = ('html.parser', 'lxml', 'selectolax')
+PARSER_BACKEND_ENV = 'TENDER_PARSER_BACKEND'
+
+_backend = None
+
+
+def available_backends():
+    backends = ['html.parser']
+    if lxml: backends.append('lxml')
+    if LexborHTMLParser: backends.append('selectolax')
+    return backends
+
+
+def check_parser_backend(name):
+    """Raises ValueError unless `name` is a known backend whose library is installed."""
+    if name not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend '{name}'. Choose from: {', '.join(PARSER_BACKENDS)}")
+    if name not in available_backends():
+        raise ValueError(f"Parser backend '{name}' is not installed.")
+    return name
+
+
+def set_parser_backend(name):
+    """Selects the backend used by make_soup() for the rest of the run."""
+    global _backend
+    _backend = check_parser_backend(name)
+    logging.info(f"Using parser backend: {name}")
+
+
+def get_parser_backend():
+    """The selected backend: set_parser_backend(), else $TENDER_PARSER_BACKEND, else lxml if installed."""
+    global _backend
+    if _backend is None:
+        requested = os.environ.get(PARSER_BACKEND_ENV)
+        if requested: set_parser_backend(requested)
+        else: _backend = 'lxml' if lxml else 'html.parser'
+    return _backend
+
+
+def _strainer_for(scope):
+    """SoupStrainer for a simple 'tag', '#id' or 'tag#id' scope selector."""
+    name, _, element_id = scope.partition('#')
+    return SoupStrainer(name or None, id=element_id) if element_id else SoupStrainer(name)
+
+
+def make_soup(html_content, scope=None, backend=None):
+    """Parses `html_content` into a BeautifulSoup tree with the selected backend.
+
+    When `scope` is given, only that element (and its descendants) is parsed, which
+    skips the GOV.UK header, footer and scripts. If the scope is missing from the
+    page the whole document is parsed instead, so a layout change degrades to the
+    slower path rather than to empty fields. An explicit `backend` is checked like
+    set_parser_backend() does.
+    """
+    backend = check_parser_backend(backend) if backend else get_parser_backend()
+    builder = 'lxml' if lxml and backend != 'html.parser' else 'html.parser'
+
+    if scope and backend == 'selectolax':
+        node = LexborHTMLParser(html_content).css_first(scope)
+        if node is not None:
+            return BeautifulSoup(node.html, builder)
+    elif scope:
+        soup = BeautifulSoup(html_content, builder, parse_only=_strainer_for(scope))
+        if soup.find(True) is not None:
+            return soup
+
+    if scope: logging.debug(f"Content scope '{scope}' not found. Parsing the full document.")
+    return BeautifulSoup(html_content, builder)
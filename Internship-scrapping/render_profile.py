@@ -0,0 +1,137 @@
+from collections import defaultdict
+from urllib.parse import urlparse
+import threading
+import asyncio
+import logging
+import time
+
+# --- Render Profiles ---
+# 'lean': abort resource types we never parse, wait for the DOM plus a readiness
+#         signal (the site's ready selector, else network idle). The default.
+# 'full': load everything and wait for the `load` event, as a real visitor would;
+#         kept to compare against and for pages that break without styles.
+RENDER_PROFILES = ('lean', 'full')
+DEFAULT_RENDER_PROFILE = 'lean'
+
+BLOCKED_RESOURCE_TYPES = frozenset({'image', 'media', 'font', 'stylesheet', 'texttrack', 'manifest'})
+BLOCKED_HOSTS = (  # Analytics and tag managers; matched as the host or a subdomain
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'clarity.ms', 'hotjar.com',
+)
+
+
+def check_render_profile(profile):
+    if profile not in RENDER_PROFILES:
+        raise ValueError(f"Unknown render profile '{profile}'. Choose from: {', '.join(RENDER_PROFILES)}")
+    return profile
+
+
+def should_block(request):
+    if request.resource_type in BLOCKED_RESOURCE_TYPES: return True
+    host = (urlparse(request.url).hostname or '').lower()
+    return any(host == blocked or host.endswith('.' + blocked) for blocked in BLOCKED_HOSTS)
+
+
+def block_heavy_resources(route):
+    """Route handler for the sync API: `context.route('**/*', block_heavy_resources)`."""
+    if should_block(route.request): route.abort()
+    else: route.continue_()
+
+
+async def block_heavy_resources_async(route):
+    """Route handler for the async API."""
+    if should_block(route.request): await route.abort()
+    else: await route.continue_()
+
+
+def navigation_wait_until(profile):
+    return 'domcontentloaded' if profile == 'lean' else 'load'
+
+
+class RenderMeter:
+    """Counts what one render transferred, while attached to its page.
+
+    Every finished request is counted, and its bytes are Playwright's
+    request.sizes(): response body plus response headers as sent over the
+    network, so chunked and compressed responses are measured too. The sizes
+    are read on exit, so use `async with` on an async API page. Aborted
+    requests show up as failed requests.
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.requests = 0
+        self.failed = 0
+        self.bytes = 0
+        self.started = None
+        self.seconds = None
+        self._finished = []
+
+    def _on_request_finished(self, request):
+        self.requests += 1
+        self._finished.append(request)
+
+    def _on_request_failed(self, request):
+        self.failed += 1
+
+    def _add_sizes(self, sizes):
+        self.bytes += max(0, sizes.get('responseBodySize') or 0) + max(0, sizes.get('responseHeadersSize') or 0)
+
+    def __enter__(self):
+        self.page.on('requestfinished', self._on_request_finished)
+        self.page.on('requestfailed', self._on_request_failed)
+        self.started = time.perf_counter()
+        return self
+
+    def _detach(self):
+        self.seconds = time.perf_counter() - self.started
+        self.page.remove_listener('requestfinished', self._on_request_finished)
+        self.page.remove_listener('requestfailed', self._on_request_failed)
+        finished, self._finished = self._finished, []
+        return finished
+
+    def __exit__(self, *exc_info):
+        for request in self._detach():
+            try: self._add_sizes(request.sizes())
+            except Exception as e: logging.debug(f"No sizes for {request.url}: {e}")
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc_info):
+        finished = self._detach()
+        for request, sizes in zip(finished, await asyncio.gather(*(request.sizes() for request in finished),
+                                                                 return_exceptions=True)):
+            if isinstance(sizes, Exception): logging.debug(f"No sizes for {request.url}: {sizes}")
+            else: self._add_sizes(sizes)
+
+
+class RenderStats:
+    """Render latency and transfer size: logged per URL, totalled per profile."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals = defaultdict(lambda: {'renders': 0, 'seconds': 0.0, 'bytes': 0, 'requests': 0, 'blocked': 0})
+
+    def record(self, url, profile, meter):
+        logging.info(f"Rendered {url} [{profile}] in {meter.seconds:.2f}s: {meter.bytes / 1024:.0f} KiB "
+                     f"over {meter.requests} request(s), {meter.failed} blocked/failed")
+        with self._lock:
+            entry = self.totals[profile]
+            entry['renders'] += 1
+            entry['seconds'] += meter.seconds
+            entry['bytes'] += meter.bytes
+            entry['requests'] += meter.requests
+            entry['blocked'] += meter.failed
+
+    def summary(self):
+        with self._lock:
+            return {profile: dict(entry, seconds=round(entry['seconds'], 3)) for profile, entry in self.totals.items()}
+
+    def log_summary(self):
+        for profile, entry in sorted(self.summary().items()):
+            n = entry['renders']
+            logging.info(f"Browser renders [{profile}]: {n}, avg {entry['seconds'] / n:.2f}s and "
+                         f"{entry['bytes'] / n / 1024:.0f} KiB per page, {entry['blocked']} request(s) blocked/failed")
+
+
+render_stats = RenderStats()
@@ -0,0 +1,154 @@
+"""Offline bulk re-parse of saved notice HTML.
+
+Re-derives the output fields for every stored notice (a directory of saved pages,
+or the page cache) without touching the network: no Playwright, requests or
+aiohttp import is loaded in this mode. Pages are grouped into chunks and parsed
+across a process pool, and rows are streamed to the output as chunks complete.
+
+Usage:
+    python reparse.py SAVED_HTML_DIR [-o reparsed.csv|.jsonl|.parquet]
+    python reparse.py --cache page_cache [-o reparsed.csv] [--lots reparsed_lots.csv]
+"""
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import argparse
+import logging
+import os
+
+from Scrape_tenders import PAGE_CACHE_DIR, LOT_COLUMNS, detect_site, detect_site_from_html, normalize_tender_records
+from parser_backend import set_parser_backend, get_parser_backend
+from page_cache import PageCache, read_blob
+from output_sink import open_sink, SINK_FORMATS
+
+DEFAULT_CHUNK_SIZE = 16  # Pages per work unit; large enough that IPC is noise next to parsing
+HTML_SUFFIXES = ('.html', '.htm', '.html.gz', '.htm.gz')
+
+
+def default_workers():
+    try: return len(os.sched_getaffinity(0))
+    except AttributeError: return os.cpu_count() or 1
+
+
+# --- Work Sources ---
+# A work item is (path, codec, url); url is None when it must be detected from the page.
+
+def iter_directory_pages(directory):
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.lower().endswith(HTML_SUFFIXES):
+                path = os.path.join(root, name)
+                yield path, ('gz' if name.lower().endswith('.gz') else None), None
+
+
+def iter_cache_pages(cache_dir):
+    cache = PageCache(cache_dir)
+    try:
+        for url, path, codec in cache.iter_entries():
+            yield path, codec, url
+    finally:
+        cache.close()
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk: yield chunk
+
+
+# --- Worker ---
+
+def _init_worker(backend, log_level):
+    logging.getLogger().setLevel(log_level)
+    set_parser_backend(backend)
+
+
+def _read_page(path, codec):
+    if codec: return read_blob(path, codec)
+    with open(path, 'r', encoding='utf-8') as f: return f.read()
+
+
+def parse_work_unit(items, include_lots=False):
+    """Parses one chunk of work items. Returns (records, failures) for the chunk.
+
+    Pages are parsed raw and the chunk's dates and amounts are then normalized
+    in one batch per site, in place, so the records keep their page order.
+    With include_lots=True each record also carries its 'Lots' list.
+    """
+    records, failures, by_site = [], [], {}
+    for path, codec, url in items:
+        try:
+            html_content = _read_page(path, codec)
+            if url: site_key, site = detect_site(url)
+            else: site_key, site, url = detect_site_from_html(html_content)
+            if not site:
+                failures.append((path, "Could not detect the notice's site"))
+                continue
+            record = site['parser'](html_content, url, include_lots=include_lots, normalize=False)
+            records.append(record)
+            by_site.setdefault(site['label'], []).append(record)
+        except Exception as e:
+            failures.append((path, str(e)))
+    for label, site_records in by_site.items():
+        normalize_tender_records(site_records, label)
+    return records, failures
+
+
+# --- Driver ---
+
+def reparse(items, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, backend=None, worker_log_level=logging.WARNING,
+            include_lots=False):
+    """Yields records as chunks complete. `items` is consumed lazily, with at most
+    two chunks per worker in flight, so memory stays flat for any number of pages."""
+    workers = workers or default_workers()
+    backend = backend or get_parser_backend()
+    pending = set()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(backend, worker_log_level)) as executor:
+        for chunk in _chunks(items, chunk_size):
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from _collect(done)
+            pending.add(executor.submit(parse_work_unit, chunk, include_lots))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            yield from _collect(done)
+
+
+def _collect(done):
+    for future in done:
+        records, failures = future.result()
+        for path, error in failures:
+            logging.warning(f"Skipped {path}: {error}")
+        yield from records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-parse saved notice HTML into the tender CSV schema.")
+    parser.add_argument('directory', nargs='?', help="Directory of saved notice pages (.html, .htm, .html.gz)")
+    parser.add_argument('--cache', nargs='?', const=PAGE_CACHE_DIR, help="Re-parse the page cache instead (default: %(const)s)")
+    parser.add_argument('-o', '--output', default='reparsed_tender_data.csv')
+    parser.add_argument('--format', choices=sorted(SINK_FORMATS), default=None, help="Output format (default: from the file extension)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Worker processes (default: available cores)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--backend', default=None, help="Parser backend: html.parser, lxml or selectolax")
+    parser.add_argument('--lots', default=None, help="Also write one row per lot of multi-lot notices to this file")
+    args = parser.parse_args(argv)
+    if bool(args.directory) == bool(args.cache):
+        parser.error("Give either a directory or --cache.")
+    if args.backend: set_parser_backend(args.backend)
+
+    items = iter_cache_pages(args.cache) if args.cache else iter_directory_pages(args.directory)
+    lots_sink = open_sink(args.lots, columns=LOT_COLUMNS) if args.lots else None
+    with open_sink(args.output, format=args.format, lots=lots_sink) as sink:
+        for record in reparse(items, workers=args.workers, chunk_size=args.chunk_size, include_lots=bool(args.lots)):
+            sink.write(record)
+            if sink.count % 1000 == 0: logging.info(f"Re-parsed {sink.count} notices...")
+    logging.info(f"✅ Re-parsed {sink.count} notices into {args.output}")
+    if lots_sink: logging.info(f"✅ Wrote {lots_sink.count} lots to {args.lots}")
+
+
+if __name__ == "__main__":
+    main()
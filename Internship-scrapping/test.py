@@ -0,0 +1,841 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from contextlib import contextmanager
+from unittest import mock
+import threading
+import tempfile
+import unittest
+import asyncio
+import logging
+import json
+import time
+import os
+
+from discovery import SearchDiscovery, SEARCH_CONFIG, parse_result_page
+from Scrape_tenders import SITES
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FINDATENDER_SEARCH_FIXTURE = os.path.join(HERE, 'html_FindATender_search.html')
+CONTRACTSFINDER_SEARCH_FIXTURE = os.path.join(HERE, 'html_ContractsFinder_search.html')
+FINDATENDER_FIXTURE = os.path.join(HERE, 'html_FindATender.html')
+CONTRACTSFINDER_FIXTURE = os.path.join(HERE, 'html_ContractsFinder.html')
+OCDS_SAMPLES = [os.path.join(HERE, name) for name in
+                ('ocds_releases_sample.json', 'ocds_records_sample.json', 'ocds_releases_sample.jsonl')]
+
+FINDATENDER = 'find-tender.service.gov.uk'
+CONTRACTSFINDER = 'contractsfinder.service.gov.uk'
+
+
+def read_fixture(path):
+    with open(path, 'r', encoding='utf-8') as f: return f.read()
+
+
+def fat_notice(notice_id):
+    return SITES[FINDATENDER]['notice_url'].format(notice_id)
+
+
+def cf_notice(notice_id):
+    return SITES[CONTRACTSFINDER]['notice_url'].format(notice_id)
+
+
+# --- Local search server ---
+# Serves the saved result pages as a short paginated search: page 1 is the saved
+# page; later pages get new IDs for all but the last result, which every page
+# repeats (as results shift while a search is paged). Past `last_page` the
+# results are empty.
+
+def findatender_page(fixture, page):
+    page_html = fixture.replace('page=2', f'page={page + 1}')
+    if page > 1: page_html = page_html.replace('-2023?origin', f'-{2024 - page}?origin', 2)
+    return page_html
+
+
+def contractsfinder_page(fixture, page):
+    if page == 1: return fixture
+    return fixture.replace('05c544dc', f'{page:08x}').replace('8d2b9c1e', f'{page:08x}')
+
+
+class _SearchHandler(BaseHTTPRequestHandler):
+    fixture, render, last_page, requests, fail_pages = None, None, 3, None, ()
+
+    def do_GET(self):
+        page = int(parse_qs(urlsplit(self.path).query).get('page', ['1'])[0])
+        self.requests.append(self.path)
+        if page in self.fail_pages:
+            self.send_response(500)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = self.render(self.fixture, page) if page <= self.last_page else '<html><body><p>No results</p></body></html>'
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def search_server(fixture_path, render, last_page=3, fail_pages=()):
+    """Yields (search_url, requested_paths) for a local stand-in of a site's search;
+    pages in `fail_pages` answer HTTP 500."""
+    requests = []
+    handler = type('SearchHandler', (_SearchHandler,), {
+        'fixture': read_fixture(fixture_path), 'render': staticmethod(render),
+        'last_page': last_page, 'requests': requests, 'fail_pages': fail_pages})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try: yield f"http://127.0.0.1:{server.server_port}/Search/Results", requests
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class SearchDiscoveryTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        logging.disable(logging.WARNING)
+
+    @classmethod
+    def tearDownClass(cls):
+        logging.disable(logging.NOTSET)
+
+    def test_parse_saved_result_pages(self):
+        notice_urls, next_url = parse_result_page(read_fixture(FINDATENDER_SEARCH_FIXTURE),
+                                                  SEARCH_CONFIG[FINDATENDER]['search_url'], SITES[FINDATENDER])
+        self.assertEqual(notice_urls, [fat_notice('008624-2023'), fat_notice('008601-2023'), fat_notice('008577-2023')])
+        self.assertEqual(next_url, 'https://www.find-tender.service.gov.uk/Search/Results?page=2')
+
+        notice_urls, next_url = parse_result_page(read_fixture(CONTRACTSFINDER_SEARCH_FIXTURE),
+                                                  SEARCH_CONFIG[CONTRACTSFINDER]['search_url'], SITES[CONTRACTSFINDER])
+        self.assertEqual(len(notice_urls), 3)
+        self.assertEqual(notice_urls[0], cf_notice('05c544dc-9e6f-452d-87c1-bf00f3ce73ac'))
+        self.assertIsNone(next_url)
+
+    def test_pagination_and_dedup(self):
+        with search_server(FINDATENDER_SEARCH_FIXTURE, findatender_page) as (search_url, requests):
+            search = SearchDiscovery(FINDATENDER, search_url=search_url, page_delay=0)
+            urls = list(search)
+        self.assertEqual(urls, [
+            fat_notice('008624-2023'), fat_notice('008601-2023'), fat_notice('008577-2023'),
+            fat_notice('008624-2022'), fat_notice('008601-2022'),
+            fat_notice('008624-2021'), fat_notice('008601-2021'),
+        ])
+        self.assertEqual(search.pages_fetched, 4)  # The fourth page is empty
+        self.assertEqual(search.newest_url, fat_notice('008624-2023'))
+        self.assertTrue(search.completed)
+        self.assertEqual(requests, ['/Search/Results', '/Search/Results?page=2', '/Search/Results?page=3',
+                                    '/Search/Results?page=4'])
+
+    def test_page_number_fallback_keeps_filters(self):
+        with search_server(CONTRACTSFINDER_SEARCH_FIXTURE, contractsfinder_page, last_page=2) as (search_url, requests):
+            urls = list(SearchDiscovery(CONTRACTSFINDER, query='software', search_url=search_url, page_delay=0))
+        self.assertEqual(len(urls), 5)
+        self.assertIn(cf_notice('00000002-9e6f-452d-87c1-bf00f3ce73ac'), urls)
+        self.assertEqual(requests, ['/Search/Results?keywords=software', '/Search/Results?keywords=software&page=2',
+                                    '/Search/Results?keywords=software&page=3'])
+
+    def test_stops_at_high_water_mark(self):
+        with search_server(FINDATENDER_SEARCH_FIXTURE, findatender_page) as (search_url, requests):
+            search = SearchDiscovery(FINDATENDER, search_url=search_url, page_delay=0,
+                                     high_water_mark=fat_notice('008601-2022'))
+            urls = list(search)
+        self.assertEqual(urls, [fat_notice('008624-2023'), fat_notice('008601-2023'), fat_notice('008577-2023'),
+                                fat_notice('008624-2022')])
+        self.assertEqual(search.pages_fetched, 2)
+        self.assertTrue(search.completed)
+
+    def test_known_notices_without_mark_do_not_stop(self):
+        # An interrupted first run: page 1 was crawled, but no mark was stored
+        known = {fat_notice('008624-2023'), fat_notice('008601-2023'), fat_notice('008577-2023')}
+        with search_server(FINDATENDER_SEARCH_FIXTURE, findatender_page) as (search_url, requests):
+            search = SearchDiscovery(FINDATENDER, search_url=search_url, page_delay=0, is_known=known.__contains__)
+            urls = list(search)
+        self.assertEqual(len(urls), 7)
+        self.assertTrue(search.completed)
+
+    def test_failed_page_leaves_search_incomplete(self):
+        # Storing newest_url as the mark now would hide pages 2.. from every later run
+        with search_server(FINDATENDER_SEARCH_FIXTURE, findatender_page, fail_pages=(2,)) as (search_url, requests):
+            search = SearchDiscovery(FINDATENDER, search_url=search_url, page_delay=0)
+            urls = list(search)
+        self.assertEqual(len(urls), 3)
+        self.assertEqual(search.newest_url, fat_notice('008624-2023'))
+        self.assertFalse(search.completed)
+
+    def test_max_pages_leaves_search_incomplete(self):
+        with search_server(FINDATENDER_SEARCH_FIXTURE, findatender_page) as (search_url, requests):
+            search = SearchDiscovery(FINDATENDER, search_url=search_url, page_delay=0, max_pages=2)
+            self.assertEqual(len(list(search)), 5)
+        self.assertFalse(search.completed)
+
+    def test_stops_when_every_notice_is_known(self):
+        # The mark notice was withdrawn, but page 2 holds nothing new
+        known = {fat_notice('008624-2022'), fat_notice('008601-2022'), fat_notice('008577-2023')}
+        with search_server(FINDATENDER_SEARCH_FIXTURE, findatender_page) as (search_url, requests):
+            search = SearchDiscovery(FINDATENDER, search_url=search_url, page_delay=0,
+                                     high_water_mark=fat_notice('999999-2023'), is_known=known.__contains__)
+            urls = list(search)
+        self.assertEqual(len(urls), 3)
+        self.assertEqual(search.pages_fetched, 2)
+
+    def test_result_pages_through_engine_bucket(self):
+        from crawl_engine import CrawlEngine
+
+        async def discover(search_url):
+            async with CrawlEngine(fetch_mode='http', rate_limits={'127.0.0.1': (100, 1)}) as engine:
+                search = SearchDiscovery(FINDATENDER, search_url=search_url)
+                search.fetch_through(engine)
+                self.assertEqual(search.page_delay, 0)
+                # As crawl() does: the iterator runs in a worker thread, the fetches on the loop
+                return await asyncio.to_thread(list, search), engine._bucket_for(search_url)
+
+        with search_server(FINDATENDER_SEARCH_FIXTURE, findatender_page) as (search_url, requests):
+            urls, bucket = asyncio.run(discover(search_url))
+        self.assertEqual(len(urls), 7)
+        self.assertEqual(len(requests), 4)
+        self.assertLess(bucket._tokens, 1)  # Every page drew a token from the site's bucket
+
+
+class OcdsIngestTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory(prefix='tender-test-')
+        self.addCleanup(directory.cleanup)
+        self.output = os.path.join(directory.name, 'tenders.jsonl')
+        self.state_db = os.path.join(directory.name, 'state.sqlite')
+
+    def ingest(self):
+        from ocds_ingest import iter_file_releases, ingest_releases
+        from output_sink import open_sink
+        from crawl_state import CrawlState
+        from Scrape_tenders import EXTRACTION_VERSION
+
+        with open_sink(self.output, append=True) as sink, \
+             CrawlState(self.state_db, extraction_version=EXTRACTION_VERSION) as state:
+            counts = {'written': 0, 'unchanged': 0, 'unmapped': 0}
+            for path in OCDS_SAMPLES:
+                for outcome, count in ingest_releases(iter_file_releases(path), sink, state).items():
+                    counts[outcome] += count
+        with open(self.output, encoding='utf-8') as f:
+            return counts, {row['Source URL']: row for row in map(json.loads, f)}
+
+    def test_sample_rows(self):
+        counts, rows = self.ingest()
+        self.assertEqual(counts, {'written': 5, 'unchanged': 0, 'unmapped': 1})
+
+        award = rows[fat_notice('008624-2023')]
+        self.assertEqual(award['Tender Title'], 'Provision of Cyber Security Services')
+        self.assertEqual(award['Tender ID/Reference Number'], '2023/S 000-008624')
+        self.assertEqual(award['Issuing Authority'], 'Ministry of Defence')
+        self.assertEqual(award['Publication Date'], '2023-03-24')
+        self.assertEqual(award['Award Date'], '2023-03-01')
+        self.assertEqual(award['Winning Company/Companies'], 'Acme Ltd, Beta Systems plc')
+        self.assertEqual(award['Final Contract Price (Original)'], 1187500.5)
+        self.assertEqual(award['Estimated Contract Value (Original)'], 1250000.0)
+        self.assertGreater(award['Estimated Contract Value (INR)'], 1250000.0)
+        self.assertEqual(award['Contract Duration'], '2023-04-01 to 2025-03-31')
+        self.assertEqual(award['List of Participating Companies (bidders)'], '7')
+
+        # Not GBP: the original value is kept, but there is no GBP rate to convert it to INR with
+        euro = rows[cf_notice('05c544dc-9e6f-452d-87c1-bf00f3ce73ac')]
+        self.assertEqual(euro['Currency (Original)'], 'EUR')
+        self.assertEqual(euro['Estimated Contract Value (Original)'], 50000.0)
+        self.assertIsNone(euro['Estimated Contract Value (INR)'])
+
+        compiled = rows[fat_notice('008650-2023')]  # From the record package's compiledRelease
+        self.assertEqual(compiled['Tender Title'], 'Grounds Maintenance Framework')
+        self.assertEqual(compiled['Contract Duration'], '2023-06-01 to 2027-05-31')
+        self.assertIn(cf_notice('8d2b9c1e-1f3a-4c55-9a0e-2b7f61d4e9a2'), rows)  # JSONL: bare release line
+        self.assertIn(fat_notice('008671-2023'), rows)                          # JSONL: package line
+
+    def test_feed_notices_are_not_crawled(self):
+        from crawl_state import CrawlState, STATUS_FEED
+
+        _, rows = self.ingest()
+        other = 'https://www.find-tender.service.gov.uk/Notice/000001-2023'
+        with CrawlState(self.state_db) as state:
+            self.assertEqual({state.get(url)['status'] for url in rows}, {STATUS_FEED})
+            self.assertEqual(list(state.filter_pending([*rows, other])), [other])
+        counts, _ = self.ingest()  # Same releases again: nothing is rewritten
+        self.assertEqual(counts, {'written': 0, 'unchanged': 5, 'unmapped': 1})
+
+
+# --- Parser backend parity ---
+# The records the original html.parser scraper produced from the saved notices.
+BASELINE_RECORDS = {
+    'https://www.find-tender.service.gov.uk/Notice/008624-2023': {
+        'Source URL': 'https://www.find-tender.service.gov.uk/Notice/008624-2023',
+        'Currency (Original)': 'GBP',
+        'Tender Title': 'National Framework Agreement for Adalimumab Injection 1 April 2023',
+        'Tender ID/Reference Number': '2023/S 000-008624',
+        'Publication Date': '2023-03-24',
+        'Issuing Authority': 'NHS England',
+        'Award Date': '2023-03-14',
+        'Winning Company/Companies': 'Amgen Ltd, Sandoz Ltd, Biogen, Abbvie Ltd, Fresenius Kabi Limited, '
+                                     'Celltrion Healthcare United Kingdom Limited',
+        'Final Contract Price (Original)': 1.0,
+        'Estimated Contract Value (Original)': 137087000.0,
+        'Estimated Contract Value (INR)': 16032324650.0,
+        'Contract Duration': '2023-04-01 to 2024-08-31',
+        'List of Participating Companies (bidders)': '7',
+        'Number of units/doses required': None,
+    },
+    'https://www.contractsfinder.service.gov.uk/notice/05c544dc-9e6f-452d-87c1-bf00f3ce73ac': {
+        'Source URL': 'https://www.contractsfinder.service.gov.uk/notice/05c544dc-9e6f-452d-87c1-bf00f3ce73ac',
+        'Currency (Original)': 'GBP',
+        'Tender Title': 'NHS National Framework Agreement for the Supply of Adalimumab',
+        'Tender ID/Reference Number': '05c544dc-9e6f-452d-87c1-bf00f3ce73ac',
+        'Publication Date': '2019-05-07',
+        'Issuing Authority': 'Katie Noonan',
+        'Award Date': '2018-12-01',
+        'Winning Company/Companies': 'Abbvie Ltd, Amgen Ltd, Biogen Idec UK Limited, Mylan, Sandoz Ltd',
+        'Final Contract Price (Original)': 159371013.0,
+        'Estimated Contract Value (Original)': None,
+        'Estimated Contract Value (INR)': None,
+        'Contract Duration': '2018-12-01 to 2019-11-30',
+        'List of Participating Companies (bidders)': None,
+        'Number of units/doses required': None,
+    },
+}
+
+
+class WorkQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory(prefix='tender-test-')
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.urls = [fat_notice(f"00000{i}-2023") for i in range(1, 4)]
+
+    def open_queue(self, **kwargs):
+        from work_queue import WorkQueue
+        queue = WorkQueue(os.path.join(self.directory, 'queue.sqlite'), **kwargs)
+        self.addCleanup(queue.close)
+        return queue
+
+    def test_lease_hands_each_job_to_one_worker(self):
+        queue = self.open_queue()
+        self.assertEqual(queue.enqueue(self.urls), 3)
+        self.assertEqual(queue.enqueue(self.urls[:1]), 0)  # Already queued
+        self.assertEqual(queue.lease('a', 2), self.urls[:2])
+        self.assertEqual(queue.lease('b', 2), self.urls[2:])
+        self.assertEqual(queue.lease('c', 2), [])
+        self.assertEqual(queue.heartbeat('a'), 2)
+
+    def test_expired_lease_is_reclaimed_and_old_holder_cannot_complete(self):
+        queue = self.open_queue(visibility_timeout=0.05)
+        queue.enqueue(self.urls[:1])
+        self.assertEqual(queue.lease('crashed', 1), self.urls[:1])
+        time.sleep(0.1)
+        logging.disable(logging.WARNING)
+        try: self.assertEqual(queue.lease('b', 1), self.urls[:1])
+        finally: logging.disable(logging.NOTSET)
+        self.assertFalse(queue.complete(self.urls[0], 'crashed', {'Source URL': self.urls[0]}))
+        self.assertTrue(queue.complete(self.urls[0], 'b', {'Source URL': self.urls[0]}, 'hash'))
+        self.assertEqual([(url, record, digest) for _, url, record, digest, _ in queue.take_results()],
+                         [(self.urls[0], {'Source URL': self.urls[0]}, 'hash')])
+        self.assertTrue(queue.is_drained())
+
+    def test_fails_after_max_attempts(self):
+        queue = self.open_queue(max_attempts=2)
+        queue.enqueue(self.urls[:1])
+        for attempt in range(2):
+            self.assertEqual(queue.lease('a', 1), self.urls[:1])
+            queue.fail(self.urls[0], 'a', 'HTTP 503')
+        self.assertEqual(queue.lease('a', 1), [])
+        self.assertEqual(queue.counts(), {'failed': 1})
+        self.assertEqual([(url, record, error) for _, url, record, _, error in queue.take_results()],
+                         [(self.urls[0], None, 'HTTP 503')])
+
+    def test_non_retryable_failure_is_final(self):
+        queue = self.open_queue(max_attempts=3)
+        queue.enqueue(self.urls[:1])
+        queue.lease('a', 1)
+        queue.fail(self.urls[0], 'a', 'HTTP 404', retryable=False)
+        self.assertEqual(queue.counts(), {'failed': 1})
+        self.assertTrue(queue.is_drained())
+
+    def test_export_results(self):
+        from work_queue import export_results
+        from output_sink import open_sink
+        from crawl_state import CrawlState, STATUS_DONE, STATUS_FAILED
+
+        queue = self.open_queue()
+        queue.enqueue(self.urls)
+        queue.lease('a', 3)
+        for url in self.urls[:2]: queue.complete(url, 'a', {'Source URL': url, 'Tender Title': 'T'}, f"hash-{url}")
+        queue.fail(self.urls[2], 'a', 'HTTP 404', retryable=False)
+        output = os.path.join(self.directory, 'tenders.jsonl')
+        logging.disable(logging.ERROR)
+        try:
+            with open_sink(output) as sink, CrawlState(os.path.join(self.directory, 'state.sqlite')) as state:
+                self.assertEqual(export_results(queue, sink, state), 2)
+                self.assertEqual([state.get(url)['status'] for url in self.urls], [STATUS_DONE, STATUS_DONE, STATUS_FAILED])
+                self.assertEqual(queue.take_results(), [])  # Exported rows leave the queue
+                # The same records again (e.g. re-exported after a crash) are not written twice
+                queue.enqueue(self.urls[:2])
+                queue.lease('b', 2)
+                for url in self.urls[:2]: queue.complete(url, 'b', {'Source URL': url, 'Tender Title': 'T'}, f"hash-{url}")
+                self.assertEqual(export_results(queue, sink, state), 0)
+        finally: logging.disable(logging.NOTSET)
+        with open(output, encoding='utf-8') as f:
+            self.assertEqual([json.loads(line)['Source URL'] for line in f], self.urls[:2])
+
+
+class PageCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory(prefix='tender-test-')
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def open_cache(self, **kwargs):
+        from page_cache import PageCache
+        cache = PageCache(self.directory, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def blobs(self):
+        return sorted(name for _, _, names in os.walk(self.directory) for name in names if name.endswith(('.zst', '.gz')))
+
+    def test_normalize_url_equivalences(self):
+        from page_cache import normalize_url
+        canonical = 'https://example.com/Notice/1?a=1&b=2'
+        for url in ('HTTPS://Example.COM/Notice/1?b=2&a=1', 'https://example.com:443/Notice/1?a=1&b=2#lots',
+                    '  https://example.com/Notice/1?a=1&b=2  '):
+            with self.subTest(url=url):
+                self.assertEqual(normalize_url(url), canonical)
+        self.assertEqual(normalize_url('http://example.com'), 'http://example.com/')
+        self.assertEqual(normalize_url('http://example.com:8080/x'), 'http://example.com:8080/x')
+        self.assertNotEqual(normalize_url('https://example.com/notice/1'), normalize_url('https://example.com/Notice/1'))
+
+    def test_equivalent_urls_share_an_entry(self):
+        cache = self.open_cache()
+        cache.put('https://example.com/Notice/1?b=2&a=1', '<html>one</html>')
+        self.assertEqual(cache.get('HTTPS://EXAMPLE.com/Notice/1?a=1&b=2#top').html, '<html>one</html>')
+        self.assertIsNone(cache.get('https://example.com/Notice/2'))
+
+    def test_entries_go_stale_after_ttl_and_touch_refreshes(self):
+        cache = self.open_cache(ttl=3600)
+        url = fat_notice('008624-2023')
+        cache.put(url, '<html>notice</html>', etag='"v1"', last_modified='Fri, 24 Mar 2023 10:00:00 GMT')
+        self.assertTrue(cache.get(url).fresh)
+        cache._db.execute("UPDATE pages SET fetched_at = fetched_at - 7200")  # Fetched two hours ago
+        cache._db.commit()
+        stale = cache.get(url)
+        self.assertFalse(stale.fresh)
+        self.assertEqual(stale.html, '<html>notice</html>')
+
+        cache.touch(url, etag='"v2"')  # A 304 carrying only a new ETag
+        entry = cache.get(url)
+        self.assertTrue(entry.fresh)
+        self.assertEqual((entry.etag, entry.last_modified), ('"v2"', 'Fri, 24 Mar 2023 10:00:00 GMT'))
+
+    def test_identical_bodies_share_one_blob_until_orphaned(self):
+        cache = self.open_cache()
+        first, second = fat_notice('000001-2023'), fat_notice('000002-2023')
+        cache.put(first, '<html>same</html>')
+        cache.put(second, '<html>same</html>')
+        self.assertEqual((len(cache), len(self.blobs())), (2, 1))
+        shared = self.blobs()
+
+        cache.put(first, '<html>amended</html>')  # `second` still needs the shared blob
+        self.assertEqual(len(self.blobs()), 2)
+        self.assertEqual(cache.get(second).html, '<html>same</html>')
+        cache.put(second, '<html>amended too</html>')  # Now nothing references it
+        self.assertEqual(len(self.blobs()), 2)
+        self.assertNotIn(shared[0], self.blobs())
+
+    def test_evicts_least_recently_used_to_max_bytes(self):
+        cache = self.open_cache()
+        urls = [fat_notice(f"00000{i}-2023") for i in range(3)]
+        bodies = [f"<html>{os.urandom(2048).hex()}</html>" for _ in urls]
+        cache.put(urls[0], bodies[0])
+        cache.put(urls[1], bodies[1])
+        time.sleep(0.01)
+        cache.get(urls[0])  # urls[1] is now the least recently used
+        cache.max_bytes = cache.total_bytes() + 100  # Room for two bodies, not three
+        cache.put(urls[2], bodies[2])
+
+        self.assertIsNone(cache.get(urls[1]))
+        self.assertEqual([cache.get(url).html for url in (urls[0], urls[2])], [bodies[0], bodies[2]])
+        self.assertLessEqual(cache.total_bytes(), cache.max_bytes)
+        self.assertEqual(len(self.blobs()), 2)  # The evicted body's blob is gone too
+
+
+class OutputSinkTest(unittest.TestCase):
+
+    def test_parquet_output_is_readable_mid_run_and_resumable(self):
+        from output_sink import open_sink, pq
+        if pq is None: self.skipTest("pyarrow is not installed")
+        record = {'Source URL': 'https://example.org/notice/1', 'Final Contract Price (Original)': 1.5}
+        with tempfile.TemporaryDirectory(prefix='tender-test-') as directory:
+            path = os.path.join(directory, 'tenders.parquet')
+            with open_sink(path, append=True, batch_size=2) as sink:
+                for _ in range(3): sink.write(record)
+                self.assertEqual(pq.read_table(path).num_rows, 2)  # The flushed batch, before close
+            with open_sink(path, append=True) as sink:  # A second run appends
+                sink.write(record)
+            table = pq.read_table(path)
+            self.assertEqual(table.num_rows, 4)
+            self.assertEqual(table.column('Final Contract Price (Original)').to_pylist(), [1.5] * 4)
+            with open_sink(path) as sink:  # Not appending: the parts are replaced
+                sink.write(record)
+            self.assertEqual(pq.read_table(path).num_rows, 1)
+
+
+class LotsOutputTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def test_saved_notice_lots(self):
+        from Scrape_tenders import parse_uk_tender
+        record = parse_uk_tender(read_fixture(FINDATENDER_FIXTURE), fat_notice('008624-2023'), include_lots=True)
+        lots = record['Lots']
+        self.assertEqual([lot['Lot'] for lot in lots], ['1', '2', '3', '4'])
+        self.assertEqual(lots[1]['Lot Title'], 'CM/PHR/22/5660/02 - NHS Framework Agreement for the supply of Adalimumab')
+        self.assertEqual({key: lots[1][key] for key in ('Award Date', 'Estimated Contract Value (Original)',
+                                                        'List of Participating Companies (bidders)')},
+                         {'Award Date': '2023-03-14', 'Estimated Contract Value (Original)': 137087000.0,
+                          'List of Participating Companies (bidders)': '7'})
+        self.assertEqual(lots[1]['Winning Company/Companies'].split(', '),
+                         ['Amgen Ltd', 'Sandoz Ltd', 'Biogen', 'Abbvie Ltd', 'Fresenius Kabi Limited',
+                          'Celltrion Healthcare United Kingdom Limited'])
+        self.assertIsNone(lots[0]['Award Date'])  # Lot 1 has no award section
+
+    def test_reparse_writes_lots_file(self):
+        from Scrape_tenders import LOT_COLUMNS
+        from output_sink import open_sink
+        from reparse import parse_work_unit
+
+        records, failures = parse_work_unit([(FINDATENDER_FIXTURE, None, None)], include_lots=True)
+        self.assertEqual(failures, [])
+        with tempfile.TemporaryDirectory(prefix='tender-test-') as directory:
+            output, lots_output = os.path.join(directory, 'tenders.jsonl'), os.path.join(directory, 'lots.jsonl')
+            with open_sink(output, lots=open_sink(lots_output, columns=LOT_COLUMNS)) as sink:
+                sink.write_many(records)
+            with open(output, encoding='utf-8') as f: rows = [json.loads(line) for line in f]
+            with open(lots_output, encoding='utf-8') as f: lot_rows = [json.loads(line) for line in f]
+        self.assertEqual(len(rows), 1)
+        self.assertNotIn('Lots', rows[0])  # The main output keeps its fixed columns
+        self.assertEqual([row['Lot'] for row in lot_rows], ['1', '2', '3', '4'])
+        self.assertEqual({row['Tender ID/Reference Number'] for row in lot_rows}, {'2023/S 000-008624'})
+        self.assertEqual({row['Source URL'] for row in lot_rows}, {fat_notice('008624-2023')})
+        self.assertEqual(lot_rows[1]['Award Date'], '2023-03-14')
+
+
+class NormalizeTest(unittest.TestCase):
+
+    def test_rate_in_effect_on_date(self):
+        from normalize import ExchangeRateTable
+        table = ExchangeRateTable([('2024-01-01', 110.0), ('2023-01-01', 100.0)])
+        for date, rate in [('2022-06-30', 100.0),      # Before the first rate: the earliest
+                           ('2023-06-15', 100.0),      # Between two rates: the earlier one
+                           ('2024-01-01', 110.0),      # On a rate's date: that rate
+                           ('2025-03-01', 110.0),
+                           ('14 March 2023', 110.0),   # Not ISO: the latest
+                           (None, 110.0)]:
+            with self.subTest(date=date):
+                self.assertEqual(table.rate_on(date), rate)
+        self.assertEqual(table.convert(12.345, '2023-06-15'), 1234.5)
+        self.assertIsNone(table.convert(None, '2023-06-15'))
+
+    def test_load_exchange_rates(self):
+        from normalize import load_exchange_rates
+        with tempfile.TemporaryDirectory(prefix='tender-test-') as directory:
+            path = os.path.join(directory, 'rates.csv')
+            with open(path, 'w', encoding='utf-8') as f: f.write("date,rate\n2023-01-01,100\n2024-01-01,110\n")
+            logging.disable(logging.INFO)
+            try: table = load_exchange_rates(path, 1.0)
+            finally: logging.disable(logging.NOTSET)
+            self.assertEqual((table.dates, table.rates), (['2023-01-01', '2024-01-01'], [100.0, 110.0]))
+            self.assertEqual(load_exchange_rates(os.path.join(directory, 'missing.csv'), 116.95).rate_on('2023-06-15'), 116.95)
+
+    def test_records_convert_at_publication_date_rate(self):
+        from normalize import ExchangeRateTable, DateNormalizer, AmountParser, normalize_records
+        records = [{'Publication Date': '14 March 2023', 'Estimated Contract Value (INR)': '£1,000 excluding VAT'},
+                   {'Publication Date': None, 'Award Date': '2024-02-01', 'Estimated Contract Value (INR)': '£1,000'}]
+        normalize_records(records, ExchangeRateTable([('2023-01-01', 100.0), ('2024-01-01', 110.0)]),
+                          dates=DateNormalizer(), amounts=AmountParser())
+        self.assertEqual([r['Estimated Contract Value (INR)'] for r in records], [100000.0, 110000.0])
+        self.assertEqual(records[0]['Publication Date'], '2023-03-14')
+
+    def test_date_formats_are_inferred_per_source(self):
+        from normalize import DateNormalizer
+        dates = DateNormalizer()
+        self.assertEqual(dates.parse('2023-03-14', source='feed'), '2023-03-14')
+        self.assertEqual(dates._orders['feed'][0][0], '%Y-%m-%d')  # The fallback that matched moves first
+        self.assertNotIn('page', dates._orders)                    # Other sources keep the default order
+        self.assertEqual(dates.parse('14 March 2023, 5pm', source='feed'), '2023-03-14')
+        self.assertEqual(dates._orders['feed'][0][0], '%d %B %Y')
+        self.assertEqual(dates.parse('14/03/2023 (by 5:00pm)', source='page'), '2023-03-14')
+        logging.disable(logging.WARNING)
+        try: self.assertEqual(dates.parse('sometime soon', source='page'), 'sometime soon')  # Unparseable: unchanged
+        finally: logging.disable(logging.NOTSET)
+
+    def test_each_distinct_value_is_parsed_once(self):
+        from normalize import DateNormalizer, AmountParser
+        dates, amounts, calls = DateNormalizer(), AmountParser(), []
+        for parser in (dates, amounts):
+            parse = parser._parse
+            parser._parse = lambda *args, parse=parse: calls.append(args[0]) or parse(*args)
+
+        self.assertEqual(dates.parse_column(['14 March 2023', None, '14 March 2023', '2024-02-01']),
+                         ['2023-03-14', None, '2023-03-14', '2024-02-01'])
+        self.assertEqual(dates.parse('2024-02-01', source='other'), '2024-02-01')  # Memo hit
+        self.assertEqual(amounts.parse_column(['£1,500', '£1,500', 'n/a']), [1500.0, 1500.0, None])
+        self.assertEqual(amounts.parse('n/a'), None)  # A remembered None is still a hit
+        self.assertEqual(calls, ['14 March 2023', '2024-02-01', '£1,500', 'n/a'])
+
+
+class ExtractionSpecTest(unittest.TestCase):
+
+    PAGE = """<main>
+      <div><h3>Award information</h3>
+        <h4>Contract start date</h4><p>1 April 2023</p>
+        <h4>Contract end date</h4><p>31 March 2025</p></div>
+      <h4>Closing date</h4><p>14 March 2023</p>
+    </main>"""
+
+    def extract(self, fields):
+        from extraction_spec import ExtractionSpec
+        from parser_backend import make_soup
+        return ExtractionSpec('test', fields, sections={'award': 'Award information'}).extract(make_soup(self.PAGE), '')
+
+    def test_fallback_skips_period_with_no_dates(self):
+        from extraction_spec import Field
+        data = self.extract({'Contract Duration': (
+            Field(('Framework start', 'Framework end'), 'next_p'),  # Missing: (None, None)
+            Field(('Contract start date', 'Contract end date'), 'next_p', section='award'))})
+        self.assertEqual(data['Contract Duration'], ('1 April 2023', '31 March 2025'))
+
+    def test_fallback_keeps_first_value_found(self):
+        from extraction_spec import Field
+        data = self.extract({
+            'Contract Duration': (Field(('Contract start date', 'Framework end'), 'next_p'),
+                                  Field(('Closing date', 'Closing date'), 'next_p')),
+            'Award Date': (Field('Awarded date', 'next_p'), Field('Closing date', 'next_p')),
+            'Final Contract Price (Original)': (Field('Total value', 'next_p'), Field('Value', 'next_p'))})
+        self.assertEqual(data['Contract Duration'], ('1 April 2023', None))  # A partial period still counts
+        self.assertEqual(data['Award Date'], '14 March 2023')
+        self.assertIsNone(data['Final Contract Price (Original)'])
+
+
+class ParserBackendParityTest(unittest.TestCase):
+
+    def test_saved_notices_match_baseline(self):
+        from Scrape_tenders import parse_uk_tender, parse_contracts_finder_tender
+        from parser_backend import available_backends
+
+        notices = [(parse_uk_tender, FINDATENDER_FIXTURE, 'https://www.find-tender.service.gov.uk/Notice/008624-2023'),
+                   (parse_contracts_finder_tender, CONTRACTSFINDER_FIXTURE,
+                    'https://www.contractsfinder.service.gov.uk/notice/05c544dc-9e6f-452d-87c1-bf00f3ce73ac')]
+        for backend in available_backends():
+            for parser, fixture, url in notices:
+                with self.subTest(backend=backend, notice=url):
+                    self.assertEqual(parser(read_fixture(fixture), url, backend=backend), BASELINE_RECORDS[url])
+
+    def test_explicit_backend_is_checked(self):
+        import parser_backend
+        from parser_backend import make_soup
+        html_content = read_fixture(FINDATENDER_FIXTURE)
+        with self.assertRaisesRegex(ValueError, 'Unknown parser backend'):
+            make_soup(html_content, scope='main', backend='html5lib')
+        with mock.patch.object(parser_backend, 'LexborHTMLParser', None):  # As if selectolax were not installed
+            with self.assertRaisesRegex(ValueError, 'not installed'):
+                make_soup(html_content, scope='main', backend='selectolax')
+
+
+# --- Local notice server ---
+
+class _SequenceHandler(BaseHTTPRequestHandler):
+    """Answers each request with the next of `pages` (the last one once exhausted):
+    an HTML string, or a (status, body) pair. Request paths go to `requests`."""
+    pages, requests = None, None
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        page = self.pages.pop(0) if len(self.pages) > 1 else self.pages[0]
+        status, body = page if isinstance(page, tuple) else (200, page)
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def sequence_server(pages):
+    """Yields (base_url, requested_paths) for a server answering with `pages` in turn."""
+    requests = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), type('Handler', (_SequenceHandler,),
+                                                        {'pages': list(pages), 'requests': requests}))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try: yield f"http://127.0.0.1:{server.server_port}", requests
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _standin_parser(html_content, url):
+    from Scrape_tenders import parse_uk_tender, parse_contracts_finder_tender
+    parser = parse_uk_tender if '/Notice/' in url else parse_contracts_finder_tender
+    return parser(html_content, url)
+
+
+class StandinSiteTestCase(unittest.TestCase):
+    """Registers 127.0.0.1 as a site for the test (parsed by the real parser its URL
+    path names) and restores the SITES registry afterwards."""
+
+    def setUp(self):
+        previous = SITES.get('127.0.0.1')
+        SITES['127.0.0.1'] = dict(SITES[FINDATENDER], name='Local stand-in', parser=_standin_parser, label='stand-in')
+        self.addCleanup(lambda: SITES.__setitem__('127.0.0.1', previous) if previous else SITES.pop('127.0.0.1'))
+        logging.disable(logging.ERROR)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+
+class _BrokenCache:
+    def get(self, url): raise OSError("index.sqlite is corrupt")
+    def put(self, *args): pass
+    def touch(self, *args): pass
+
+
+class CrawlEngineTest(StandinSiteTestCase):
+
+    def crawl(self, pages, urls=('/Notice/008624-2023',), **engine_kwargs):
+        """Runs the engine over `urls` on a sequence_server; returns (results, requests, seconds)."""
+        from crawl_engine import CrawlEngine
+        engine_kwargs.setdefault('rate_limits', {'127.0.0.1': (100, 10)})
+
+        async def run(base_url):
+            async with CrawlEngine(fetch_mode='http', backoff_base=0.01, **engine_kwargs) as engine:
+                return [result async for result in engine.crawl_results([base_url + url for url in urls])]
+
+        with sequence_server(pages) as (base_url, requests):
+            started = time.monotonic()
+            results = asyncio.run(run(base_url))
+            return results, requests, time.monotonic() - started
+
+    def test_token_bucket_paces_after_burst(self):
+        from crawl_engine import TokenBucket
+
+        async def acquire_times(bucket, n):
+            started, times = time.monotonic(), []
+            for _ in range(n):
+                await bucket.acquire()
+                times.append(time.monotonic() - started)
+            return times
+
+        times = asyncio.run(acquire_times(TokenBucket(rate=20, burst=2), 6))
+        self.assertLess(times[1], 0.04)          # The burst goes out at once
+        self.assertGreaterEqual(times[5], 0.19)  # Then one token per 1/20 s
+
+    def test_engine_requests_follow_site_rate(self):
+        page = read_fixture(FINDATENDER_FIXTURE)
+        urls = [f"/Notice/00000{i}-2023" for i in range(4)]
+        results, requests, seconds = self.crawl([page], urls, rate_limits={'127.0.0.1': (10, 1)})
+        self.assertEqual([result.status for result in results], ['ok'] * 4)
+        self.assertGreaterEqual(seconds, 0.29)  # 3 waits of 1/10 s after the first request
+
+    def test_retries_server_errors_with_backoff(self):
+        results, requests, _ = self.crawl([(503, ''), (503, ''), read_fixture(FINDATENDER_FIXTURE)])
+        self.assertEqual(len(requests), 3)
+        self.assertEqual(results[0].status, 'ok')
+        self.assertEqual(results[0].record['Tender ID/Reference Number'], '2023/S 000-008624')
+
+    def test_gives_up_after_max_retries(self):
+        results, requests, _ = self.crawl([(503, '')], max_retries=1)
+        self.assertEqual(len(requests), 2)
+        self.assertEqual((results[0].status, results[0].retryable), ('failed', True))
+
+    def test_client_errors_are_not_retried(self):
+        results, requests, _ = self.crawl([(404, 'Not found')])
+        self.assertEqual(len(requests), 1)
+        self.assertEqual((results[0].status, results[0].error, results[0].retryable), ('failed', 'HTTP 404', False))
+
+    def test_cache_error_does_not_fail_the_crawl(self):
+        results, requests, _ = self.crawl([read_fixture(FINDATENDER_FIXTURE)], cache=_BrokenCache())
+        self.assertEqual(len(requests), 1)  # Treated as a miss and fetched
+        self.assertEqual(results[0].status, 'ok')
+
+
+class FetchFallbackTest(unittest.TestCase):
+
+    def fetch(self, pages, ready=True):
+        """fetch_with_fallback against a sequence_server; returns (html, path, requests, renders)."""
+        from fetch_strategy import fetch_with_fallback, FetchPathStats
+        renders = []
+
+        def render():
+            renders.append(True)
+            return '<html>rendered</html>'
+
+        with sequence_server(pages) as (base_url, requests):
+            logging.disable(logging.ERROR)
+            try: html_content, path = fetch_with_fallback(base_url + '/Notice/008624-2023', is_ready=lambda html: ready,
+                                                         render=render, stats=FetchPathStats())
+            finally: logging.disable(logging.NOTSET)
+        return html_content, path, requests, renders
+
+    def test_ready_page_is_served_over_http(self):
+        html_content, path, _, renders = self.fetch(['<html>notice</html>'])
+        self.assertEqual((html_content, path, renders), ('<html>notice</html>', 'http', []))
+
+    def test_unready_page_escalates_to_browser(self):
+        html_content, path, _, renders = self.fetch(['<html>shell</html>'], ready=False)
+        self.assertEqual((html_content, path, len(renders)), ('<html>rendered</html>', 'browser', 1))
+
+    def test_error_status_does_not_launch_browser(self):
+        for status in (404, 410, 503):
+            with self.subTest(status=status):
+                html_content, path, requests, renders = self.fetch([(status, 'Error')], ready=False)
+                self.assertEqual((html_content, path, len(requests), renders), (None, 'failed', 1, []))
+
+
+class ChangeDetectionTest(StandinSiteTestCase):
+
+    def test_generated_ids_are_not_a_change(self):
+        from crawl_engine import CrawlEngine
+        from crawl_state import CrawlState, STATUS_DONE, STATUS_UPDATED
+
+        page = read_fixture(FINDATENDER_FIXTURE)
+        rerendered = page.replace('RrMYpZVX5hZ8', 'k3Vd9QmW2xYe').replace('Ztu3AGz25aq', 'Hq7Lp2Rt5Ns')
+        amended = page.replace('NHS England', 'NHS Supply Chain')
+        self.assertNotEqual(page, rerendered)
+
+        async def crawl(url, state, times):
+            outcomes = []
+            async with CrawlEngine(fetch_mode='http', state=state, rate_limits={'127.0.0.1': (100, 10)}) as engine:
+                for _ in range(times):
+                    result = await engine.process(url)
+                    if result.status == 'ok':
+                        outcomes.append(state.mark_extracted(url, result.content_hash))
+                    else:
+                        outcomes.append(result.status)
+            return outcomes
+
+        with tempfile.TemporaryDirectory(prefix='tender-test-') as directory, \
+                CrawlState(os.path.join(directory, 'state.sqlite')) as state, \
+                sequence_server([page, rerendered, amended]) as (base_url, requests):
+            outcomes = asyncio.run(crawl(base_url + '/Notice/008624-2023', state, 3))
+        self.assertEqual(outcomes, [STATUS_DONE, 'unchanged', STATUS_UPDATED])
+        self.assertEqual(len(requests), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,437 @@
+"""Work-queue mode: spread fetching and rendering over several worker processes.
+
+A coordinator enqueues notice URLs into a durable SQLite queue; workers (local
+processes, or with --shared, processes on other machines using the same queue
+file) lease jobs, run them through the crawl engine and store the records back
+in the queue, from where the coordinator appends them to the output and the
+crawl state.
+
+Usage:
+    python work_queue.py enqueue URL [URL ...] [--file urls.txt]
+    python work_queue.py work --workers 4 [-o tender_data.csv]   # local workers + export
+    python work_queue.py --shared worker [--rate-share 8]         # one more worker on another host
+    python work_queue.py export [-o tender_data.csv]
+    python work_queue.py status
+"""
+from contextlib import contextmanager
+from itertools import islice
+import multiprocessing
+import threading
+import argparse
+import asyncio
+import sqlite3
+import logging
+import socket
+import json
+import time
+import os
+
+from page_cache import normalize_url
+
+# --- Work Queue Configuration ---
+DEFAULT_QUEUE_DB = 'work_queue.sqlite'
+LOCAL_JOURNAL_MODE = 'WAL'      # Fastest, but WAL's shared memory needs every process on one host
+SHARED_JOURNAL_MODE = 'DELETE'  # Rollback journal: works for a queue file on a network filesystem
+DEFAULT_VISIBILITY_TIMEOUT = 120  # Seconds a lease lasts without a heartbeat before the job is reclaimed
+DEFAULT_MAX_ATTEMPTS = 3          # Leases per job (crashed workers included) before it is failed
+DEFAULT_POLL_INTERVAL = 2.0       # Seconds between polls of an idle worker or the coordinator
+ENQUEUE_BATCH_SIZE = 100          # URLs inserted per transaction
+EXPORT_BATCH_SIZE = 500           # Results moved to the sink per transaction
+MAX_WORKER_RESTARTS = 3           # Per worker slot, before the coordinator gives up on it
+
+JOB_QUEUED = 'queued'
+JOB_LEASED = 'leased'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    url_key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    enqueued_at REAL NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, enqueued_at);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    record TEXT,
+    content_hash TEXT,
+    error TEXT,
+    worker TEXT,
+    finished_at REAL NOT NULL
+);
+"""
+
+
+def worker_name():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """Durable job queue in SQLite, shared by every worker process.
+
+    A worker leases jobs for `visibility_timeout` seconds and renews its leases
+    with heartbeat() while it works on them. A lease that runs out (the worker
+    crashed or hung) puts the job back up for lease, which counts as an attempt;
+    after `max_attempts` the job is failed. Completing a job stores its record in
+    the same transaction, and only the current lease holder can complete it, so
+    every job yields one result row no matter how many workers touched it.
+
+    By default the database uses WAL, which only works when every process runs
+    on the same host. With `shared=True` it uses the rollback journal instead, so
+    workers on other machines can open the file over a network filesystem whose
+    POSIX locks work (e.g. NFSv4). Every process using a queue file must agree on
+    `shared`.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_DB, visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, shared=False):
+        self.path = path
+        self.shared = shared
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._db.execute(f"PRAGMA journal_mode={SHARED_JOURNAL_MODE if shared else LOCAL_JOURNAL_MODE}")
+        self._db.executescript(_SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        # IMMEDIATE takes the write lock up front, so two workers never lease the same job
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    # --- Coordinator ---
+
+    def enqueue(self, urls):
+        """Adds URLs as queued jobs. Finished (done or failed) jobs for the same URL are
+        queued again; queued and leased ones are left alone. Returns the number queued."""
+        queued, urls = 0, iter(urls)
+        while batch := list(islice(urls, ENQUEUE_BATCH_SIZE)):
+            now = time.time()
+            with self._transaction() as db:
+                before = db.total_changes
+                db.executemany(
+                    "INSERT INTO jobs (url_key, url, status, enqueued_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(url_key) DO UPDATE SET status = excluded.status, attempts = 0, error = NULL, "
+                    "enqueued_at = excluded.enqueued_at WHERE jobs.status IN (?, ?)",
+                    [(normalize_url(url), url, JOB_QUEUED, now, JOB_DONE, JOB_FAILED) for url in batch])
+                queued += db.total_changes - before
+        return queued
+
+    def take_results(self, limit=EXPORT_BATCH_SIZE):
+        """The oldest finished results: (id, url, record or None, content_hash, error) tuples."""
+        with self._lock:
+            rows = self._db.execute("SELECT id, url, record, content_hash, error FROM results ORDER BY id LIMIT ?",
+                                    (limit,)).fetchall()
+        return [(result_id, url, json.loads(record) if record else None, digest, error)
+                for result_id, url, record, digest, error in rows]
+
+    def delete_results(self, result_ids):
+        with self._transaction() as db:
+            db.executemany("DELETE FROM results WHERE id = ?", [(result_id,) for result_id in result_ids])
+
+    # --- Workers ---
+
+    def lease(self, owner, limit=1):
+        """Leases up to `limit` jobs to `owner`: queued ones first, then ones whose lease
+        ran out. Returns their URLs."""
+        now = time.time()
+        with self._transaction() as db:
+            # Out of attempts: the job keeps taking its worker down (or hangs it) with it
+            for url_key, url in db.execute(
+                    "SELECT url_key, url FROM jobs WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                    (JOB_LEASED, now, self.max_attempts)).fetchall():
+                self._finish_failed(db, url_key, url, None, f"Lease expired {self.max_attempts} times")
+            rows = db.execute(
+                "SELECT url_key, url, status FROM jobs WHERE status = ? OR (status = ? AND lease_expires < ?) "
+                "ORDER BY enqueued_at LIMIT ?", (JOB_QUEUED, JOB_LEASED, now, limit)).fetchall()
+            db.executemany(
+                "UPDATE jobs SET status = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE url_key = ?",
+                [(JOB_LEASED, owner, now + self.visibility_timeout, url_key) for url_key, _, _ in rows])
+        reclaimed = sum(1 for _, _, status in rows if status == JOB_LEASED)
+        if reclaimed: logging.warning(f"{owner} reclaimed {reclaimed} job(s) whose lease expired.")
+        return [url for _, url, _ in rows]
+
+    def heartbeat(self, owner):
+        """Extends every lease `owner` holds. Returns how many it holds."""
+        with self._transaction() as db:
+            return db.execute("UPDATE jobs SET lease_expires = ? WHERE status = ? AND lease_owner = ?",
+                              (time.time() + self.visibility_timeout, JOB_LEASED, owner)).rowcount
+
+    def complete(self, url, owner, record, content_hash=None):
+        """Stores the record of a leased job. False (and nothing stored) if the lease was lost."""
+        with self._transaction() as db:
+            if not self._release(db, url, owner, JOB_DONE, None): return False
+            db.execute("INSERT INTO results (url, record, content_hash, worker, finished_at) VALUES (?, ?, ?, ?, ?)",
+                       (url, json.dumps(record, ensure_ascii=False), content_hash, owner, time.time()))
+        return True
+
+    def fail(self, url, owner, error=None, retryable=True):
+        """Returns a leased job to the queue, or fails it once it is out of attempts or
+        at once if the error is not `retryable` (e.g. HTTP 404)."""
+        with self._transaction() as db:
+            row = db.execute("SELECT attempts FROM jobs WHERE url_key = ?", (normalize_url(url),)).fetchone()
+            if row and (not retryable or row[0] >= self.max_attempts):
+                if self._release(db, url, owner, JOB_FAILED, error):
+                    db.execute("INSERT INTO results (url, error, worker, finished_at) VALUES (?, ?, ?, ?)",
+                               (url, error, owner, time.time()))
+            else:
+                self._release(db, url, owner, JOB_QUEUED, error)
+
+    def _release(self, db, url, owner, status, error):
+        return db.execute(
+            "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, error = ? "
+            "WHERE url_key = ? AND status = ? AND lease_owner = ?",
+            (status, error, normalize_url(url), JOB_LEASED, owner)).rowcount > 0
+
+    def _finish_failed(self, db, url_key, url, owner, error):
+        db.execute("UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, error = ? WHERE url_key = ?",
+                   (JOB_FAILED, error, url_key))
+        db.execute("INSERT INTO results (url, error, worker, finished_at) VALUES (?, ?, ?, ?)",
+                   (url, error, owner, time.time()))
+
+    # --- Queries ---
+
+    def counts(self):
+        with self._lock:
+            return dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+
+    def is_drained(self):
+        """True once no job is queued or leased."""
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM jobs WHERE status IN (?, ?) LIMIT 1",
+                                    (JOB_QUEUED, JOB_LEASED)).fetchone() is None
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# --- Export ---
+
+def export_results(queue, sink, state=None):
+    """Moves finished results from the queue into `sink` and `state`. Rows are deleted
+    from the queue only after the sink is flushed and the state checkpointed, so a
+    crash in between re-exports them, and the state then skips them as unchanged.
+    Returns the number of records written."""
+    from crawl_state import STATUS_UPDATED
+    written = 0
+    while rows := queue.take_results():
+        for _, url, record, digest, error in rows:
+            if record is None:
+                if state is not None: state.mark_failed(url, error)
+                logging.error(f"Scraping returned no data for {url}: {error}")
+            elif state is not None and state.is_unchanged(url, digest):
+                state.mark_unchanged(url)
+            else:
+                sink.write(record)
+                written += 1
+                if state is not None:
+                    status = state.mark_extracted(url, digest, record.get('Tender ID/Reference Number'))
+                    if status == STATUS_UPDATED: logging.info(f"Notice changed since last run, re-extracted: {url}")
+        sink.flush()
+        if state is not None: state.checkpoint()
+        queue.delete_results([row[0] for row in rows])
+    return written
+
+
+# --- Workers ---
+
+async def _heartbeat(queue, owner):
+    while True:
+        await asyncio.sleep(queue.visibility_timeout / 4)
+        await asyncio.to_thread(queue.heartbeat, owner)
+
+
+async def _work(queue, owner, engine, poll_interval, stop):
+    """Keeps `engine.concurrency` leased jobs in flight until the queue is drained
+    (and, for coordinator-run workers, the coordinator has finished enqueueing)."""
+    heartbeat = asyncio.create_task(_heartbeat(queue, owner))
+    pending, completed = {}, 0
+    try:
+        while True:
+            free = engine.concurrency - len(pending)
+            if free > 0:
+                for url in await asyncio.to_thread(queue.lease, owner, free):
+                    pending[asyncio.create_task(engine.process(url))] = url
+            if not pending:
+                if (stop is None or stop.is_set()) and await asyncio.to_thread(queue.is_drained): break
+                await asyncio.sleep(poll_interval)
+                continue
+            done, _ = await asyncio.wait(pending, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                url = pending.pop(task)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    await asyncio.to_thread(queue.fail, url, owner, f"Worker error: {e}")
+                    continue
+                if result.record:
+                    if await asyncio.to_thread(queue.complete, url, owner, result.record, result.content_hash):
+                        completed += 1
+                    else:
+                        logging.warning(f"Lease on {url} was lost before it finished; dropping this result.")
+                else:
+                    await asyncio.to_thread(queue.fail, url, owner, result.error, result.retryable)
+    finally:
+        heartbeat.cancel()
+        for task in pending: task.cancel()
+    return completed
+
+
+def run_worker(queue_path=DEFAULT_QUEUE_DB, owner=None, rate_share=1, stop=None, shared=False,
+               visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT, poll_interval=DEFAULT_POLL_INTERVAL, **engine_kwargs):
+    """Runs one worker until the queue is drained (and `stop`, a multiprocessing.Event,
+    is set, if given). Each worker takes 1/`rate_share` of every site's politeness
+    budget, so N workers together stay within HOST_RATE_LIMITS."""
+    from Scrape_tenders import (BROWSER_HEADLESS, RENDER_PROFILE, PAGE_CACHE_DIR, PAGE_CACHE_TTL,
+                                PAGE_CACHE_MAX_BYTES)
+    from crawl_engine import CrawlEngine, HOST_RATE_LIMITS
+    from page_cache import get_page_cache
+
+    owner = owner or worker_name()
+    engine_kwargs.setdefault('rate_limits', {host: (rate / rate_share, burst)
+                                             for host, (rate, burst) in HOST_RATE_LIMITS.items()})
+    engine_kwargs.setdefault('cache', get_page_cache(PAGE_CACHE_DIR, ttl=PAGE_CACHE_TTL, max_bytes=PAGE_CACHE_MAX_BYTES))
+    engine_kwargs.setdefault('headless', BROWSER_HEADLESS)
+    engine_kwargs.setdefault('render_profile', RENDER_PROFILE)
+
+    async def _run():
+        async with CrawlEngine(**engine_kwargs) as engine:
+            return await _work(queue, owner, engine, poll_interval, stop)
+
+    with WorkQueue(queue_path, visibility_timeout=visibility_timeout, shared=shared) as queue:
+        logging.info(f"Worker {owner} started on {queue_path}")
+        completed = asyncio.run(_run())
+    logging.info(f"Worker {owner} finished: {completed} job(s) completed.")
+    return completed
+
+
+# --- Coordinator ---
+
+def run_coordinator(urls, sink, state=None, workers=None, queue_path=DEFAULT_QUEUE_DB,
+                    poll_interval=DEFAULT_POLL_INTERVAL, **worker_kwargs):
+    """Starts `workers` local worker processes (default: one per core), enqueues
+    `urls` while they run, and exports results into `sink`/`state` as they come in.
+    A worker that crashes is replaced; the jobs it held are leased again once their
+    visibility timeout passes. Returns the number of records written."""
+    workers = workers or os.cpu_count() or 1
+    context = multiprocessing.get_context('spawn')  # Playwright does not survive a fork
+    stop = context.Event()
+    kwargs = dict(worker_kwargs, queue_path=queue_path, rate_share=worker_kwargs.get('rate_share', workers),
+                  stop=stop, poll_interval=poll_interval)
+
+    def start_worker():
+        process = context.Process(target=run_worker, kwargs=kwargs, name='tender-worker')
+        process.start()
+        return process
+
+    written = 0
+    with WorkQueue(queue_path, shared=worker_kwargs.get('shared', False)) as queue:
+        processes = [start_worker() for _ in range(workers)]
+        restarts = [0] * workers
+        try:
+            queued, urls = 0, iter(urls)
+            while batch := list(islice(urls, ENQUEUE_BATCH_SIZE)):
+                queued += queue.enqueue(batch)
+                written += export_results(queue, sink, state)
+            stop.set()
+            logging.info(f"Enqueued {queued} job(s) for {workers} worker(s). Queue: {queue.counts()}")
+
+            while True:
+                written += export_results(queue, sink, state)
+                drained = queue.is_drained()
+                for i, process in enumerate(processes):
+                    if process.is_alive() or process.exitcode == 0 or drained: continue
+                    if restarts[i] >= MAX_WORKER_RESTARTS: continue
+                    restarts[i] += 1
+                    logging.warning(f"Worker {process.pid} exited with code {process.exitcode}; starting a replacement.")
+                    processes[i] = start_worker()
+                if not any(process.is_alive() for process in processes):
+                    if not drained: logging.error(f"All workers stopped with jobs left: {queue.counts()}")
+                    break
+                time.sleep(poll_interval)
+        finally:
+            stop.set()
+            for process in processes:
+                process.join(timeout=60)
+                if process.is_alive(): process.terminate()
+            written += export_results(queue, sink, state)
+        logging.info(f"Work queue finished: {queue.counts()}")
+    return written
+
+
+def main(argv=None):
+    from Scrape_tenders import CRAWL_STATE_DB, EXTRACTION_VERSION, CRAWL_RECHECK_AFTER, LOT_COLUMNS
+    from crawl_state import CrawlState
+    from output_sink import open_sink
+
+    parser = argparse.ArgumentParser(description="Crawl notices with a pool of worker processes.")
+    parser.add_argument('--queue', default=DEFAULT_QUEUE_DB, help="Queue database (default: %(default)s)")
+    parser.add_argument('--shared', action='store_true',
+                        help="Queue file is used from several hosts (rollback journal instead of WAL); "
+                             "pass it to every command using that file")
+    commands = parser.add_subparsers(dest='command', required=True)
+    enqueue = commands.add_parser('enqueue', help="Queue notice URLs not yet handled by the crawl state")
+    enqueue.add_argument('urls', nargs='*')
+    enqueue.add_argument('--file', help="File with one URL per line")
+    work = commands.add_parser('work', help="Run local workers until the queue is drained, exporting results")
+    work.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per core)")
+    worker = commands.add_parser('worker', help="Run a single worker (on another machine, with --shared)")
+    worker.add_argument('--rate-share', type=int, default=1,
+                        help="Workers sharing the sites' rate limits across all machines (default: %(default)s)")
+    worker.add_argument('--wait', action='store_true', help="Keep polling when the queue is drained")
+    worker.add_argument('--include-lots', action='store_true', help="Keep each notice's lots for a --lots export")
+    for command in (work, commands.add_parser('export', help="Append finished results to the output")):
+        command.add_argument('-o', '--output', default='tender_data.csv')
+        command.add_argument('--lots', default=None, help="Also append one row per lot of multi-lot notices to this file")
+    commands.add_parser('status', help="Show job counts")
+    args = parser.parse_args(argv)
+
+    if args.command == 'worker':
+        run_worker(args.queue, rate_share=args.rate_share, stop=threading.Event() if args.wait else None,
+                   shared=args.shared, parse_options={'include_lots': True} if args.include_lots else None)
+        return
+    with WorkQueue(args.queue, shared=args.shared) as queue:
+        if args.command == 'status':
+            print(json.dumps(queue.counts()))
+            return
+        if args.command == 'enqueue':
+            urls = list(args.urls)
+            if args.file:
+                with open(args.file, 'r', encoding='utf-8') as f: urls += [line.strip() for line in f if line.strip()]
+            with CrawlState(CRAWL_STATE_DB, extraction_version=EXTRACTION_VERSION, recheck_after=CRAWL_RECHECK_AFTER) as state:
+                logging.info(f"Queued {queue.enqueue(state.filter_pending(urls))} job(s).")
+            return
+    lots_sink = open_sink(args.lots, columns=LOT_COLUMNS, append=True) if args.lots else None
+    with open_sink(args.output, append=True, lots=lots_sink) as sink, \
+         CrawlState(CRAWL_STATE_DB, extraction_version=EXTRACTION_VERSION, recheck_after=CRAWL_RECHECK_AFTER,
+                    before_checkpoint=sink.flush) as state:
+        if args.command == 'work':
+            written = run_coordinator([], sink, state, workers=args.workers, queue_path=args.queue,
+                                      shared=args.shared, parse_options={'include_lots': True} if args.lots else None)
+        else:
+            with WorkQueue(args.queue, shared=args.shared) as queue: written = export_results(queue, sink, state)
+    logging.info(f"✅ {written} record(s) appended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()